@@ -22,9 +22,11 @@ from splight_lib.client.exceptions import (
     InvalidModelName,
     RequestError,
 )
+from splight_lib.client.singleflight import SingleFlight, request_key
 from splight_lib.constants import ENGINE_PREFIX
 from splight_lib.logging._internal import LogTags, get_splight_logger
 from splight_lib.restclient import SplightRestClient
+from splight_lib.restclient.compression import ContentEncoding
 from splight_lib.settings import SplightAPIVersion
 
 logger = get_splight_logger()
@@ -49,6 +51,9 @@ class RemoteDatabaseClient(AbstractDatabaseClient, AbstractRemoteClient):
         access_id: str,
         secret_key: str,
         api_version: SplightAPIVersion = SplightAPIVersion.V3,
+        request_compression: ContentEncoding | None = None,
+        compression_threshold: int = 1024,
+        coalesce_reads: bool = False,
         *args,
         **kwargs,
     ):
@@ -58,8 +63,12 @@ class RemoteDatabaseClient(AbstractDatabaseClient, AbstractRemoteClient):
             access_key=access_id,
             secret_key=secret_key,
         )
-        self._restclient = SplightRestClient()
+        self._restclient = SplightRestClient(
+            compression=request_compression,
+            compression_threshold=compression_threshold,
+        )
         self._restclient.update_headers(token.header)
+        self._reads = SingleFlight(enabled=coalesce_reads)
         logger.debug(
             "Remote database client initialized.", tags=LogTags.DATABASE
         )
@@ -182,7 +191,9 @@ class RemoteDatabaseClient(AbstractDatabaseClient, AbstractRemoteClient):
         logger.debug(f"Retrieving object {resource_name} with id {id}")
         api_path = self._get_api_path(resource_name)
         url = self._base_url / api_path / f"{id}/"
-        response = self._restclient.get(url)
+        response = self._reads.do(
+            request_key("GET", url), lambda: self._restclient.get(url)
+        )
         if response.status_code == codes.NOT_FOUND:
             raise InstanceNotFound(resource_name, id)
         elif response.is_error:
@@ -261,7 +272,10 @@ class RemoteDatabaseClient(AbstractDatabaseClient, AbstractRemoteClient):
 
     def _list(self, url: furl, **kwargs) -> PaginatedResponse:
         params = self._parse_params(**kwargs)
-        response = self._restclient.get(url, params=params)
+        response = self._reads.do(
+            request_key("GET", url, params=params),
+            lambda: self._restclient.get(url, params=params),
+        )
         if response.is_error:
             raise RequestError(response.status_code, response.text)
         return response.json()
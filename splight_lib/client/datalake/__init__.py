@@ -1,5 +1,13 @@
 from splight_lib.client.datalake.builder import DatalakeClientBuilder
+from splight_lib.client.datalake.common.abstract import close_datalake_clients
+from splight_lib.client.datalake.common.read_batching import (
+    ReadBatcher,
+    batch_reads,
+)
 
 __all__ = [
     DatalakeClientBuilder,
+    close_datalake_clients,
+    ReadBatcher,
+    batch_reads,
 ]
@@ -1,4 +1,5 @@
 from abc import abstractmethod
+from time import monotonic
 
 from splight_lib.abstract.client import AbstractRemoteClient, QuerySet
 
@@ -15,6 +16,21 @@ class AbstractDatalakeClient(AbstractRemoteClient):
         # TODO: consider using an async QuerySet
         return await self._async_get(*args, **kwargs)
 
+    def close(self, timeout: float | None = None) -> None:
+        """Sends any buffered document and releases the client resources.
+        Clients without buffers have nothing to do.
+
+        Parameters
+        ----------
+        timeout: float | None maximum number of seconds to wait.
+        """
+
+    def write(self, records: dict) -> list[dict]:
+        """Saves the records right away, without going through a buffer.
+        It is used for bulk writes that are already batched.
+        """
+        return self.save(records)
+
     @abstractmethod
     def save(self, records: dict) -> list[dict]:
         pass
@@ -30,3 +46,21 @@ class AbstractDatalakeClient(AbstractRemoteClient):
     @abstractmethod
     async def _async_get(self, request: dict) -> list[dict]:
         pass
+
+
+def close_datalake_clients(timeout: float | None = None) -> None:
+    """Closes every datalake client created in the process, so the buffered
+    documents are sent before exiting.
+
+    Parameters
+    ----------
+    timeout: float | None maximum number of seconds to wait, shared by all
+        the clients.
+    """
+    deadline = None if timeout is None else monotonic() + timeout
+    for client in list(AbstractDatalakeClient._instances.values()):
+        if isinstance(client, AbstractDatalakeClient):
+            remaining = (
+                None if deadline is None else max(deadline - monotonic(), 0)
+            )
+            client.close(remaining)
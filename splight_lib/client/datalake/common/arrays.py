@@ -0,0 +1,134 @@
+from dataclasses import dataclass, field
+from typing import Hashable
+
+import numpy as np
+import pandas as pd
+
+
+@dataclass
+class DatalakeArrays:
+    """Columnar result of a datalake read.
+
+    Attributes
+    ----------
+    timestamp: np.ndarray datetime64[ns] timestamps in UTC.
+    value: np.ndarray float64, bool or object values.
+    key: np.ndarray | None the code of the key of each point, the position
+        of the key in keys.
+    keys: List the keys of the series, as tuples of key fields.
+    """
+
+    timestamp: np.ndarray
+    value: np.ndarray
+    key: np.ndarray | None = None
+    keys: list[tuple] = field(default_factory=list)
+
+    def __len__(self) -> int:
+        return len(self.value)
+
+    def to_series(self) -> pd.Series:
+        """Returns the values as a Series indexed by timestamp, sharing the
+        arrays memory.
+        """
+        index = pd.DatetimeIndex(self.timestamp, name="timestamp", copy=False)
+        return pd.Series(self.value, index=index, name="value", copy=False)
+
+
+def value_dtype(model_class: type) -> np.dtype:
+    """The dtype of the values of a datalake model."""
+    value = model_class.model_fields.get("value")
+    annotation = value.annotation if value else None
+    if annotation is float:
+        return np.dtype(np.float64)
+    if annotation is bool:
+        return np.dtype(np.bool_)
+    return np.dtype(object)
+
+
+def _parse_timestamps(timestamps: np.ndarray) -> np.ndarray:
+    parsed = pd.to_datetime(timestamps, utc=True, format="ISO8601")
+    return parsed.tz_localize(None).to_numpy(dtype="datetime64[ns]")
+
+
+def decode_rows(
+    rows: list[dict],
+    dtype: np.dtype,
+    key_fields: tuple[str, ...] | None = None,
+) -> DatalakeArrays:
+    """Decodes rows with a timestamp, a value and the key fields of their
+    series in a single pass over pre-sized arrays.
+
+    Parameters
+    ----------
+    rows: List[Dict] the rows of the response.
+    dtype: np.dtype the dtype of the values.
+    key_fields: Tuple[str] | None the fields of the keys to encode, keys
+        are not encoded if None.
+
+    Returns
+    -------
+    DatalakeArrays with the points in the order of the rows.
+    """
+    size = len(rows)
+    timestamps = np.empty(size, dtype=object)
+    values = np.empty(size, dtype=dtype)
+    codes = np.empty(size, dtype=np.int32) if key_fields else None
+    keys: dict[Hashable, int] = {}
+    for index, row in enumerate(rows):
+        timestamps[index] = row["timestamp"]
+        values[index] = row["value"]
+        if key_fields:
+            key = tuple(row.get(name) for name in key_fields)
+            codes[index] = keys.setdefault(key, len(keys))
+    return DatalakeArrays(
+        timestamp=_parse_timestamps(timestamps),
+        value=values,
+        key=codes,
+        keys=list(keys),
+    )
+
+
+def decode_wide_rows(
+    rows: list[dict],
+    columns: list[Hashable],
+    dtype: np.dtype,
+    keys: list[tuple] | None = None,
+) -> DatalakeArrays:
+    """Decodes rows with a timestamp and the values of many series by their
+    column key, skipping the missing ones, in a single pass over arrays
+    pre-sized for every column of every row.
+
+    Parameters
+    ----------
+    rows: List[Dict] the rows, as {"timestamp": ..., column: value, ...}.
+    columns: List the column keys of the series.
+    dtype: np.dtype the dtype of the values.
+    keys: List[Tuple] | None the keys of the series of each column, the
+        column codes are returned if given.
+
+    Returns
+    -------
+    DatalakeArrays with the points of each row in column order.
+    """
+    size = len(rows) * len(columns)
+    timestamps = np.empty(size, dtype=object)
+    values = np.empty(size, dtype=dtype)
+    codes = np.empty(size, dtype=np.int32) if keys is not None else None
+    count = 0
+    for row in rows:
+        timestamp = row["timestamp"]
+        for code, column in enumerate(columns):
+            value = row.get(column)
+            if value is None:
+                continue
+            timestamps[count] = timestamp
+            values[count] = value
+            if codes is not None:
+                codes[count] = code
+            count += 1
+    return DatalakeArrays(
+        timestamp=_parse_timestamps(timestamps[:count]),
+        value=values[:count],
+        key=codes[:count] if codes is not None else None,
+        keys=keys or [],
+    )
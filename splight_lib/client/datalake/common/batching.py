@@ -0,0 +1,271 @@
+import asyncio
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+from typing import Any, Awaitable, Callable, Hashable
+
+from splight_lib.client.datalake.common.buffer import documents_size
+from splight_lib.client.datalake.common.resilience import is_permanent_error
+from splight_lib.client.exceptions import CircuitOpenError
+from splight_lib.logging._internal import LogTags, get_splight_logger
+
+logger = get_splight_logger()
+
+KeyFunction = Callable[[dict], Hashable]
+RejectFunction = Callable[[str, list[dict]], None]
+
+ADDRESS_FIELDS = ("solution", "asset", "attribute", "output")
+
+
+def address_key(document: dict) -> tuple:
+    """Returns the address of a datalake document, resources serialized as
+    dicts are identified by their id.
+    """
+    return tuple(
+        value.get("id") if isinstance(value, dict) else value
+        for value in (document.get(field) for field in ADDRESS_FIELDS)
+    )
+
+
+def split_batches(
+    documents: list[dict],
+    key: KeyFunction,
+    max_documents: int,
+    max_bytes: int,
+    lanes: int,
+    sizes: list[int] | None = None,
+) -> list[list[list[dict]]]:
+    """Splits documents in lanes of sub-batches. All the documents with the
+    same key go to the same lane keeping their relative order, so sending
+    the sub-batches of each lane sequentially preserves the order per key.
+
+    Parameters
+    ----------
+    documents: List[Dict] the documents to split.
+    key: Callable returning the key of a document.
+    max_documents: int maximum number of documents per sub-batch.
+    max_bytes: int maximum size in bytes of a sub-batch.
+    lanes: int number of lanes.
+    sizes: List[int] | None the encoded size of each document, as tracked
+        by the buffer. Without them the documents are encoded once and
+        given their average size.
+
+    Returns
+    -------
+    List[List[List[Dict]]] the non-empty lanes with their sub-batches.
+    """
+    if not documents:
+        return []
+    if sizes is None:
+        sizes = [documents_size(documents) // len(documents)] * len(documents)
+    lane_batches: list[list[list[dict]]] = [[] for _ in range(lanes)]
+    # Number of documents and bytes of the last sub-batch of each lane
+    lane_counts = [max_documents] * lanes
+    lane_bytes = [0] * lanes
+    for document, size in zip(documents, sizes):
+        lane = hash(key(document)) % lanes
+        if lane_counts[lane] >= max_documents or (
+            lane_counts[lane] and lane_bytes[lane] + size > max_bytes
+        ):
+            lane_batches[lane].append([])
+            lane_counts[lane] = lane_bytes[lane] = 0
+        lane_batches[lane][-1].append(document)
+        lane_counts[lane] += 1
+        lane_bytes[lane] += size
+    return [batches for batches in lane_batches if batches]
+
+
+class DatalakeBatchSender:
+    """Sends a flush of documents as size-capped sub-batches.
+
+    The lanes of sub-batches are sent concurrently, in a thread pool for
+    the sync send function and with asyncio.gather for the async one, while
+    the sub-batches within a lane are sent one after the other. A failed
+    sub-batch does not stop the others and its documents are returned to
+    the caller, unless the server rejected them with a 4xx status code:
+    those are logged and passed to on_rejected, as sending them again would
+    fail the same way.
+    """
+
+    def __init__(
+        self,
+        key: KeyFunction,
+        max_documents: int = 1000,
+        max_bytes: int = 1024 * 1024,
+        parallelism: int = 4,
+        on_rejected: RejectFunction | None = None,
+    ):
+        self._key = key
+        self._on_rejected = on_rejected
+        self._max_documents = max_documents
+        self._max_bytes = max_bytes
+        self._parallelism = max(parallelism, 1)
+        self._executor: ThreadPoolExecutor | None = None
+
+    def send(
+        self,
+        send: Callable[[str, list[dict]], Any],
+        name: str,
+        documents: list[dict],
+        sizes: list[int] | None = None,
+    ) -> list[dict]:
+        """Sends the documents using a sync send function, sizes are the
+        encoded size of each document if known.
+
+        Returns
+        -------
+        List[Dict] the documents of the sub-batches that were not sent.
+        """
+        lanes = self._split(documents, sizes)
+        if len(lanes) <= 1:
+            failed = [self._send_lane(send, name, lane) for lane in lanes]
+        else:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self._parallelism,
+                    thread_name_prefix="datalake-sender",
+                )
+            futures = [
+                self._executor.submit(self._send_lane, send, name, lane)
+                for lane in lanes
+            ]
+            failed = [future.result() for future in futures]
+        return [document for lane in failed for document in lane]
+
+    async def async_send(
+        self,
+        send: Callable[[str, list[dict]], Awaitable[Any]],
+        name: str,
+        documents: list[dict],
+        sizes: list[int] | None = None,
+    ) -> list[dict]:
+        """Sends the documents using an async send function, sizes are the
+        encoded size of each document if known.
+
+        Returns
+        -------
+        List[Dict] the documents of the sub-batches that were not sent.
+        """
+        lanes = self._split(documents, sizes)
+        failed = await asyncio.gather(
+            *(self._async_send_lane(send, name, lane) for lane in lanes)
+        )
+        return [document for lane in failed for document in lane]
+
+    def drain(
+        self,
+        send: Callable[[str, list[dict]], Any],
+        documents: dict[str, list[dict]],
+        timeout: float | None = None,
+        sizes: dict[str, list[int]] | None = None,
+    ) -> tuple[dict[str, list[dict]], dict[str, Future]]:
+        """Sends the documents of every name concurrently, waiting at most
+        timeout seconds. The sends still running after the timeout can not
+        be stopped, their futures are returned so the caller settles them
+        once they finish.
+
+        Parameters
+        ----------
+        send: Callable the sync send function.
+        documents: Dict[str, List[Dict]] the documents to send by name.
+        timeout: float | None maximum number of seconds to wait, None to
+            wait until every document is sent.
+        sizes: Dict[str, List[int]] | None the encoded size of each document
+            by name, if known.
+
+        Returns
+        -------
+        Tuple with the documents that were not sent by name, for the sends
+        that finished, and the futures of the sends still running, which
+        return the documents that were not sent.
+        """
+        if not documents:
+            return {}, {}
+        executor = ThreadPoolExecutor(
+            max_workers=len(documents), thread_name_prefix="datalake-drain"
+        )
+        futures = {
+            name: executor.submit(
+                self.send, send, name, docs, (sizes or {}).get(name)
+            )
+            for name, docs in documents.items()
+        }
+        wait(futures.values(), timeout=timeout)
+        # Does not wait for the running sends, they finish in background
+        executor.shutdown(wait=False)
+        unsent, running = {}, {}
+        for name, future in futures.items():
+            if not future.done():
+                running[name] = future
+                continue
+            failed = future.result()
+            if failed:
+                unsent[name] = failed
+        return unsent, running
+
+    def _split(
+        self, documents: list[dict], sizes: list[int] | None
+    ) -> list[list[list[dict]]]:
+        return split_batches(
+            documents,
+            self._key,
+            self._max_documents,
+            self._max_bytes,
+            self._parallelism,
+            sizes,
+        )
+
+    def _send_lane(
+        self,
+        send: Callable[[str, list[dict]], Any],
+        name: str,
+        batches: list[list[dict]],
+    ) -> list[dict]:
+        failed = []
+        for batch in batches:
+            try:
+                send(name, batch)
+            except CircuitOpenError:
+                failed.extend(batch)
+            except Exception as exc:
+                self._handle_error(exc, name, batch, failed)
+        return failed
+
+    async def _async_send_lane(
+        self,
+        send: Callable[[str, list[dict]], Awaitable[Any]],
+        name: str,
+        batches: list[list[dict]],
+    ) -> list[dict]:
+        failed = []
+        for batch in batches:
+            try:
+                await send(name, batch)
+            except CircuitOpenError:
+                failed.extend(batch)
+            except Exception as exc:
+                self._handle_error(exc, name, batch, failed)
+        return failed
+
+    def _handle_error(
+        self,
+        exc: Exception,
+        name: str,
+        batch: list[dict],
+        failed: list[dict],
+    ) -> None:
+        if is_permanent_error(exc):
+            logger.error(
+                "The datalake rejected %s documents, they are discarded: %s",
+                len(batch),
+                exc,
+                tags=LogTags.DATALAKE,
+            )
+            if self._on_rejected is not None:
+                self._on_rejected(name, batch)
+            return
+        logger.error(
+            "Unable to save %s documents",
+            len(batch),
+            exc_info=True,
+            tags=LogTags.DATALAKE,
+        )
+        failed.extend(batch)
@@ -1,14 +1,54 @@
-from datetime import datetime, timezone
+import json
+from time import monotonic
+
+from splight_lib.settings import DatalakeOverflowPolicy
+
+
+def documents_size(documents: list[dict]) -> int:
+    """Estimates the size in bytes of the documents once encoded as JSON.
+
+    Parameters
+    ----------
+    documents: List[Dict] the documents to measure.
+
+    Returns
+    -------
+    int: the size of the JSON representation of the documents.
+    """
+    return len(json.dumps(documents, default=str))
 
 
 class DatalakeDocumentBuffer:
-    """A simple buffer implementation for datalake documents."""
+    """A simple buffer implementation for datalake documents.
+
+    The buffer can be bounded by number of documents and by bytes, when a
+    new batch does not fit the overflow policy decides which documents are
+    left out: the oldest ones for DROP_OLDEST and the new ones for the
+    other policies. The documents left out are counted as dropped unless
+    the policy is SPILL, where the caller is in charge of storing them.
+    """
 
-    def __init__(self, buffer_size: int, buffer_timeout: float):
+    def __init__(
+        self,
+        buffer_size: int,
+        buffer_timeout: float,
+        max_documents: int | None = None,
+        max_bytes: int | None = None,
+        overflow_policy: DatalakeOverflowPolicy = (
+            DatalakeOverflowPolicy.DROP_OLDEST
+        ),
+    ):
         self._size = buffer_size
         self._timeout = buffer_timeout
+        self._max_documents = max_documents
+        self._max_bytes = max_bytes
+        self._policy = overflow_policy
         self._buffer: list[dict] = []
-        self._last_flush = datetime.now(timezone.utc)
+        self._sizes: list[int] = []
+        self._bytes = 0
+        self._first_added: float | None = None
+        self._last_flush = monotonic()
+        self.dropped = 0
 
         self.reset()
 
@@ -22,6 +62,32 @@ class DatalakeDocumentBuffer:
         """
         return self._buffer
 
+    @property
+    def nbytes(self) -> int:
+        """Estimated size in bytes of the buffered documents."""
+        return self._bytes
+
+    @property
+    def sizes(self) -> list[int]:
+        """Estimated size in bytes of each buffered document."""
+        return self._sizes
+
+    @property
+    def deadline(self) -> float | None:
+        """Monotonic time at which the buffer has to be flushed because of
+        its timeout, None if the buffer is empty.
+        """
+        if not self._buffer:
+            return None
+        return self._last_flush + self._timeout
+
+    @property
+    def oldest(self) -> float | None:
+        """Monotonic time at which the oldest buffered document was added,
+        None if the buffer is empty.
+        """
+        return self._first_added if self._buffer else None
+
     def should_flush(self) -> bool:
         """Method used to check if the buffer should be flushed
 
@@ -30,25 +96,134 @@ class DatalakeDocumentBuffer:
         bool: True if the buffer should be flushed, False otherwise
         """
         exist_data = True if self._buffer else False
-        now = datetime.now(timezone.utc)
-        delta = (now - self._last_flush).total_seconds()
-        timeout_cond = delta >= self._timeout
+        timeout_cond = monotonic() - self._last_flush >= self._timeout
 
         size_cond = len(self._buffer) >= self._size
-        return (timeout_cond or size_cond) and exist_data
+        return (timeout_cond or size_cond or self.is_full()) and exist_data
+
+    def is_full(self) -> bool:
+        """Checks if the buffer reached any of its limits.
+
+        Returns
+        -------
+        bool: True if the buffer is full, False otherwise
+        """
+        if self._max_documents is not None:
+            if len(self._buffer) >= self._max_documents:
+                return True
+        if self._max_bytes is not None:
+            if self._bytes >= self._max_bytes:
+                return True
+        return False
+
+    def has_room(self, documents: list[dict], size: int | None = None) -> bool:
+        """Checks if the documents fit in the buffer without overflowing.
+
+        Parameters
+        ----------
+        documents: List[Dict] the documents to check.
+        size: int | None the encoded size of the documents, computed if
+            needed and not given.
+
+        Returns
+        -------
+        bool: True if all the documents fit, False otherwise
+        """
+        if self._max_documents is not None:
+            if len(self._buffer) + len(documents) > self._max_documents:
+                return False
+        if self._max_bytes is not None:
+            if size is None:
+                size = documents_size(documents)
+            if self._bytes + size > self._max_bytes:
+                return False
+        return True
 
     def reset(self) -> None:
         """Resets the buffer to the empty state with not stored data and the
         flushed date to the called time.
         """
-        self._last_flush = datetime.now(timezone.utc)
+        self._last_flush = monotonic()
+        self._first_added = None
         self._buffer = []
+        self._sizes = []
+        self._bytes = 0
+
+    def swap(self) -> list[dict]:
+        """Detaches the stored documents from the buffer and resets it, so
+        new documents can be added while the detached ones are being sent.
 
-    def add_documents(self, documents: list[dict]):
+        Returns
+        -------
+        List[Dict] the documents that were stored in the buffer.
+        """
+        data = self._buffer
+        self.reset()
+        return data
+
+    def add_documents(
+        self, documents: list[dict], size: int | None = None
+    ) -> tuple[list[dict], list[dict]]:
         """Adds new documents to the buffer.
 
         Parameters
         ----------
         documents: List[Dict] a list of new documents to add to the buffer.
+        size: int | None the encoded size of the documents, as returned by
+            documents_size. It is computed if needed and not given.
+
+        Returns
+        -------
+        Tuple[List[Dict], List[Dict]] the new documents that were added and
+        the documents that were left out of the buffer.
         """
+        if not documents:
+            return documents, []
+        if size is None and self._max_bytes is not None:
+            size = documents_size(documents)
+        # The size of each document is estimated as the average one
+        size = (size or 0) // len(documents)
+
+        if self._policy == DatalakeOverflowPolicy.DROP_OLDEST:
+            self._extend(documents, size)
+            evict = self._overflow_count()
+            overflow = self._buffer[:evict]
+            del self._buffer[:evict]
+            self._bytes -= sum(self._sizes[:evict])
+            del self._sizes[:evict]
+            accepted = documents
+        else:
+            fit = len(documents)
+            if self._max_documents is not None:
+                fit = min(fit, self._max_documents - len(self._buffer))
+            if self._max_bytes is not None and size:
+                fit = min(fit, (self._max_bytes - self._bytes) // size)
+            fit = max(fit, 0)
+            accepted, overflow = documents[:fit], documents[fit:]
+            self._extend(accepted, size)
+
+        if self._policy != DatalakeOverflowPolicy.SPILL:
+            self.dropped += len(overflow)
+        return accepted, overflow
+
+    def _extend(self, documents: list[dict], size: int) -> None:
+        if not self._buffer:
+            self._first_added = monotonic()
         self._buffer.extend(documents)
+        self._sizes.extend([size] * len(documents))
+        self._bytes += size * len(documents)
+
+    def _overflow_count(self) -> int:
+        # Number of documents, from the start of the buffer, that have to
+        # be removed so the buffer fits within its limits.
+        count = 0
+        if self._max_documents is not None:
+            count = max(len(self._buffer) - self._max_documents, 0)
+        if self._max_bytes is not None:
+            exceeding_bytes = self._bytes - sum(self._sizes[:count])
+            while exceeding_bytes > self._max_bytes and count < len(
+                self._sizes
+            ):
+                exceeding_bytes -= self._sizes[count]
+                count += 1
+        return count
@@ -0,0 +1,957 @@
+import asyncio
+from concurrent.futures import Future
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from functools import partial
+from heapq import heappop, heappush
+from pathlib import Path
+from tempfile import gettempdir
+from threading import Condition, Lock, Thread
+from time import monotonic
+
+from splight_lib.client.datalake.common.batching import (
+    DatalakeBatchSender,
+    address_key,
+)
+from splight_lib.client.datalake.common.buffer import (
+    DatalakeDocumentBuffer,
+    documents_size,
+)
+from splight_lib.client.datalake.common.reduction import (
+    DatalakeWriteReducer,
+    coalesce,
+)
+from splight_lib.client.datalake.common.spool import DatalakeSpool
+from splight_lib.client.datalake.common.stats import (
+    DatalakeStats,
+    DatalakeStatsRecorder,
+    StatsCallback,
+)
+from splight_lib.logging._internal import LogTags, get_splight_logger
+from splight_lib.settings import DatalakeOverflowPolicy, DatalakeReduction
+
+logger = get_splight_logger()
+
+
+class BufferedDatalakeMixin:
+    """Buffering shared by the buffered datalake clients of every API
+    version, it goes before the remote client in the bases of a client.
+
+    The clients set their API version, the names of their buffers and the
+    spool subdirectory, and implement _unpack and _write_documents. The
+    documents are sent with the sender of the remote client, so they share
+    its retries and circuit breaker with the reads. The payload bound, the
+    encoded size of the buffered documents, is shared equally by the
+    buffers.
+    """
+
+    api_version: str | None = None
+    buffer_names: tuple[str, ...] = ("default",)
+    spool_name: str = "default"
+
+    def __init__(
+        self,
+        base_url: str,
+        access_id: str,
+        secret_key: str,
+        api_version: str | None = None,
+        buffer_size: int = 500,
+        buffer_timeout: float = 60,
+        buffer_max_documents: int | None = None,
+        buffer_max_payload_bytes: int | None = None,
+        buffer_overflow_policy: DatalakeOverflowPolicy = (
+            DatalakeOverflowPolicy.DROP_OLDEST
+        ),
+        buffer_block_timeout: float = 5,
+        spool_dir: str | None = None,
+        spool_fsync_batch: int = 100,
+        spool_replay_rate: float = 1000,
+        flush_max_documents: int = 1000,
+        flush_max_bytes: int = 1024 * 1024,
+        flush_parallelism: int = 4,
+        reduction: DatalakeReduction = DatalakeReduction.NONE,
+        deadband: float = 0,
+        max_silence: float | None = None,
+        dedup: bool = False,
+        stats_callback: StatsCallback | None = None,
+        *args,
+        **kwargs,
+    ):
+        super().__init__(
+            base_url=base_url,
+            access_id=access_id,
+            secret_key=secret_key,
+            api_version=api_version or self.api_version,
+            *args,
+            **kwargs,
+        )
+        logger.debug(
+            "Initializing buffer with size %s and timeout %s",
+            buffer_size,
+            buffer_timeout,
+            tags=LogTags.DATALAKE,
+        )
+        max_bytes = (
+            buffer_max_payload_bytes
+            and buffer_max_payload_bytes // len(self.buffer_names)
+        )
+        self._data_buffers = {
+            name: DatalakeDocumentBuffer(
+                buffer_size,
+                buffer_timeout,
+                max_documents=buffer_max_documents,
+                max_bytes=max_bytes,
+                overflow_policy=buffer_overflow_policy,
+            )
+            for name in self.buffer_names
+        }
+        self._overflow_policy = buffer_overflow_policy
+        self._block_timeout = buffer_block_timeout
+        if buffer_overflow_policy == DatalakeOverflowPolicy.SPILL:
+            spool_dir = spool_dir or Path(gettempdir()) / "splight-datalake"
+        self._spool = (
+            DatalakeSpool(
+                Path(spool_dir) / self.spool_name,
+                fsync_batch=spool_fsync_batch,
+                replay_rate=spool_replay_rate,
+            )
+            if spool_dir
+            else None
+        )
+        self._batch_sender = DatalakeBatchSender(
+            address_key,
+            max_documents=flush_max_documents,
+            max_bytes=flush_max_bytes,
+            parallelism=flush_parallelism,
+            on_rejected=self._reject,
+        )
+        self._reducer = DatalakeWriteReducer(
+            address_key,
+            reduction=reduction,
+            deadband=deadband,
+            max_silence=max_silence,
+        )
+        self._dedup = dedup
+        self._stats = DatalakeStatsRecorder()
+        self._stats_callback = stats_callback
+        self._lock = Lock()
+        self._closed = False
+        # Set once close swapped the buffers, nothing flushes them after
+        self._drained = False
+
+    def _unpack(self, records: dict) -> tuple[str, list[dict]]:
+        """Returns the buffer name and the documents of the records."""
+        raise NotImplementedError()
+
+    def _write_documents(self, name: str, documents: list[dict]) -> None:
+        """Sends the documents of a buffer in a single request."""
+        raise NotImplementedError()
+
+    async def _async_write_documents(
+        self, name: str, documents: list[dict]
+    ) -> None:
+        """Async version of _write_documents."""
+        raise NotImplementedError()
+
+    def stats(self) -> DatalakeStats:
+        """Returns a snapshot of the client statistics: queue depth of each
+        buffer, points and bytes enqueued, sent and dropped, flush count and
+        latency histogram, retries and age in seconds of the oldest point
+        waiting in the buffers.
+        """
+        oldest = min(
+            (
+                buffer.oldest
+                for buffer in self._data_buffers.values()
+                if buffer.oldest is not None
+            ),
+            default=None,
+        )
+        return self._stats.snapshot(
+            queue_depth={
+                name: len(buffer.data)
+                for name, buffer in self._data_buffers.items()
+            },
+            retries=self._sender.retries,
+            oldest_point_age=None if oldest is None else monotonic() - oldest,
+        )
+
+    def set_stats_callback(self, callback: StatsCallback | None) -> None:
+        """Sets the function called with the stats after each flush. It is
+        called from the flushing thread and must not save documents.
+        """
+        self._stats_callback = callback
+
+    def reduction_ratios(self) -> dict[tuple, float]:
+        """Compression ratio of the write reduction for each name and
+        address, the number of saved documents over the written ones.
+        """
+        return self._reducer.ratios()
+
+    def close(self, timeout: float | None = None) -> None:
+        """Sends the buffered documents concurrently and stops buffering,
+        the documents saved afterwards are sent right away. The documents
+        that could not be sent within the timeout are kept in the spool, if
+        there is one.
+
+        Parameters
+        ----------
+        timeout: float | None maximum number of seconds to wait.
+        """
+        start = monotonic()
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            self._wake_all()
+        # The flusher finishes the flush it is sending before the buffers
+        # are swapped, so the documents it could not send are drained too.
+        self._stop_flushing(timeout)
+        with self._lock:
+            self._drained = True
+            documents, sizes, segments = {}, {}, {}
+            for name, buffer in self._data_buffers.items():
+                if not buffer.data:
+                    continue
+                sizes[name] = buffer.sizes
+                documents[name] = buffer.swap()
+                segments[name] = (
+                    self._spool.seal(name) if self._spool else None
+                )
+        for name, held in self._reducer.flush().items():
+            if not held:
+                continue
+            documents.setdefault(name, []).extend(held)
+            average = documents_size(held) // len(held)
+            sizes.setdefault(name, []).extend([average] * len(held))
+        if self._dedup:
+            for name, docs in documents.items():
+                documents[name], sizes[name] = _coalesce(docs, sizes[name])
+        if timeout is not None:
+            timeout = max(timeout - (monotonic() - start), 0)
+        unsent, running = self._batch_sender.drain(
+            self._send_documents, documents, timeout, sizes
+        )
+        if self._spool:
+            for name, segment in segments.items():
+                if name in unsent:
+                    self._spool.release(segment, documents=unsent[name])
+                elif name not in running:
+                    self._spool.ack(segment)
+        if running:
+            logger.warning(
+                "Datalake client closed, %s documents are still being sent",
+                sum(len(documents[name]) for name in running),
+                tags=LogTags.DATALAKE,
+            )
+        self._settle_running(running, segments)
+        if unsent:
+            logger.warning(
+                "Datalake client closed, %s documents were not sent",
+                sum(len(docs) for docs in unsent.values()),
+                tags=LogTags.DATALAKE,
+            )
+
+    def _settle_running(
+        self, running: dict[str, Future], segments: dict[str, Path | None]
+    ) -> None:
+        # The segments of the sends still running after the close timeout
+        # are settled when they finish, and the spool keeps its directory
+        # locked until then, so they are not replayed while being sent.
+        if not self._spool:
+            return
+        if not running:
+            self._spool.close()
+            return
+        lock = Lock()
+        remaining = [len(running)]
+
+        def settle(segment: Path | None, future: Future) -> None:
+            if future.exception() is None:
+                self._spool.release(segment, documents=future.result())
+            else:
+                self._spool.release(segment)
+            with lock:
+                remaining[0] -= 1
+                last = remaining[0] == 0
+            if last:
+                self._spool.close()
+
+        for name, future in running.items():
+            future.add_done_callback(partial(settle, segments.get(name)))
+
+    def _wake_all(self) -> None:
+        # Wakes up the threads waiting on the lock once the client is
+        # closed. Must be called holding the lock.
+        pass
+
+    def _stop_flushing(self, timeout: float | None) -> None:
+        # Waits for the flushing thread, if any, to finish
+        pass
+
+    def _add(
+        self,
+        name: str,
+        buffer: DatalakeDocumentBuffer,
+        documents: list[dict],
+        size: int,
+    ) -> None:
+        # Adds the documents, of the given encoded size, to the buffer and
+        # the spool. Must be called holding the lock.
+        accepted, overflow = buffer.add_documents(documents, size)
+        average = size // len(documents) if documents else 0
+        if accepted:
+            self._stats.enqueued(len(accepted), average * len(accepted))
+        if self._spool:
+            self._spool.append(name, accepted)
+            if (
+                overflow
+                and self._overflow_policy == DatalakeOverflowPolicy.DROP_OLDEST
+            ):
+                # The evicted documents were appended to the segment before
+                self._spool.evict(name, len(overflow))
+        if overflow:
+            self._handle_overflow(name, overflow, average * len(overflow))
+
+    def _flush_documents(
+        self,
+        name: str,
+        documents: list[dict],
+        sizes: list[int],
+        segment: Path | None,
+    ) -> list[dict]:
+        # Sends the documents swapped from a buffer, with the encoded size
+        # of each one, and acknowledges or releases their spool segment.
+        # Returns the documents that were not sent.
+        average = sum(sizes) // len(documents) if documents else 0
+        if self._dedup:
+            documents, sizes = _coalesce(documents, sizes)
+        start = monotonic()
+        failed = self._batch_sender.send(
+            self._send_documents, name, documents, sizes
+        )
+        self._settle_flush(documents, failed, average, start, segment)
+        return failed
+
+    async def _async_flush_documents(
+        self,
+        name: str,
+        documents: list[dict],
+        sizes: list[int],
+        segment: Path | None,
+    ) -> list[dict]:
+        # Async version of _flush_documents
+        average = sum(sizes) // len(documents) if documents else 0
+        if self._dedup:
+            documents, sizes = _coalesce(documents, sizes)
+        start = monotonic()
+        failed = await self._batch_sender.async_send(
+            self._async_send_documents, name, documents, sizes
+        )
+        self._settle_flush(documents, failed, average, start, segment)
+        return failed
+
+    def _settle_flush(
+        self,
+        documents: list[dict],
+        failed: list[dict],
+        average: int,
+        start: float,
+        segment: Path | None,
+    ) -> None:
+        sent = len(documents) - len(failed)
+        self._record_flush(sent, average * sent, monotonic() - start)
+        if self._spool:
+            # Only the documents of the failed sub-batches stay in the spool
+            self._spool.release(segment, documents=failed)
+
+    def _record_flush(self, points: int, nbytes: int, latency: float) -> None:
+        self._stats.flushed(points, nbytes, latency)
+        if self._stats_callback is None:
+            return
+        try:
+            self._stats_callback(self.stats())
+        except Exception as exc:
+            logger.warning(
+                "Datalake stats callback failed: %s",
+                exc,
+                tags=LogTags.DATALAKE,
+            )
+
+    def _handle_overflow(
+        self, name: str, documents: list[dict], nbytes: int
+    ) -> None:
+        if self._overflow_policy == DatalakeOverflowPolicy.SPILL:
+            self._spool.spill(name, documents)
+            return
+        self._stats.dropped(len(documents), nbytes)
+        logger.warning(
+            "Datalake buffer is full, %s documents were dropped",
+            len(documents),
+            tags=LogTags.DATALAKE,
+        )
+
+    def _reject(self, name: str, documents: list[dict]) -> None:
+        # Documents rejected by the datalake are dropped, never requeued
+        self._stats.dropped(len(documents), documents_size(documents))
+
+    def _send_documents(self, name: str, documents: list[dict]) -> list[dict]:
+        self._sender.call(self._write_documents, name, documents)
+        return documents
+
+    async def _async_send_documents(
+        self, name: str, documents: list[dict]
+    ) -> list[dict]:
+        await self._sender.async_call(
+            self._async_write_documents, name, documents
+        )
+        return documents
+
+
+class BufferedAsyncDatalakeMixin(BufferedDatalakeMixin):
+    """Buffering with a background thread that flushes each buffer when it
+    reaches its size or its timeout, so the writers never wait for the API.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._room = Condition(self._lock)
+        self._wakeup = Condition(self._lock)
+        # Heap of (deadline, name) with the timeout of each buffer, entries
+        # of buffers flushed before their deadline are discarded on pop.
+        self._deadlines: list[tuple[float, str]] = []
+        self._ready: set[str] = set()
+        self._flush_thread = Thread(target=self._flusher, daemon=True)
+        self._flush_thread.start()
+        logger.debug(
+            "Buffered Remote datalake client initialized.",
+            tags=LogTags.DATALAKE,
+        )
+
+    def save(self, records: dict) -> list[dict]:
+        logger.debug("Saving documents in datalake", tags=LogTags.DATALAKE)
+        if self._closed:
+            return self.write(records)
+        name, data = self._unpack(records)
+        buffer = self._data_buffers[name]
+        documents = self._reducer.reduce(name, data)
+        # The documents are encoded once, out of the lock, to estimate
+        # their size for the buffer limits and the stats.
+        size = documents_size(documents) if documents else 0
+        with self._lock:
+            if (
+                self._overflow_policy == DatalakeOverflowPolicy.BLOCK
+                and not buffer.has_room(documents, size)
+            ):
+                self._request_flush(name)
+                self._room.wait_for(
+                    lambda: buffer.has_room(documents, size),
+                    timeout=self._block_timeout,
+                )
+            was_empty = not buffer.data
+            self._add(name, buffer, documents, size)
+            if self._spool:
+                # The flusher recomputes its wakeup with the spool deadlines
+                self._wakeup.notify()
+            if buffer.should_flush():
+                self._request_flush(name)
+            elif was_empty and buffer.data:
+                self._schedule(name, buffer.deadline)
+        return data
+
+    def _wake_all(self) -> None:
+        self._room.notify_all()
+        self._wakeup.notify()
+
+    def _stop_flushing(self, timeout: float | None) -> None:
+        self._flush_thread.join(timeout)
+
+    def _request_flush(self, name: str) -> None:
+        # Must be called holding the lock
+        self._ready.add(name)
+        self._wakeup.notify()
+
+    def _schedule(self, name: str, deadline: float) -> None:
+        # Must be called holding the lock
+        heappush(self._deadlines, (deadline, name))
+        if self._deadlines[0][0] == deadline:
+            self._wakeup.notify()
+
+    def _flusher(self):
+        while True:
+            with self._lock:
+                ready = self._wait_for_flush()
+            if ready is None:
+                return
+            for name in ready:
+                self._flush_buffer(name, self._data_buffers[name])
+            if self._spool:
+                self._spool.sync()
+                self._spool.replay(self._send_documents)
+
+    def _wait_for_flush(self) -> set[str] | None:
+        # Sleeps until a buffer reaches its size or its deadline, or the
+        # spool has to be synced or replayed. Must be called holding the
+        # lock, returns the names of the buffers to flush or None once the
+        # client is closed.
+        while True:
+            if self._closed:
+                return None
+            now = monotonic()
+            while self._deadlines and self._deadlines[0][0] <= now:
+                deadline, name = heappop(self._deadlines)
+                if self._data_buffers[name].deadline == deadline:
+                    self._ready.add(name)
+            # Nothing is sent while the circuit is open
+            blocked_until = self._sender.breaker.blocked_until()
+            spool_deadline = (
+                self._spool.next_deadline() if self._spool else None
+            )
+            if spool_deadline is not None:
+                spool_deadline = max(spool_deadline, blocked_until)
+            if (self._ready and blocked_until <= now) or (
+                spool_deadline is not None and spool_deadline <= now
+            ):
+                ready, self._ready = self._ready, set()
+                return ready
+            deadlines = [
+                deadline
+                for deadline in (
+                    self._deadlines[0][0] if self._deadlines else None,
+                    blocked_until if self._ready else None,
+                    spool_deadline,
+                )
+                if deadline is not None
+            ]
+            self._wakeup.wait(min(deadlines) - now if deadlines else None)
+
+    def _flush_buffer(self, name: str, buffer: DatalakeDocumentBuffer) -> None:
+        # Only the buffer swap happens under the lock, the request is sent
+        # from this thread so writers never wait for the API.
+        with self._lock:
+            if not buffer.data:
+                return
+            nbytes = buffer.nbytes
+            sizes = buffer.sizes
+            documents = buffer.swap()
+            segment = self._spool.seal(name) if self._spool else None
+            self._room.notify_all()
+        logger.debug(
+            "Flushing datalake buffer with %s elements",
+            len(documents),
+            tags=LogTags.DATALAKE,
+        )
+        failed = self._flush_documents(name, documents, sizes, segment)
+        if failed and not self._spool:
+            self._requeue(name, buffer, failed, nbytes // len(documents))
+
+    def _requeue(
+        self,
+        name: str,
+        buffer: DatalakeDocumentBuffer,
+        documents: list[dict],
+        average: int,
+    ) -> None:
+        # The documents that could not be sent go back to the buffer to be
+        # sent with the next flush.
+        with self._lock:
+            if self._drained:
+                # The flusher outlived the close timeout
+                self._stats.dropped(len(documents), average * len(documents))
+                logger.warning(
+                    "Datalake client closed, %s documents were not sent",
+                    len(documents),
+                    tags=LogTags.DATALAKE,
+                )
+                return
+            was_empty = not buffer.data
+            _, overflow = buffer.add_documents(
+                documents, average * len(documents)
+            )
+            if overflow:
+                self._handle_overflow(name, overflow, average * len(overflow))
+            if buffer.should_flush():
+                self._request_flush(name)
+            elif was_empty and buffer.data:
+                self._schedule(name, buffer.deadline)
+
+
+class BufferedSyncDatalakeMixin(BufferedDatalakeMixin):
+    """Buffering without background threads, the buffers are flushed by
+    the save call that fills them or reaches their timeout.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        logger.debug(
+            "Synchronous Buffered Remote datalake client initialized.",
+            tags=LogTags.DATALAKE,
+        )
+
+    def save(self, records: dict) -> list[dict]:
+        logger.debug("Saving documents in datalake", tags=LogTags.DATALAKE)
+        if self._closed:
+            return self.write(records)
+        name, data = self._unpack(records)
+        buffer = self._data_buffers[name]
+        documents = self._reducer.reduce(name, data)
+        size = documents_size(documents) if documents else 0
+        with self._lock:
+            if (
+                self._overflow_policy == DatalakeOverflowPolicy.BLOCK
+                and buffer.data
+                and not buffer.has_room(documents, size)
+            ):
+                self._flush_buffer(name, buffer)
+            self._add(name, buffer, documents, size)
+            if (
+                buffer.should_flush()
+                and self._sender.breaker.blocked_until() <= monotonic()
+            ):
+                logger.debug(
+                    "Flushing datalake buffer with %s elements",
+                    len(buffer.data),
+                    tags=LogTags.DATALAKE,
+                )
+                self._flush_buffer(name, buffer)
+            if self._spool:
+                self._spool.replay(self._send_documents)
+        if self._spool:
+            # Out of the lock, so other writers do not wait for the disk
+            self._spool.sync_if_due()
+        return data
+
+    def _flush_buffer(self, name: str, buffer: DatalakeDocumentBuffer) -> None:
+        segment = self._spool.seal(name) if self._spool else None
+        nbytes = buffer.nbytes
+        sizes = buffer.sizes
+        documents = buffer.swap()
+        failed = self._flush_documents(name, documents, sizes, segment)
+        # The documents that could not be sent are kept in the spool or, if
+        # there is no spool, in the buffer for the next flush.
+        if failed and not self._spool:
+            buffer.add_documents(
+                failed, nbytes // len(documents) * len(failed)
+            )
+
+
+class BufferedAsyncioDatalakeMixin(BufferedDatalakeMixin):
+    """Buffering for asyncio applications, the buffers are flushed by a task
+    running in the event loop instead of a background thread.
+
+    The buffers are the bounded ones of the other clients, shared with the
+    writers of other threads under the lock, so the flusher task waits on
+    an event instead of consuming a queue. Without a running flusher task,
+    as before the first async_save, save sends the documents right away
+    with a blocking request and logs a warning the first time.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._flush_task: asyncio.Task | None = None
+        self._wakeup: asyncio.Event | None = None
+        self._room: asyncio.Event | None = None
+        # Names of the buffers to flush, only used from the event loop
+        self._ready: set[str] = set()
+        self._tasks: set[asyncio.Task] = set()
+        self._warned_unbuffered = False
+        logger.debug(
+            "Asyncio Buffered Remote datalake client initialized.",
+            tags=LogTags.DATALAKE,
+        )
+
+    @property
+    def running(self) -> bool:
+        """Whether the flusher task is running in a live event loop."""
+        return (
+            self._flush_task is not None
+            and not self._flush_task.done()
+            and self._loop is not None
+            and not self._loop.is_closed()
+        )
+
+    def start(self) -> None:
+        """Starts the flusher task in the running event loop. If the client
+        was bound to another loop, the buffered documents are sent from the
+        new one.
+        """
+        loop = asyncio.get_running_loop()
+        if self._loop is loop and self.running:
+            return
+        self._loop = loop
+        self._wakeup = asyncio.Event()
+        self._room = asyncio.Event()
+        self._flush_task = loop.create_task(self._flusher())
+
+    def save(self, records: dict) -> list[dict]:
+        logger.debug("Saving documents in datalake", tags=LogTags.DATALAKE)
+        if self._closed:
+            return self.write(records)
+        if not self.running:
+            # There is no event loop to flush the buffers
+            if not self._warned_unbuffered:
+                self._warned_unbuffered = True
+                logger.warning(
+                    "No event loop is running the datalake flusher, the "
+                    "documents are sent with blocking requests until the "
+                    "first async_save",
+                    tags=LogTags.DATALAKE,
+                )
+            return self.write(records)
+        name, data = self._unpack(records)
+        documents = self._reducer.reduce(name, data)
+        size = documents_size(documents) if documents else 0
+        self._buffer(name, documents, size)
+        return data
+
+    async def async_save(self, records: dict) -> list[dict]:
+        logger.debug("Saving documents in datalake", tags=LogTags.DATALAKE)
+        if self._closed:
+            return await super().async_save(records)
+        self.start()
+        name, data = self._unpack(records)
+        documents = self._reducer.reduce(name, data)
+        size = documents_size(documents) if documents else 0
+        if self._overflow_policy == DatalakeOverflowPolicy.BLOCK:
+            await self._wait_for_room(name, documents, size)
+        self._buffer(name, documents, size)
+        return data
+
+    async def flush(self) -> None:
+        """Sends all the buffered documents."""
+        for name, buffer in self._data_buffers.items():
+            await self._flush_buffer(name, buffer)
+
+    async def aclose(self, timeout: float | None = None) -> None:
+        """Sends the buffered documents and stops the flusher task. The
+        buffers are flushed again, waiting for the circuit to close, until
+        they are empty or the timeout expires. Without a timeout it stops
+        once a flush sends nothing. The documents left are kept in the
+        spool, if there is one.
+
+        Parameters
+        ----------
+        timeout: float | None maximum number of seconds to wait.
+        """
+        deadline = None if timeout is None else monotonic() + timeout
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+        if self.running and self._loop is asyncio.get_running_loop():
+            self._room.set()
+            self._wakeup.set()
+            await self._flush_task
+        for name, held in self._reducer.flush().items():
+            with self._lock:
+                self._add(
+                    name, self._data_buffers[name], held, documents_size(held)
+                )
+        flushing = None
+        while left := self._buffered():
+            remaining = None if deadline is None else deadline - monotonic()
+            if remaining is not None and remaining <= 0:
+                break
+            # Nothing is sent while the circuit is open
+            blocked = self._sender.breaker.blocked_until() - monotonic()
+            if blocked > 0:
+                if remaining is None or blocked >= remaining:
+                    break
+                await asyncio.sleep(blocked)
+                continue
+            flushing = asyncio.ensure_future(self.flush())
+            done, _ = await asyncio.wait({flushing}, timeout=remaining)
+            if not done:
+                break
+            flushing = None
+            if timeout is None and self._buffered() >= left:
+                break
+        if left := self._buffered():
+            logger.warning(
+                "Datalake client closed, %s documents were not sent",
+                left,
+                tags=LogTags.DATALAKE,
+            )
+        if flushing is None:
+            if self._spool:
+                self._spool.close()
+            return
+        logger.warning(
+            "Datalake client closed, some documents are still being sent",
+            tags=LogTags.DATALAKE,
+        )
+        # The spool is closed once the flush finishes
+        self._keep(flushing)
+        if self._spool:
+            flushing.add_done_callback(lambda _: self._spool.close())
+
+    def close(self, timeout: float | None = None) -> None:
+        """Sends the buffered documents and stops the flusher task, waiting
+        at most timeout seconds. Called from the event loop it only starts
+        aclose in a task, as it can not block; use aclose there.
+
+        Parameters
+        ----------
+        timeout: float | None maximum number of seconds to wait.
+        """
+        if not self.running or not self._loop.is_running():
+            # There is no event loop, the buffers are sent from this thread
+            super().close(timeout)
+            return
+        if self._in_loop():
+            self._keep(self._loop.create_task(self.aclose(timeout)))
+            return
+        future = asyncio.run_coroutine_threadsafe(
+            self.aclose(timeout), self._loop
+        )
+        try:
+            future.result(timeout)
+        except FutureTimeoutError:
+            logger.warning(
+                "Timeout closing datalake client, some documents were not "
+                "sent",
+                tags=LogTags.DATALAKE,
+            )
+
+    def _in_loop(self) -> bool:
+        try:
+            return asyncio.get_running_loop() is self._loop
+        except RuntimeError:
+            return False
+
+    def _keep(self, task: asyncio.Task) -> None:
+        # The loop only keeps weak references to its tasks
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    def _buffered(self) -> int:
+        with self._lock:
+            return sum(
+                len(buffer.data) for buffer in self._data_buffers.values()
+            )
+
+    def _buffer(self, name: str, documents: list[dict], size: int) -> None:
+        buffer = self._data_buffers[name]
+        with self._lock:
+            self._add(name, buffer, documents, size)
+            flush = buffer.should_flush()
+        # The flusher recomputes its wakeup with the new deadlines
+        if self._in_loop():
+            self._request_flush(name if flush else None)
+            return
+        try:
+            self._loop.call_soon_threadsafe(
+                self._request_flush, name if flush else None
+            )
+        except RuntimeError:
+            # The loop was closed, the documents are sent by close
+            pass
+
+    async def _wait_for_room(
+        self, name: str, documents: list[dict], size: int
+    ) -> None:
+        buffer = self._data_buffers[name]
+        deadline = monotonic() + self._block_timeout
+        while not self._closed:
+            with self._lock:
+                if buffer.has_room(documents, size):
+                    return
+            remaining = deadline - monotonic()
+            if remaining <= 0:
+                return
+            self._room.clear()
+            self._request_flush(name)
+            try:
+                await asyncio.wait_for(self._room.wait(), remaining)
+            except asyncio.TimeoutError:
+                return
+
+    def _request_flush(self, name: str | None) -> None:
+        # Must be called from the event loop
+        if name is not None:
+            self._ready.add(name)
+        self._wakeup.set()
+
+    async def _flusher(self) -> None:
+        while not self._closed:
+            try:
+                await asyncio.wait_for(
+                    self._wakeup.wait(), self._next_wakeup()
+                )
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            if self._closed:
+                return
+            # Nothing is sent while the circuit is open
+            if self._sender.breaker.blocked_until() > monotonic():
+                continue
+            ready, self._ready = self._ready, set()
+            for name, buffer in self._data_buffers.items():
+                if name in ready or buffer.should_flush():
+                    await self._flush_buffer(name, buffer)
+            if self._spool:
+                await asyncio.to_thread(self._spool.sync)
+                await self._spool.async_replay(self._async_send_documents)
+
+    def _next_wakeup(self) -> float | None:
+        # Seconds until a buffer reaches its deadline, or the spool has to
+        # be synced or replayed, None if there is nothing to wait for.
+        now = monotonic()
+        blocked_until = self._sender.breaker.blocked_until()
+        with self._lock:
+            deadlines = [
+                buffer.deadline
+                for buffer in self._data_buffers.values()
+                if buffer.deadline is not None
+            ]
+        if self._spool and (spool := self._spool.next_deadline()) is not None:
+            deadlines.append(spool)
+        if self._ready:
+            deadlines.append(now)
+        if not deadlines:
+            return None
+        return max(min(deadlines), blocked_until, now) - now
+
+    async def _flush_buffer(
+        self, name: str, buffer: DatalakeDocumentBuffer
+    ) -> None:
+        with self._lock:
+            if not buffer.data:
+                return
+            nbytes = buffer.nbytes
+            sizes = buffer.sizes
+            documents = buffer.swap()
+            segment = self._spool.seal(name) if self._spool else None
+        if self._room is not None:
+            self._room.set()
+        logger.debug(
+            "Flushing datalake buffer with %s elements",
+            len(documents),
+            tags=LogTags.DATALAKE,
+        )
+        failed = await self._async_flush_documents(
+            name, documents, sizes, segment
+        )
+        if failed and not self._spool:
+            # Sent again with the next flush, within the buffer limits
+            average = nbytes // len(documents)
+            with self._lock:
+                _, overflow = buffer.add_documents(
+                    failed, average * len(failed)
+                )
+                if overflow:
+                    self._handle_overflow(
+                        name, overflow, average * len(overflow)
+                    )
+
+
+def _coalesce(
+    documents: list[dict], sizes: list[int]
+) -> tuple[list[dict], list[int]]:
+    # Coalesces the documents keeping the size of the ones left
+    coalesced = coalesce(documents, address_key)
+    if coalesced is documents:
+        return documents, sizes
+    size_of = {id(document): size for document, size in zip(documents, sizes)}
+    return coalesced, [size_of[id(document)] for document in coalesced]
@@ -0,0 +1,66 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from contextvars import Context, copy_context
+from itertools import repeat
+from typing import Awaitable, Callable, Iterable, TypeVar
+
+T = TypeVar("T")
+R = TypeVar("R")
+
+
+def map_concurrently(
+    function: Callable[[T], R], items: Iterable[T], max_workers: int = 4
+) -> list[R]:
+    """Calls function with each item from a thread pool, with at most
+    max_workers calls running at the same time.
+
+    Parameters
+    ----------
+    function: Callable the function to call.
+    items: Iterable the arguments of each call.
+    max_workers: int maximum number of concurrent calls.
+
+    Returns
+    -------
+    List the results in the order of the items.
+    """
+    items = list(items)
+    if len(items) <= 1 or max_workers <= 1:
+        return [function(item) for item in items]
+    # Each call runs in a copy of the caller context, so context variables
+    # like the batch_reads scope are seen from the pool threads.
+    contexts = [copy_context() for _ in items]
+    with ThreadPoolExecutor(
+        max_workers=min(max_workers, len(items)),
+        thread_name_prefix="datalake-read",
+    ) as executor:
+        return list(
+            executor.map(Context.run, contexts, repeat(function), items)
+        )
+
+
+async def async_map_concurrently(
+    function: Callable[[T], Awaitable[R]],
+    items: Iterable[T],
+    max_workers: int = 4,
+) -> list[R]:
+    """Awaits function with each item, with at most max_workers calls
+    running at the same time.
+
+    Parameters
+    ----------
+    function: Callable the coroutine function to await.
+    items: Iterable the arguments of each call.
+    max_workers: int maximum number of concurrent calls.
+
+    Returns
+    -------
+    List the results in the order of the items.
+    """
+    semaphore = asyncio.Semaphore(max(max_workers, 1))
+
+    async def call(item: T) -> R:
+        async with semaphore:
+            return await function(item)
+
+    return await asyncio.gather(*(call(item) for item in items))
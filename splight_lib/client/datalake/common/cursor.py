@@ -0,0 +1,148 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from enum import Enum
+from typing import (
+    Any,
+    AsyncIterator,
+    Awaitable,
+    Callable,
+    Hashable,
+    Iterator,
+)
+
+import numpy as np
+
+from splight_lib.client.datalake.common.ingestion import to_utc
+
+# Cursors are moved one microsecond past the last timestamp of a page so
+# the rows of that timestamp are requested again whether the bound is
+# inclusive or not, the repeated ones are dropped.
+CURSOR_OVERLAP = timedelta(microseconds=1)
+
+PageFetcher = Callable[[datetime | None], list[dict]]
+AsyncPageFetcher = Callable[[datetime | None], Awaitable[list[dict]]]
+RowKey = Callable[[dict], Hashable]
+
+
+class ReadFormat(str, Enum):
+    MODELS = "models"
+    DICTS = "dicts"
+    ARRAYS = "arrays"
+
+
+class _Cursor:
+    def __init__(self, limit: int, descending: bool, row_key: RowKey):
+        self._limit = limit
+        self._descending = descending
+        self._row_key = row_key
+        self._seen: set[Hashable] = set()
+
+    def next_bound(self, page: list[dict]) -> datetime | None:
+        """Bound of the next page, None if page is the last one."""
+        if len(page) < self._limit:
+            return None
+        last = to_utc(page[-1]["timestamp"])
+        if self._descending:
+            return last + CURSOR_OVERLAP
+        return last - CURSOR_OVERLAP
+
+    def new_rows(self, page: list[dict]) -> list[dict]:
+        """Drops the rows already returned by the previous page."""
+        rows = [row for row in page if self._row_key(row) not in self._seen]
+        if page:
+            last = page[-1]["timestamp"]
+            self._seen = {
+                self._row_key(row) for row in page if row["timestamp"] == last
+            }
+        return rows
+
+
+def iter_pages(
+    fetch: PageFetcher, limit: int, descending: bool, row_key: RowKey
+) -> Iterator[list[dict]]:
+    """Pages through a read with a timestamp cursor. The next page is
+    requested from a background thread while the current one is processed,
+    so at most two pages are held in memory.
+
+    Parameters
+    ----------
+    fetch: Callable that requests a page of at most limit rows, sorted by
+        timestamp, starting at the given bound or at the start of the read
+        if the bound is None.
+    limit: int the number of rows of a full page.
+    descending: bool whether the rows are sorted in descending order.
+    row_key: Callable returning a key that identifies a row.
+
+    Returns
+    -------
+    Iterator with the rows of each page.
+    """
+    cursor = _Cursor(limit, descending, row_key)
+    with ThreadPoolExecutor(
+        max_workers=1, thread_name_prefix="datalake-cursor"
+    ) as executor:
+        future = executor.submit(fetch, None)
+        while future is not None:
+            page = future.result()
+            bound = cursor.next_bound(page)
+            future = (
+                executor.submit(fetch, bound) if bound is not None else None
+            )
+            rows = cursor.new_rows(page)
+            if not rows:
+                break
+            yield rows
+
+
+async def aiter_pages(
+    fetch: AsyncPageFetcher, limit: int, descending: bool, row_key: RowKey
+) -> AsyncIterator[list[dict]]:
+    """Async version of iter_pages, the next page is requested in a task
+    while the current one is processed.
+    """
+    cursor = _Cursor(limit, descending, row_key)
+    task = asyncio.ensure_future(fetch(None))
+    try:
+        while task is not None:
+            page = await task
+            bound = cursor.next_bound(page)
+            task = (
+                asyncio.ensure_future(fetch(bound))
+                if bound is not None
+                else None
+            )
+            rows = cursor.new_rows(page)
+            if not rows:
+                break
+            yield rows
+    finally:
+        if task is not None:
+            task.cancel()
+
+
+def to_arrays(rows: list[dict]) -> dict[str, np.ndarray]:
+    """Converts rows to a dict of arrays with one entry per field, the
+    timestamps as datetime64[us] in UTC.
+    """
+    arrays = {
+        field: np.array([row.get(field) for row in rows])
+        for field in (rows[0] if rows else {})
+        if field != "timestamp"
+    }
+    arrays["timestamp"] = np.array(
+        [to_utc(row["timestamp"]).replace(tzinfo=None) for row in rows],
+        dtype="datetime64[us]",
+    )
+    return arrays
+
+
+def format_rows(
+    rows: list[dict], output: ReadFormat, model_class: type | None = None
+) -> Any:
+    """Returns the rows of a page as models, dicts or arrays."""
+    if output == ReadFormat.MODELS:
+        return [model_class.model_validate(row) for row in rows]
+    if output == ReadFormat.ARRAYS:
+        return to_arrays(rows)
+    return rows
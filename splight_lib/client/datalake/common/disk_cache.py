@@ -0,0 +1,274 @@
+import json
+import os
+import shutil
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from functools import cache
+from hashlib import sha256
+from pathlib import Path
+from tempfile import mkdtemp
+from threading import Lock
+from typing import Any
+
+import numpy as np
+
+from splight_lib.client.datalake.common.arrays import DatalakeArrays
+from splight_lib.client.datalake.common.ingestion import to_utc
+from splight_lib.logging._internal import LogTags, get_splight_logger
+from splight_lib.settings import datalake_settings
+
+logger = get_splight_logger()
+
+_ARRAYS = ("timestamp", "value", "key")
+
+
+@dataclass
+class _Segment:
+    path: Path
+    start: int
+    end: int
+
+
+def storable_dtype(values: list[Any]) -> np.dtype | None:
+    """The dtype values are stored with, None if they can not be memory
+    mapped, like mixed types.
+    """
+    kinds = {type(value) for value in values}
+    if kinds <= {bool}:
+        return np.dtype(np.bool_)
+    if kinds <= {int, float}:
+        return np.dtype(np.float64)
+    if kinds <= {str}:
+        return np.dtype(str)
+    return None
+
+
+def _nanoseconds(timestamp: datetime) -> int:
+    timestamp = to_utc(timestamp)
+    return int(timestamp.timestamp()) * 10**9 + timestamp.microsecond * 1000
+
+
+class DatalakeDiskCache:
+    """Keeps complete responses of settled time ranges, the ones that end
+    before the settled horizon, in local segment files.
+
+    Each segment holds the points of a closed range of a series key as
+    timestamp, value and key code .npy arrays that are memory mapped when
+    read. The segments of a key are indexed by their directory names, so
+    the cache can be shared by processes. The least recently read
+    segments are removed when the files are above max_bytes.
+    """
+
+    def __init__(
+        self,
+        directory: str | Path,
+        max_bytes: int = 1024 * 1024 * 1024,
+        settled: float = 86400,
+    ):
+        self._directory = Path(directory)
+        self._directory.mkdir(parents=True, exist_ok=True)
+        self._max_bytes = max_bytes
+        self._settled = timedelta(seconds=settled)
+        self._lock = Lock()
+
+    def is_settled(self, end: datetime) -> bool:
+        """Whether the data up to end no longer changes."""
+        return to_utc(end) <= datetime.now(timezone.utc) - self._settled
+
+    def get(
+        self, key: Any, start: datetime, end: datetime
+    ) -> DatalakeArrays | None:
+        """Returns the points of [start, end] in ascending order, None if
+        the range is not covered by the cached segments.
+
+        Parameters
+        ----------
+        key: Any JSON serializable key of the series.
+        start: datetime the start of the range.
+        end: datetime the end of the range.
+        """
+        low, high = _nanoseconds(start), _nanoseconds(end)
+        chain = self._covering(self._segments(key), low, high)
+        if chain is None:
+            return None
+        parts = []
+        for position, segment in enumerate(chain):
+            try:
+                arrays = self._load(segment)
+            except (OSError, ValueError):
+                return None
+            # Points at the bound of two segments may be in both
+            lower = low if position == 0 else chain[position - 1].end
+            timestamps = arrays.timestamp.view(np.int64)
+            begin = np.searchsorted(timestamps, lower, side="left")
+            finish = np.searchsorted(timestamps, high, side="right")
+            parts.append((arrays, begin, finish))
+            os.utime(segment.path)
+        return _join(parts)
+
+    def put(
+        self,
+        key: Any,
+        start: datetime,
+        end: datetime,
+        arrays: DatalakeArrays,
+    ) -> None:
+        """Stores the complete points of [start, end] of a series key.
+        Values of mixed types are not stored.
+        """
+        if not self.is_settled(end):
+            return
+        value = arrays.value
+        if value.dtype == object:
+            dtype = storable_dtype(value.tolist())
+            if dtype is None:
+                return
+            value = value.astype(dtype)
+        low, high = _nanoseconds(start), _nanoseconds(end)
+        order = np.argsort(arrays.timestamp, kind="stable")
+        directory = self._key_directory(key)
+        directory.mkdir(parents=True, exist_ok=True)
+        tmp = Path(mkdtemp(dir=directory, prefix=".tmp-"))
+        try:
+            np.save(tmp / "timestamp.npy", arrays.timestamp[order])
+            np.save(tmp / "value.npy", value[order])
+            key_codes = (
+                arrays.key[order]
+                if arrays.key is not None
+                else np.zeros(len(order), dtype=np.int32)
+            )
+            np.save(tmp / "key.npy", key_codes)
+            (tmp / "keys.json").write_text(json.dumps(arrays.keys))
+            os.rename(tmp, directory / f"{low}-{high}")
+        except OSError:
+            # Already stored by another reader
+            shutil.rmtree(tmp, ignore_errors=True)
+            return
+        self._evict()
+
+    def clear(self) -> None:
+        shutil.rmtree(self._directory, ignore_errors=True)
+        self._directory.mkdir(parents=True, exist_ok=True)
+
+    def _key_directory(self, key: Any) -> Path:
+        digest = sha256(json.dumps(key, default=str).encode("utf-8"))
+        return self._directory / digest.hexdigest()
+
+    def _segments(self, key: Any) -> list[_Segment]:
+        directory = self._key_directory(key)
+        if not directory.is_dir():
+            return []
+        segments = []
+        for entry in os.scandir(directory):
+            if entry.name.startswith("."):
+                continue
+            start, _, end = entry.name.partition("-")
+            segments.append(_Segment(Path(entry.path), int(start), int(end)))
+        return sorted(segments, key=lambda segment: segment.start)
+
+    @staticmethod
+    def _covering(
+        segments: list[_Segment], low: int, high: int
+    ) -> list[_Segment] | None:
+        chain, cursor = [], low
+        for segment in segments:
+            if segment.start > cursor:
+                break
+            if segment.end < cursor or (chain and segment.end <= cursor):
+                continue
+            chain.append(segment)
+            cursor = segment.end
+            if cursor >= high:
+                return chain
+        return None
+
+    @staticmethod
+    def _load(segment: _Segment) -> DatalakeArrays:
+        arrays = {
+            name: np.load(segment.path / f"{name}.npy", mmap_mode="r")
+            for name in _ARRAYS
+        }
+        keys = json.loads((segment.path / "keys.json").read_text())
+        return DatalakeArrays(
+            timestamp=arrays["timestamp"],
+            value=arrays["value"],
+            key=arrays["key"],
+            keys=[tuple(key) for key in keys],
+        )
+
+    def _evict(self) -> None:
+        with self._lock:
+            segments = []
+            total = 0
+            for key_directory in self._directory.iterdir():
+                if not key_directory.is_dir():
+                    continue
+                for segment in key_directory.iterdir():
+                    if segment.name.startswith("."):
+                        continue
+                    size = sum(
+                        file.stat().st_size for file in segment.iterdir()
+                    )
+                    segments.append((segment.stat().st_mtime, size, segment))
+                    total += size
+            segments.sort()
+            for _, size, segment in segments:
+                if total <= self._max_bytes:
+                    break
+                shutil.rmtree(segment, ignore_errors=True)
+                total -= size
+                logger.debug(
+                    "Removed datalake cache segment %s",
+                    segment,
+                    tags=LogTags.DATALAKE,
+                )
+
+
+def _join(parts: list[tuple[DatalakeArrays, int, int]]) -> DatalakeArrays:
+    if len(parts) == 1:
+        arrays, begin, finish = parts[0]
+        return DatalakeArrays(
+            timestamp=arrays.timestamp[begin:finish],
+            value=arrays.value[begin:finish],
+            key=arrays.key[begin:finish],
+            keys=arrays.keys,
+        )
+    # Codes are remapped to the keys of all the segments and the points
+    # repeated at segment bounds are dropped.
+    keys: dict[tuple, int] = {}
+    timestamps, values, codes = [], [], []
+    for arrays, begin, finish in parts:
+        mapping = np.array(
+            [keys.setdefault(key, len(keys)) for key in arrays.keys] or [0],
+            dtype=np.int32,
+        )
+        timestamps.append(arrays.timestamp[begin:finish])
+        values.append(arrays.value[begin:finish])
+        codes.append(mapping[arrays.key[begin:finish]])
+    timestamp = np.concatenate(timestamps)
+    value = np.concatenate(values)
+    code = np.concatenate(codes)
+    order = np.lexsort((code, timestamp))
+    timestamp, value, code = timestamp[order], value[order], code[order]
+    unique = np.ones(len(order), dtype=bool)
+    unique[1:] = (timestamp[1:] != timestamp[:-1]) | (code[1:] != code[:-1])
+    return DatalakeArrays(
+        timestamp=timestamp[unique],
+        value=value[unique],
+        key=code[unique],
+        keys=list(keys),
+    )
+
+
+@cache
+def get_disk_cache() -> DatalakeDiskCache | None:
+    """Returns the disk cache of the datalake models, None if
+    DL_DISK_CACHE_DIR is not set.
+    """
+    if not datalake_settings.DL_DISK_CACHE_DIR:
+        return None
+    return DatalakeDiskCache(
+        datalake_settings.DL_DISK_CACHE_DIR,
+        max_bytes=datalake_settings.DL_DISK_CACHE_MAX_BYTES,
+        settled=datalake_settings.DL_DISK_CACHE_SETTLED,
+    )
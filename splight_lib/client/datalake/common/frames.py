@@ -0,0 +1,58 @@
+from typing import Hashable
+
+import numpy as np
+import pandas as pd
+
+
+def parse_timestamps(timestamps: list[str]) -> pd.DatetimeIndex:
+    """Parses ISO 8601 timestamps with a single vectorized call."""
+    return pd.DatetimeIndex(
+        pd.to_datetime(timestamps, utc=True, format="ISO8601"),
+        name="timestamp",
+    )
+
+
+def wide_frame(
+    rows: list[dict], columns: list[Hashable], dtype: np.dtype | type = float
+) -> pd.DataFrame:
+    """Builds a timestamp indexed DataFrame with one column per series from
+    rows with a timestamp and the value of each series by its key. The
+    values are written to pre-sized arrays, missing ones are NaN or None.
+
+    Parameters
+    ----------
+    rows: List[Dict] the rows, as {"timestamp": ..., key: value, ...}.
+    columns: List the keys of the series, in column order.
+    dtype: the dtype of the columns.
+
+    Returns
+    -------
+    pd.DataFrame with the keys as columns.
+    """
+    dtype = np.dtype(dtype)
+    fill = np.nan if dtype.kind in "fc" else None
+    positions = {key: position for position, key in enumerate(columns)}
+    data = [np.full(len(rows), fill, dtype=dtype) for _ in columns]
+    timestamps = [None] * len(rows)
+    for index, row in enumerate(rows):
+        for key, value in row.items():
+            if key == "timestamp":
+                timestamps[index] = value
+                continue
+            position = positions.get(key)
+            if position is not None and value is not None:
+                data[position][index] = value
+    return pd.DataFrame(
+        dict(zip(columns, data)), index=parse_timestamps(timestamps)
+    )
+
+
+def address_columns(addresses: list[tuple[str, str]]) -> pd.MultiIndex:
+    """Column index with categorical asset and attribute levels."""
+    return pd.MultiIndex.from_arrays(
+        [
+            pd.Categorical([asset for asset, _ in addresses]),
+            pd.Categorical([attribute for _, attribute in addresses]),
+        ],
+        names=["asset", "attribute"],
+    )
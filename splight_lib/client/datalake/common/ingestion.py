@@ -0,0 +1,93 @@
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from datetime import datetime, timezone
+from typing import Any, Callable, Iterable, Iterator, Sequence
+
+import numpy as np
+import pandas as pd
+
+ProgressCallback = Callable[[int, int], None]
+
+
+def to_utc(timestamp: datetime | str) -> datetime:
+    """Parses a timestamp as an aware datetime, naive ones are taken as
+    UTC.
+    """
+    if isinstance(timestamp, str):
+        timestamp = datetime.fromisoformat(timestamp.replace("Z", "+00:00"))
+    if timestamp.tzinfo is None:
+        return timestamp.replace(tzinfo=timezone.utc)
+    return timestamp
+
+
+def format_timestamps(
+    timestamps: Sequence[datetime] | np.ndarray | pd.Series,
+) -> list[str]:
+    """Formats timestamps as UTC ISO 8601 strings with vectorized
+    operations. Naive timestamps are taken as UTC.
+
+    Parameters
+    ----------
+    timestamps: Sequence | np.ndarray | pd.Series the timestamps to format.
+
+    Returns
+    -------
+    List[str] the timestamps with the "%Y-%m-%dT%H:%M:%S.%fZ" format.
+    """
+    index = pd.DatetimeIndex(pd.to_datetime(timestamps, utc=True))
+    utc = index.tz_convert(None).values.astype("datetime64[us]")
+    return np.char.add(np.datetime_as_string(utc, unit="us"), "Z").tolist()
+
+
+def iter_records(
+    df: pd.DataFrame, chunk_size: int
+) -> Iterator[list[dict[str, Any]]]:
+    """Yields the rows of a DataFrame as lists of at most chunk_size
+    records, so only one chunk is converted to dicts at a time.
+    """
+    for start in range(0, len(df), chunk_size):
+        yield df.iloc[start : start + chunk_size].to_dict("records")
+
+
+def upload_chunks(
+    chunks: Iterable[list[dict]],
+    send: Callable[[list[dict]], Any],
+    total: int,
+    max_workers: int = 4,
+    progress: ProgressCallback | None = None,
+) -> None:
+    """Sends chunks of documents concurrently. At most max_workers chunks
+    are in flight, so the chunks are consumed as they are sent.
+
+    Parameters
+    ----------
+    chunks: Iterable[List[Dict]] the chunks of documents to send.
+    send: Callable that sends a chunk.
+    total: int the total number of documents, reported to progress.
+    max_workers: int maximum number of concurrent uploads.
+    progress: Callable | None called with the number of documents sent so
+        far and the total after each chunk is sent.
+    """
+    sent = 0
+
+    def report(done) -> None:
+        nonlocal sent
+        for future in done:
+            sent += future.result()
+            if progress is not None:
+                progress(sent, total)
+
+    def upload(chunk: list[dict]) -> int:
+        send(chunk)
+        return len(chunk)
+
+    with ThreadPoolExecutor(
+        max_workers=max_workers, thread_name_prefix="datalake-upload"
+    ) as executor:
+        pending = set()
+        for chunk in chunks:
+            if len(pending) >= max_workers:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                report(done)
+            pending.add(executor.submit(upload, chunk))
+        done, _ = wait(pending)
+        report(done)
@@ -0,0 +1,334 @@
+import asyncio
+from abc import ABC, abstractmethod
+from collections import Counter
+from concurrent.futures import Future
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from threading import Event, Lock, get_ident
+from typing import Any, Awaitable, Callable, Hashable, Iterator
+
+from splight_lib.client.datalake.common.concurrency import map_concurrently
+from splight_lib.settings import datalake_settings
+
+# Largest limit of a merged request, the one accepted by the datalake
+MAX_READ_LIMIT = 10000
+
+ReadFunction = Callable[[dict], dict]
+AsyncReadFunction = Callable[[dict], Awaitable[dict]]
+
+
+class ReadMerger(ABC):
+    """Merges compatible read requests of a datalake API version into one
+    request with the keys of all of them, and splits its response.
+    """
+
+    max_keys: int
+
+    @abstractmethod
+    def group_key(self, request: dict) -> Hashable:
+        """Requests with the same group key can be merged."""
+
+    @abstractmethod
+    def size(self, request: dict) -> int:
+        """Number of series keys in the request."""
+
+    @abstractmethod
+    def merge(self, requests: list[dict]) -> dict:
+        """Builds a request with the keys of all the requests."""
+
+    @abstractmethod
+    def split(self, request: dict, merged: dict, response: dict) -> dict:
+        """Extracts the response of a request from the merged response."""
+
+    def merged_limit(self, requests: list[dict]) -> int:
+        """The sum of the limits of the requests, up to MAX_READ_LIMIT."""
+        return min(
+            sum(request["limit"] for request in requests), MAX_READ_LIMIT
+        )
+
+    def complete(self, merged: dict, response: dict) -> bool:
+        # A merged response that hit the limit may miss the points of some
+        # of the requests.
+        return len(response["results"]) < merged["limit"]
+
+
+@dataclass
+class _Batch:
+    group: Hashable
+    full: Event | asyncio.Event
+    requests: list[dict] = field(default_factory=list)
+    futures: list[Any] = field(default_factory=list)
+    size: int = 0
+
+
+class ReadBatcher:
+    """Merges the compatible reads issued within delay seconds of each
+    other into a single request with all their keys, and fans the response
+    back out to each caller, like a DataLoader.
+
+    Reads are merged across the threads and asyncio tasks that run in a
+    batch_reads scope with the same batcher. Sync reads are only merged
+    with sync reads and async reads with the ones of the same event loop.
+    When a merged response hits its limit, the requests are sent alone.
+
+    Only concurrent reads are merged. A sync read blocks its thread, so it
+    waits for the delay only when another thread shares the batcher, in a
+    batch_reads scope or reading. Otherwise it is sent right away.
+    """
+
+    def __init__(self, delay: float | None = None):
+        self._delay = (
+            datalake_settings.DL_READ_BATCH_DELAY if delay is None else delay
+        )
+        self._lock = Lock()
+        self._pending: dict[Hashable, _Batch] = {}
+        self._tasks: set[asyncio.Task] = set()
+        # Number of scopes and reads of each thread using the batcher
+        self._threads: Counter[int] = Counter()
+
+    def get(
+        self, merger: ReadMerger, request: dict, read: ReadFunction
+    ) -> dict:
+        """Reads the request merged with the others of its batch."""
+        future: Future = Future()
+        self._enter()
+        try:
+            batch, leader = self._join(
+                (merger, merger.group_key(request)),
+                merger,
+                request,
+                future,
+                Event,
+            )
+            if leader:
+                if self._shared():
+                    batch.full.wait(self._delay)
+                self._close(batch)
+                self._send(batch, merger, read)
+        finally:
+            self._exit()
+        return future.result()
+
+    async def async_get(
+        self, merger: ReadMerger, request: dict, read: AsyncReadFunction
+    ) -> dict:
+        """Async version of get."""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        batch, leader = self._join(
+            (merger, merger.group_key(request), loop),
+            merger,
+            request,
+            future,
+            asyncio.Event,
+        )
+        if leader:
+            # The batch is sent from a task, so cancelling the caller that
+            # created it does not leave the others waiting.
+            task = loop.create_task(self._async_flush(batch, merger, read))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+        return await future
+
+    async def _async_flush(
+        self, batch: _Batch, merger: ReadMerger, read: AsyncReadFunction
+    ) -> None:
+        try:
+            await asyncio.wait_for(batch.full.wait(), self._delay)
+        except asyncio.TimeoutError:
+            pass
+        self._close(batch)
+        await self._async_send(batch, merger, read)
+
+    def _enter(self) -> None:
+        with self._lock:
+            self._threads[get_ident()] += 1
+
+    def _exit(self) -> None:
+        ident = get_ident()
+        with self._lock:
+            self._threads[ident] -= 1
+            if not self._threads[ident]:
+                del self._threads[ident]
+
+    def _shared(self) -> bool:
+        # Whether a thread other than the caller can join its batch
+        ident = get_ident()
+        with self._lock:
+            return any(thread != ident for thread in self._threads)
+
+    def _join(
+        self,
+        group: Hashable,
+        merger: ReadMerger,
+        request: dict,
+        future: Any,
+        event: type,
+    ) -> tuple[_Batch, bool]:
+        size = merger.size(request)
+        with self._lock:
+            batch = self._pending.get(group)
+            if batch is not None and batch.size + size > merger.max_keys:
+                # The batch is full, it is sent without waiting the delay
+                del self._pending[group]
+                batch.full.set()
+                batch = None
+            leader = batch is None
+            if leader:
+                batch = self._pending[group] = _Batch(group, event())
+            batch.requests.append(request)
+            batch.futures.append(future)
+            batch.size += size
+        return batch, leader
+
+    def _close(self, batch: _Batch) -> None:
+        # Reads issued from now on start a new batch
+        with self._lock:
+            if self._pending.get(batch.group) is batch:
+                del self._pending[batch.group]
+
+    def _send(
+        self, batch: _Batch, merger: ReadMerger, read: ReadFunction
+    ) -> None:
+        requests = batch.requests
+        try:
+            if len(requests) == 1:
+                responses = [_outcome(read, requests[0])]
+            else:
+                merged = merger.merge(requests)
+                responses = _split(
+                    merger, requests, merged, _outcome(read, merged)
+                )
+                if responses is None:
+                    responses = map_concurrently(
+                        lambda request: _outcome(read, request),
+                        requests,
+                        max_workers=datalake_settings.DL_READ_CONCURRENCY,
+                    )
+        except Exception as exc:
+            responses = [exc] * len(requests)
+        for future, response in zip(batch.futures, responses):
+            _resolve(future, response)
+
+    async def _async_send(
+        self, batch: _Batch, merger: ReadMerger, read: AsyncReadFunction
+    ) -> None:
+        requests = batch.requests
+        try:
+            if len(requests) == 1:
+                responses = [await _async_outcome(read, requests[0])]
+            else:
+                merged = merger.merge(requests)
+                responses = _split(
+                    merger,
+                    requests,
+                    merged,
+                    await _async_outcome(read, merged),
+                )
+                if responses is None:
+                    responses = await asyncio.gather(
+                        *(
+                            _async_outcome(read, request)
+                            for request in requests
+                        )
+                    )
+        except Exception as exc:
+            responses = [exc] * len(requests)
+        for future, response in zip(batch.futures, responses):
+            # The futures of cancelled callers are already done
+            if not future.done():
+                _resolve(future, response)
+
+
+def _split(
+    merger: ReadMerger,
+    requests: list[dict],
+    merged: dict,
+    response: dict | Exception,
+) -> list[dict | Exception] | None:
+    if isinstance(response, Exception):
+        return [response] * len(requests)
+    if not merger.complete(merged, response):
+        return None
+    return [merger.split(request, merged, response) for request in requests]
+
+
+def _resolve(future: Any, response: dict | Exception) -> None:
+    if isinstance(response, BaseException):
+        future.set_exception(response)
+    else:
+        future.set_result(response)
+
+
+def _outcome(read: ReadFunction, request: dict) -> dict | Exception:
+    try:
+        return read(request)
+    except Exception as exc:
+        return exc
+
+
+async def _async_outcome(
+    read: AsyncReadFunction, request: dict
+) -> dict | Exception:
+    try:
+        return await read(request)
+    except Exception as exc:
+        return exc
+
+
+_batcher: ContextVar[ReadBatcher | None] = ContextVar(
+    "datalake_read_batcher", default=None
+)
+
+
+@contextmanager
+def batch_reads(
+    delay: float | None = None, batcher: ReadBatcher | None = None
+) -> Iterator[ReadBatcher]:
+    """Merges the datalake reads issued in the scope, and in the asyncio
+    tasks created in it, with the compatible ones issued within delay
+    seconds. Reads of the same window, aggregation and sort become one
+    request with all their keys. Only concurrent reads are merged, the
+    sync reads of a thread that does not share the batcher are sent
+    without waiting.
+
+    Parameters
+    ----------
+    delay: float | None seconds to wait for other reads before sending a
+        batch, defaults to DL_READ_BATCH_DELAY.
+    batcher: ReadBatcher | None the batcher of the scope, pass the one of
+        another scope to merge the reads of other threads.
+
+    Returns
+    -------
+    ReadBatcher the batcher of the scope.
+    """
+    batcher = batcher or ReadBatcher(delay)
+    token = _batcher.set(batcher)
+    batcher._enter()
+    try:
+        yield batcher
+    finally:
+        batcher._exit()
+        _batcher.reset(token)
+
+
+def batched_read(
+    merger: ReadMerger, request: dict, read: ReadFunction
+) -> dict:
+    """Reads the request, through the batcher of the scope if any."""
+    batcher = _batcher.get()
+    if batcher is None:
+        return read(request)
+    return batcher.get(merger, request, read)
+
+
+async def async_batched_read(
+    merger: ReadMerger, request: dict, read: AsyncReadFunction
+) -> dict:
+    """Async version of batched_read."""
+    batcher = _batcher.get()
+    if batcher is None:
+        return await read(request)
+    return await batcher.async_get(merger, request, read)
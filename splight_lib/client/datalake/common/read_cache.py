@@ -0,0 +1,277 @@
+from bisect import bisect_left
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import datetime
+from functools import cache
+from threading import Lock
+from time import monotonic
+from typing import Awaitable, Callable, Hashable
+
+from splight_lib.client.datalake.common.buffer import documents_size
+from splight_lib.client.datalake.common.cursor import RowKey
+from splight_lib.client.datalake.common.ingestion import to_utc
+from splight_lib.settings import datalake_settings
+
+# Fetches the rows from the given start, or the whole window if None
+TailFetcher = Callable[[datetime | None], list[dict]]
+AsyncTailFetcher = Callable[[datetime | None], Awaitable[list[dict]]]
+
+
+@dataclass
+class _CacheEntry:
+    # Rows in ascending order with their parsed timestamps
+    timestamps: list[datetime]
+    rows: list[dict]
+    # The rows are complete from this timestamp on, earlier ones may be
+    # missing if a response hit the limit.
+    complete_from: datetime
+    nbytes: int
+    updated: float
+
+
+class DatalakeReadCache:
+    """Keeps the rows of sliding window reads, the ones whose end is now,
+    so a repeated read only requests the points after the last cached
+    timestamp. The rows before the start of the last read are discarded.
+
+    Entries unused for ttl seconds are dropped, the least recently used
+    ones are evicted when there are more than max_entries or their
+    estimated size is above max_bytes.
+    """
+
+    def __init__(
+        self,
+        max_bytes: int = 64 * 1024 * 1024,
+        ttl: float = 300,
+        max_entries: int = 1024,
+    ):
+        self._max_bytes = max_bytes
+        self._ttl = ttl
+        self._max_entries = max_entries
+        self._lock = Lock()
+        self._entries: OrderedDict[Hashable, _CacheEntry] = OrderedDict()
+        self._nbytes = 0
+
+    @property
+    def nbytes(self) -> int:
+        return self._nbytes
+
+    def read(
+        self,
+        key: Hashable,
+        start: datetime,
+        limit: int,
+        descending: bool,
+        row_key: RowKey,
+        fetch: TailFetcher,
+    ) -> list[dict]:
+        """Returns the rows of a read from start to now.
+
+        Parameters
+        ----------
+        key: Hashable identifies the series and aggregation of the read.
+        start: datetime the start of the read.
+        limit: int the maximum number of rows of a response.
+        descending: bool whether the rows are sorted in descending order.
+        row_key: Callable returning a key that identifies a row.
+        fetch: Callable that requests the rows from the given timestamp to
+            now, or from start if it is None.
+
+        Returns
+        -------
+        List[Dict] the rows as returned by a request of the whole window.
+        """
+        start = to_utc(start)
+        tail_start = self._tail_start(key, start, descending)
+        if tail_start is not None:
+            rows = self._merge(
+                key, start, limit, descending, row_key, fetch(tail_start)
+            )
+            if rows is not None:
+                return rows
+        return self._store(key, start, limit, descending, fetch(None))
+
+    async def async_read(
+        self,
+        key: Hashable,
+        start: datetime,
+        limit: int,
+        descending: bool,
+        row_key: RowKey,
+        fetch: AsyncTailFetcher,
+    ) -> list[dict]:
+        """Async version of read."""
+        start = to_utc(start)
+        tail_start = self._tail_start(key, start, descending)
+        if tail_start is not None:
+            rows = self._merge(
+                key, start, limit, descending, row_key, await fetch(tail_start)
+            )
+            if rows is not None:
+                return rows
+        return self._store(key, start, limit, descending, await fetch(None))
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._nbytes = 0
+
+    def _tail_start(
+        self, key: Hashable, start: datetime, descending: bool
+    ) -> datetime | None:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if monotonic() - entry.updated > self._ttl or (
+                entry.complete_from > start and not descending
+            ):
+                self._remove(key)
+                return None
+            if not entry.rows:
+                return entry.complete_from
+            return entry.timestamps[-1]
+
+    def _merge(
+        self,
+        key: Hashable,
+        start: datetime,
+        limit: int,
+        descending: bool,
+        row_key: RowKey,
+        tail: list[dict],
+    ) -> list[dict] | None:
+        if len(tail) >= limit:
+            # There may be a gap between the cached rows and the tail
+            return None
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            tail_rows = sorted(
+                ((to_utc(row["timestamp"]), row) for row in tail),
+                key=lambda item: item[0],
+            )
+            # The rows of the first tail timestamp are requested again and
+            # replace the cached ones, the last aggregation window may have
+            # changed.
+            first = tail_rows[0][0] if tail_rows else None
+            keys = {row_key(row) for _, row in tail_rows}
+            position = (
+                bisect_left(entry.timestamps, first)
+                if first is not None
+                else len(entry.rows)
+            )
+            kept = [
+                (timestamp, row)
+                for timestamp, row in zip(
+                    entry.timestamps[position:], entry.rows[position:]
+                )
+                if timestamp == first and row_key(row) not in keys
+            ]
+            timestamps = entry.timestamps[:position]
+            rows = entry.rows[:position]
+            for timestamp, row in kept + tail_rows:
+                timestamps.append(timestamp)
+                rows.append(row)
+            # Slide the window
+            offset = bisect_left(timestamps, start)
+            timestamps, rows = timestamps[offset:], rows[offset:]
+            complete_from = max(entry.complete_from, start)
+            if complete_from > start and len(rows) < limit:
+                self._remove(key)
+                return None
+            # Estimated from the average size of the cached rows, so only
+            # the new rows are measured.
+            cached = len(rows) - len(tail_rows)
+            nbytes = documents_size(tail) + (
+                entry.nbytes * cached // len(entry.rows) if entry.rows else 0
+            )
+            self._replace(
+                key, timestamps, rows, complete_from, nbytes, descending, limit
+            )
+            return self._answer(rows, limit, descending)
+
+    def _store(
+        self,
+        key: Hashable,
+        start: datetime,
+        limit: int,
+        descending: bool,
+        rows: list[dict],
+    ) -> list[dict]:
+        items = sorted(
+            ((to_utc(row["timestamp"]), row) for row in rows),
+            key=lambda item: item[0],
+        )
+        with self._lock:
+            self._remove(key)
+            if len(rows) >= limit and not descending:
+                # Only the first rows of the window are known
+                return rows
+            complete_from = (
+                items[0][0] if len(rows) >= limit and items else start
+            )
+            self._replace(
+                key,
+                [timestamp for timestamp, _ in items],
+                [row for _, row in items],
+                complete_from,
+                documents_size(rows),
+                descending,
+                limit,
+            )
+        return [dict(row) for row in rows]
+
+    def _replace(
+        self,
+        key: Hashable,
+        timestamps: list[datetime],
+        rows: list[dict],
+        complete_from: datetime,
+        nbytes: int,
+        descending: bool,
+        limit: int,
+    ) -> None:
+        # Must be called holding the lock. Descending reads only need the
+        # last limit rows.
+        if descending and len(rows) > limit:
+            nbytes = nbytes * limit // len(rows)
+            timestamps, rows = timestamps[-limit:], rows[-limit:]
+            complete_from = max(complete_from, timestamps[0])
+        self._remove(key)
+        entry = _CacheEntry(
+            timestamps=timestamps,
+            rows=rows,
+            complete_from=complete_from,
+            nbytes=nbytes,
+            updated=monotonic(),
+        )
+        self._entries[key] = entry
+        self._nbytes += entry.nbytes
+        while self._entries and (
+            self._nbytes > self._max_bytes
+            or len(self._entries) > self._max_entries
+        ):
+            self._remove(next(iter(self._entries)))
+
+    def _remove(self, key: Hashable) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._nbytes -= entry.nbytes
+
+    @staticmethod
+    def _answer(rows: list[dict], limit: int, descending: bool) -> list[dict]:
+        if descending:
+            return [dict(row) for row in reversed(rows[-limit:])]
+        return [dict(row) for row in rows[:limit]]
+
+
+@cache
+def get_read_cache() -> DatalakeReadCache:
+    """Returns the read cache shared by the datalake models."""
+    return DatalakeReadCache(
+        max_bytes=datalake_settings.DL_READ_CACHE_MAX_BYTES,
+        ttl=datalake_settings.DL_READ_CACHE_TTL,
+        max_entries=datalake_settings.DL_READ_CACHE_MAX_ENTRIES,
+    )
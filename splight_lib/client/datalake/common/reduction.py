@@ -0,0 +1,190 @@
+from dataclasses import dataclass
+from datetime import datetime
+from threading import Lock
+from typing import Hashable
+
+from splight_lib.client.datalake.common.batching import KeyFunction
+from splight_lib.settings import DatalakeReduction
+
+
+def _seconds(timestamp: str | datetime) -> float:
+    if isinstance(timestamp, str):
+        timestamp = datetime.fromisoformat(timestamp.replace("Z", "+00:00"))
+    return timestamp.timestamp()
+
+
+def _is_number(value) -> bool:
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+def coalesce(documents: list[dict], key: KeyFunction) -> list[dict]:
+    """Keeps the last document for each key and timestamp, preserving the
+    position of the first one.
+
+    Parameters
+    ----------
+    documents: List[Dict] the documents to coalesce.
+    key: Callable returning the key of a document.
+
+    Returns
+    -------
+    List[Dict] the documents without repeated timestamps per key.
+    """
+    latest: dict[tuple, dict] = {}
+    for document in documents:
+        latest[(key(document), str(document.get("timestamp")))] = document
+    if len(latest) == len(documents):
+        return documents
+    return list(latest.values())
+
+
+@dataclass
+class _KeyState:
+    name: str
+    archived_value: float | None = None
+    archived_time: float | None = None
+    held: dict | None = None
+    upper_slope: float = 0
+    lower_slope: float = 0
+    received: int = 0
+    written: int = 0
+
+
+class DatalakeWriteReducer:
+    """Reduces the documents written for each key before they are buffered.
+
+    Numeric values are filtered with an absolute or percent deadband, or
+    with the swinging door algorithm, where the deadband is the deviation
+    allowed from the line between two written points. Non numeric values
+    are always written. When max_silence is set, a point is written if the
+    last one written for its key is older than max_silence seconds.
+
+    The swinging door keeps the last received point of each key until the
+    next one shows whether it is needed, use flush to get those points.
+    """
+
+    def __init__(
+        self,
+        key: KeyFunction,
+        reduction: DatalakeReduction = DatalakeReduction.NONE,
+        deadband: float = 0,
+        max_silence: float | None = None,
+    ):
+        self._key = key
+        self._reduction = reduction
+        self._deadband = deadband
+        self._max_silence = max_silence
+        self._lock = Lock()
+        self._states: dict[tuple[str, Hashable], _KeyState] = {}
+
+    def reduce(self, name: str, documents: list[dict]) -> list[dict]:
+        """Filters the documents of a collection or schema.
+
+        Parameters
+        ----------
+        name: str the collection or schema name of the documents.
+        documents: List[Dict] the documents to filter.
+
+        Returns
+        -------
+        List[Dict] the documents that have to be written.
+        """
+        if self._reduction == DatalakeReduction.NONE:
+            return documents
+        written = []
+        with self._lock:
+            for document in documents:
+                key = (name, self._key(document))
+                state = self._states.get(key)
+                if state is None:
+                    state = self._states[key] = _KeyState(name)
+                state.received += 1
+                for point in self._reduce(state, document):
+                    state.written += 1
+                    written.append(point)
+        return written
+
+    def flush(self) -> dict[str, list[dict]]:
+        """Returns the points held by the swinging door, by collection or
+        schema name, so they are written before closing.
+        """
+        held: dict[str, list[dict]] = {}
+        with self._lock:
+            for state in self._states.values():
+                if state.held is None:
+                    continue
+                held.setdefault(state.name, []).append(state.held)
+                self._archive(state, state.held)
+                state.held = None
+                state.written += 1
+        return held
+
+    def ratios(self) -> dict[tuple[str, Hashable], float]:
+        """Compression ratio of each key, the number of received documents
+        over the number of written ones.
+        """
+        with self._lock:
+            return {
+                key: state.received / max(state.written, 1)
+                for key, state in self._states.items()
+            }
+
+    def _reduce(self, state: _KeyState, document: dict) -> list[dict]:
+        value = document.get("value")
+        if not _is_number(value):
+            return [document]
+        timestamp = _seconds(document["timestamp"])
+        if state.archived_time is None or timestamp <= state.archived_time:
+            # First or out of order point
+            return self._write(state, document, value, timestamp)
+        if (
+            self._max_silence is not None
+            and timestamp - state.archived_time >= self._max_silence
+        ):
+            return self._write(state, document, value, timestamp)
+
+        if self._reduction == DatalakeReduction.SWINGING_DOOR:
+            return self._swinging_door(state, document, value, timestamp)
+        change = abs(value - state.archived_value)
+        if self._reduction == DatalakeReduction.PERCENT:
+            threshold = abs(state.archived_value) * self._deadband / 100
+        else:
+            threshold = self._deadband
+        if change > threshold or (change and not threshold):
+            return self._write(state, document, value, timestamp)
+        return []
+
+    def _swinging_door(
+        self, state: _KeyState, document: dict, value: float, timestamp: float
+    ) -> list[dict]:
+        elapsed = timestamp - state.archived_time
+        upper = (value + self._deadband - state.archived_value) / elapsed
+        lower = (value - self._deadband - state.archived_value) / elapsed
+        if state.held is not None:
+            upper = min(upper, state.upper_slope)
+            lower = max(lower, state.lower_slope)
+        if lower <= upper:
+            state.upper_slope, state.lower_slope = upper, lower
+            state.held = document
+            return []
+        # The door closed, the held point is the last one that can be
+        # represented by a line from the archived point.
+        held = state.held
+        self._archive(state, held)
+        state.held = None
+        return [held, *self._swinging_door(state, document, value, timestamp)]
+
+    def _write(
+        self, state: _KeyState, document: dict, value: float, timestamp: float
+    ) -> list[dict]:
+        points = [document]
+        if state.held is not None:
+            points.insert(0, state.held)
+            state.held = None
+        state.archived_value = value
+        state.archived_time = timestamp
+        return points
+
+    def _archive(self, state: _KeyState, document: dict) -> None:
+        state.archived_value = document["value"]
+        state.archived_time = _seconds(document["timestamp"])
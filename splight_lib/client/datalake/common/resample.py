@@ -0,0 +1,301 @@
+from datetime import datetime, timedelta
+from enum import Enum
+from numbers import Real
+from typing import Hashable
+
+import numpy as np
+import pandas as pd
+
+from splight_lib.client.datalake.common.arrays import DatalakeArrays
+from splight_lib.client.datalake.common.ingestion import to_utc
+
+# Seconds, or anything pd.Timedelta parses such as "5min"
+ResampleWindow = float | timedelta | str
+
+
+class Resampling(str, Enum):
+    """Functions of the local resampler. The aggregations have the values
+    of the datalake AggregationFunction and return a point for each window
+    with points. TIME_WEIGHTED_AVG and STEP hold each value until the next
+    point of its series, and return a point for each window from the first
+    point.
+    """
+
+    SUM = "sum"
+    AVG = "avg"
+    MIN = "min"
+    MAX = "max"
+    COUNT = "count"
+    LAST = "last"
+    TIME_WEIGHTED_AVG = "time_weighted_avg"
+    STEP = "step"
+
+
+HOLD_RESAMPLINGS = (Resampling.TIME_WEIGHTED_AVG, Resampling.STEP)
+REDUCERS = {
+    Resampling.SUM: np.add,
+    Resampling.MIN: np.minimum,
+    Resampling.MAX: np.maximum,
+}
+
+
+def _window_nanoseconds(window: ResampleWindow) -> int:
+    if isinstance(window, Real):
+        nanoseconds = round(window * 1e9)
+    else:
+        nanoseconds = pd.Timedelta(window).value
+    if nanoseconds <= 0:
+        raise ValueError("The resampling window must be positive")
+    return nanoseconds
+
+
+def _bound(timestamp: datetime | str | None) -> int | None:
+    if timestamp is None:
+        return None
+    return pd.Timestamp(to_utc(timestamp)).value
+
+
+def resample(
+    arrays: DatalakeArrays,
+    window: ResampleWindow,
+    aggregation: Resampling | str,
+    start: datetime | str | None = None,
+    end: datetime | str | None = None,
+) -> DatalakeArrays:
+    """Resamples the points of each series to windows of the given size,
+    with segment reductions over the points sorted by key and timestamp.
+    As in the datalake, windows are aligned to the epoch, labeled by their
+    start and the ones without points are skipped.
+
+    Parameters
+    ----------
+    arrays: DatalakeArrays the points, as returned by get_arrays.
+    window: float | timedelta | str the window size, in seconds if a
+        number.
+    aggregation: Resampling | str the function applied to each window,
+        an AggregationFunction can be used.
+    start: datetime | str | None the start of the first window, the first
+        point by default. Earlier points are only used to hold a value.
+    end: datetime | str | None the end of the last window, the one of the
+        last point by default.
+
+    Returns
+    -------
+    DatalakeArrays with a point per window, sorted by key and timestamp.
+    """
+    aggregation = Resampling(aggregation)
+    step = _window_nanoseconds(window)
+    times = arrays.timestamp.astype("datetime64[ns]").view(np.int64)
+    codes = (
+        arrays.key
+        if arrays.key is not None
+        else np.zeros(len(times), dtype=np.int32)
+    )
+    order = np.lexsort((times, codes))
+    times, codes, values = times[order], codes[order], arrays.value[order]
+    if aggregation in HOLD_RESAMPLINGS:
+        labels, codes, values = _hold(
+            times, codes, values, step, aggregation, _bound(start), _bound(end)
+        )
+    else:
+        labels, codes, values = _reduce(
+            times, codes, values, step, aggregation, _bound(start), _bound(end)
+        )
+    return DatalakeArrays(
+        timestamp=labels.view("datetime64[ns]"),
+        value=values,
+        key=codes if arrays.key is not None else None,
+        keys=arrays.keys,
+    )
+
+
+def _reduce(
+    times: np.ndarray,
+    codes: np.ndarray,
+    values: np.ndarray,
+    step: int,
+    aggregation: Resampling,
+    start: int | None,
+    end: int | None,
+) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    if start is not None or end is not None:
+        inside = np.ones(len(times), dtype=bool)
+        if start is not None:
+            inside &= times >= start
+        if end is not None:
+            inside &= times < end
+        times, codes, values = times[inside], codes[inside], values[inside]
+    windows = times // step
+    size = len(windows)
+    # Each segment holds the points of a key in a window
+    bounds = np.flatnonzero((np.diff(windows) != 0) | (np.diff(codes) != 0))
+    firsts = np.concatenate(([0], bounds + 1)) if size else bounds
+    lasts = np.concatenate((bounds, [size - 1])) if size else bounds
+    if aggregation == Resampling.COUNT:
+        result = lasts - firsts + 1
+    elif aggregation == Resampling.LAST:
+        result = values[lasts]
+    elif not size:
+        result = np.empty(0, dtype=np.float64)
+    elif aggregation == Resampling.AVG:
+        numbers = values.astype(np.float64)
+        result = np.add.reduceat(numbers, firsts) / (lasts - firsts + 1)
+    else:
+        numbers = values.astype(np.float64)
+        result = REDUCERS[aggregation].reduceat(numbers, firsts)
+    return windows[firsts] * step, codes[firsts], result
+
+
+def _hold(
+    times: np.ndarray,
+    codes: np.ndarray,
+    values: np.ndarray,
+    step: int,
+    aggregation: Resampling,
+    start: int | None,
+    end: int | None,
+) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    if not len(times):
+        return times, codes, values[:0].astype(np.float64)
+    if start is None:
+        start = times.min()
+    if end is None:
+        end = (times.max() // step + 1) * step
+    grid = np.arange(start // step * step, end, step, dtype=np.int64)
+    if not len(grid):
+        return grid, codes[:0], values[:0].astype(np.float64)
+    labels, result_codes, results = [], [], []
+    bounds = np.flatnonzero(np.diff(codes)) + 1
+    for segment in np.split(np.arange(len(times)), bounds):
+        segment_times = times[segment]
+        segment_values = values[segment]
+        if aggregation == Resampling.STEP:
+            held = np.searchsorted(segment_times, grid, side="right") - 1
+            valid = held >= 0
+            result = segment_values[held[valid]]
+        else:
+            valid, result = _time_weighted_average(
+                segment_times, segment_values, grid, step
+            )
+        labels.append(grid[valid])
+        result_codes.append(np.full(valid.sum(), codes[segment[0]]))
+        results.append(result)
+    return (
+        np.concatenate(labels),
+        np.concatenate(result_codes).astype(codes.dtype),
+        np.concatenate(results),
+    )
+
+
+def _time_weighted_average(
+    times: np.ndarray, values: np.ndarray, grid: np.ndarray, step: int
+) -> tuple[np.ndarray, np.ndarray]:
+    # Only the last point before the grid holds a value inside it
+    first = max(np.searchsorted(times, grid[0], side="right") - 1, 0)
+    last = np.searchsorted(times, grid[-1] + step, side="left")
+    times, values = times[first:last], values[first:last].astype(np.float64)
+    if not len(times):
+        return np.zeros(len(grid), dtype=bool), np.empty(0, np.float64)
+    # Seconds from the start of the grid, to integrate with small numbers
+    seconds = (times - grid[0]) / 1e9
+    starts = (grid - grid[0]) / 1e9
+    ends = starts + step / 1e9
+    held_until = np.append(seconds[1:], max(ends[-1], seconds[-1]))
+    areas = np.concatenate(([0], np.cumsum(values * (held_until - seconds))))
+
+    def integral(bound: np.ndarray) -> np.ndarray:
+        held = np.searchsorted(seconds, bound, side="right") - 1
+        index = np.maximum(held, 0)
+        area = areas[index] + values[index] * (bound - seconds[index])
+        return np.where(held >= 0, area, 0)
+
+    covered = ends - np.maximum(starts, seconds[0])
+    valid = covered > 0
+    averages = (integral(ends) - integral(starts))[valid] / covered[valid]
+    return valid, averages
+
+
+def resample_frame(
+    df: pd.DataFrame,
+    window: ResampleWindow,
+    aggregation: Resampling | str,
+    by: list[Hashable] | None = None,
+    columns: list[Hashable] | None = None,
+    start: datetime | str | None = None,
+    end: datetime | str | None = None,
+) -> pd.DataFrame:
+    """Resamples the columns of a timestamp indexed DataFrame, like the
+    ones returned by get_dataframe and get_wide_dataframe. Missing values
+    of a column are skipped.
+
+    Parameters
+    ----------
+    df: pd.DataFrame the data, indexed by datetimes or ISO 8601 strings.
+    window: float | timedelta | str the window size, in seconds if a
+        number.
+    aggregation: Resampling | str the function applied to each window.
+    by: List | None the columns with the keys of the series, like asset
+        and attribute.
+    columns: List | None the columns to resample, every column not in by
+        by default.
+    start: datetime | str | None the start of the first window.
+    end: datetime | str | None the end of the last window.
+
+    Returns
+    -------
+    pd.DataFrame indexed by the start of each window, with the by columns
+    and the resampled ones.
+    """
+    by = list(by or [])
+    if columns is None:
+        columns = [column for column in df.columns if column not in by]
+    index = pd.DatetimeIndex(
+        pd.to_datetime(df.index, utc=True, format="ISO8601")
+    )
+    times = index.tz_convert(None).to_numpy(dtype="datetime64[ns]")
+    keys: list[tuple] = []
+    codes = None
+    if by:
+        codes = (
+            df.groupby(by, sort=False, dropna=False)
+            .ngroup()
+            .to_numpy(dtype=np.int32)
+        )
+        keys = list(df[by].drop_duplicates().itertuples(False, None))
+    resampled = []
+    for column in columns:
+        present = df[column].notna().to_numpy()
+        result = resample(
+            DatalakeArrays(
+                timestamp=times[present],
+                value=df[column].to_numpy()[present],
+                key=codes[present] if codes is not None else None,
+                keys=keys,
+            ),
+            window,
+            aggregation,
+            start=start,
+            end=end,
+        )
+        series_index = pd.DatetimeIndex(result.timestamp, tz="UTC")
+        if codes is not None:
+            series_index = pd.MultiIndex.from_arrays(
+                [series_index, result.key]
+            )
+        resampled.append(
+            pd.Series(result.value, index=series_index, name=column)
+        )
+    if not resampled:
+        return pd.DataFrame(columns=[*by, *columns])
+    frame = pd.concat(resampled, axis=1).sort_index()
+    if codes is not None:
+        frame_codes = frame.index.get_level_values(1)
+        frame.index = frame.index.get_level_values(0)
+        for position, name in enumerate(by):
+            frame.insert(
+                position,
+                name,
+                [keys[code][position] for code in frame_codes],
+            )
+    frame.index.name = "timestamp"
+    return frame
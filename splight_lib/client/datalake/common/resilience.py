@@ -0,0 +1,230 @@
+import asyncio
+import random
+from enum import Enum
+from threading import Lock
+from time import monotonic, sleep
+from typing import Any, Awaitable, Callable
+
+from splight_lib.client.exceptions import CircuitOpenError
+from splight_lib.logging._internal import LogTags, get_splight_logger
+
+logger = get_splight_logger()
+
+
+# Client errors caused by the load of the server, worth retrying
+TRANSIENT_STATUS_CODES = (408, 429)
+
+
+class CircuitState(str, Enum):
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+
+def backoff_delay(attempt: int, base: float, cap: float) -> float:
+    """Exponential backoff with full jitter, a random delay between zero
+    and min(cap, base * 2 ** attempt).
+    """
+    return random.uniform(0, min(cap, base * 2**attempt))
+
+
+def is_permanent_error(exc: BaseException) -> bool:
+    """Checks if a request was rejected by the server with a 4xx status
+    code, other than timeout and rate limiting, so sending it again would
+    fail the same way.
+    """
+    status_code = getattr(exc, "status_code", None)
+    if status_code is None:
+        response = getattr(exc, "response", None)
+        status_code = getattr(response, "status_code", None)
+    return (
+        isinstance(status_code, int)
+        and 400 <= status_code < 500
+        and status_code not in TRANSIENT_STATUS_CODES
+    )
+
+
+class CircuitBreaker:
+    """Stops sending requests after repeated failures.
+
+    After failure_threshold consecutive failures the circuit opens and the
+    requests are rejected without being sent. Once the reset timeout is
+    over a single probe request is allowed (half open): if it succeeds the
+    circuit closes, otherwise it opens again with twice the reset timeout,
+    up to max_reset_timeout.
+    """
+
+    def __init__(
+        self,
+        failure_threshold: int = 5,
+        reset_timeout: float = 30,
+        max_reset_timeout: float = 300,
+    ):
+        self._threshold = failure_threshold
+        self._reset_timeout = reset_timeout
+        self._max_reset_timeout = max_reset_timeout
+        self._lock = Lock()
+        self._state = CircuitState.CLOSED
+        self._failures = 0
+        self._opens = 0
+        self._opened_until = 0.0
+
+    @property
+    def state(self) -> CircuitState:
+        return self._state
+
+    def blocked_until(self) -> float:
+        """Monotonic time until which requests are rejected, zero or a past
+        time if a request can be sent now.
+        """
+        with self._lock:
+            if self._state == CircuitState.OPEN:
+                return self._opened_until
+            if self._state == CircuitState.HALF_OPEN:
+                # Wait for the probe in flight
+                return monotonic() + self._reset_timeout
+            return 0.0
+
+    def allow(self) -> bool:
+        """Checks if a request can be sent, reserving the probe request
+        when the reset timeout is over.
+        """
+        with self._lock:
+            if self._state == CircuitState.CLOSED:
+                return True
+            if self._state == CircuitState.HALF_OPEN:
+                return False
+            if monotonic() < self._opened_until:
+                return False
+            self._state = CircuitState.HALF_OPEN
+            return True
+
+    def record_success(self) -> None:
+        with self._lock:
+            if self._state != CircuitState.CLOSED:
+                logger.info("Datalake circuit closed", tags=LogTags.DATALAKE)
+            self._state = CircuitState.CLOSED
+            self._failures = 0
+            self._opens = 0
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self._failures += 1
+            if (
+                self._state == CircuitState.CLOSED
+                and self._failures < self._threshold
+            ):
+                return
+            timeout = min(
+                self._reset_timeout * 2**self._opens, self._max_reset_timeout
+            )
+            self._opens += 1
+            self._state = CircuitState.OPEN
+            self._opened_until = monotonic() + timeout
+            logger.warning(
+                "Datalake circuit opened, requests paused for %.1f seconds",
+                timeout,
+                tags=LogTags.DATALAKE,
+            )
+
+    def abort_probe(self) -> None:
+        """Gives back the probe of a request that was cancelled, so the
+        next request can probe the circuit again.
+        """
+        with self._lock:
+            if self._state == CircuitState.HALF_OPEN:
+                self._state = CircuitState.OPEN
+
+    def retry_in(self) -> float:
+        return max(self._opened_until - monotonic(), 0)
+
+
+class ResilientSender:
+    """Retries requests with capped exponential backoff and full jitter,
+    guarded by a circuit breaker. Requests rejected by an open circuit
+    raise CircuitOpenError without being sent.
+
+    Only connection errors, timeouts and server errors are retried and
+    counted by the breaker. Requests rejected by the server with a 4xx
+    status code are raised right away, as they would fail again, and
+    unexpected exceptions are raised after counting a failure.
+    """
+
+    def __init__(
+        self,
+        exceptions: tuple[type[Exception], ...],
+        tries: int = 3,
+        backoff_base: float = 0.5,
+        backoff_cap: float = 10,
+        breaker: CircuitBreaker | None = None,
+    ):
+        self._exceptions = exceptions
+        self._tries = max(tries, 1)
+        self._base = backoff_base
+        self._cap = backoff_cap
+        self.breaker = breaker or CircuitBreaker()
+        self.retries = 0
+
+    def call(self, func: Callable[..., Any], *args, **kwargs) -> Any:
+        for attempt in range(self._tries):
+            self._check()
+            try:
+                result = func(*args, **kwargs)
+            except self._exceptions as exc:
+                if not self._record_error(exc, attempt):
+                    raise
+                self.retries += 1
+                sleep(backoff_delay(attempt, self._base, self._cap))
+                continue
+            except Exception:
+                self.breaker.record_failure()
+                raise
+            except BaseException:
+                self.breaker.abort_probe()
+                raise
+            self.breaker.record_success()
+            return result
+
+    async def async_call(
+        self, func: Callable[..., Awaitable[Any]], *args, **kwargs
+    ) -> Any:
+        for attempt in range(self._tries):
+            self._check()
+            try:
+                result = await func(*args, **kwargs)
+            except self._exceptions as exc:
+                if not self._record_error(exc, attempt):
+                    raise
+                self.retries += 1
+                await asyncio.sleep(
+                    backoff_delay(attempt, self._base, self._cap)
+                )
+                continue
+            except Exception:
+                self.breaker.record_failure()
+                raise
+            except BaseException:
+                self.breaker.abort_probe()
+                raise
+            self.breaker.record_success()
+            return result
+
+    def _check(self) -> None:
+        if not self.breaker.allow():
+            raise CircuitOpenError(self.breaker.retry_in())
+
+    def _record_error(self, exc: Exception, attempt: int) -> bool:
+        # Records the error in the breaker and returns whether the request
+        # has to be retried.
+        if is_permanent_error(exc):
+            # The server is up, it just rejected the request
+            self.breaker.record_success()
+            return False
+        self.breaker.record_failure()
+        return self._should_retry(attempt)
+
+    def _should_retry(self, attempt: int) -> bool:
+        return (
+            attempt < self._tries - 1
+            and self.breaker.state == CircuitState.CLOSED
+        )
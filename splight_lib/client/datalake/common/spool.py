@@ -0,0 +1,507 @@
+import json
+import os
+from pathlib import Path
+from threading import Lock
+from time import monotonic
+from typing import IO, Any, Awaitable, Callable
+from uuid import uuid4
+
+from splight_lib.client.datalake.common.resilience import is_permanent_error
+from splight_lib.client.exceptions import CircuitOpenError
+from splight_lib.logging._internal import LogTags, get_splight_logger
+
+logger = get_splight_logger()
+
+SEGMENT_SUFFIX = ".seg"
+LOCK_FILE = ".lock"
+DEAD_LETTER_DIR = "dead-letter"
+EVICTED_KEY = "evicted"
+
+
+class DatalakeSpool:
+    """An append-only write-ahead spool for datalake documents.
+
+    Each spool writes in its own subdirectory of the given directory, locked
+    while the spool is open, so the clients of several processes can share
+    the directory. Documents are appended to one active segment file per
+    name (collection or schema) and fsynced in batches by sync, which is
+    called by the flusher so writers never wait for the disk. When a buffer
+    is flushed its active segment is sealed and, once the documents are
+    saved in the datalake, the segment is acknowledged and removed from disk.
+
+    Segments that could not be sent go to the end of the replay queue and
+    are replayed at a bounded rate, after max_attempts failed attempts they
+    are moved to the dead-letter directory. The segments left in unlocked
+    subdirectories, by spools that were closed or processes that died, are
+    adopted and replayed.
+    """
+
+    def __init__(
+        self,
+        directory: str | Path,
+        fsync_batch: int = 100,
+        replay_rate: float = 1000,
+        sync_interval: float = 0.5,
+        max_attempts: int = 10,
+    ):
+        self._root = Path(directory)
+        self._root.mkdir(parents=True, exist_ok=True)
+        self._directory, self._lock_file = self._create_directory()
+        self._fsync_batch = fsync_batch
+        self._replay_rate = replay_rate
+        self._sync_interval = sync_interval
+        self._max_attempts = max(max_attempts, 1)
+        self._lock = Lock()
+        self._active: dict[str, tuple[Path, IO[str]]] = {}
+        self._unsynced: dict[str, int] = {}
+        self._unsynced_since: float | None = None
+        # Sealed segments whose documents may not be on disk yet
+        self._sealed: list[Path] = []
+        self._spilled: dict[str, tuple[Path, IO[str]]] = {}
+        self._attempts: dict[Path, int] = {}
+        self._next_replay = monotonic()
+        self._sequence = 0
+        self._pending: list[Path] = self._adopt_orphans()
+        if self._pending:
+            logger.info(
+                "Found %s datalake spool segments pending to be sent",
+                len(self._pending),
+                tags=LogTags.DATALAKE,
+            )
+
+    @property
+    def directory(self) -> Path:
+        """The subdirectory with the segments of this spool."""
+        return self._directory
+
+    @property
+    def pending(self) -> int:
+        """Number of segments waiting to be replayed."""
+        return len(self._pending)
+
+    def append(self, name: str, documents: list[dict]) -> None:
+        """Appends documents to the active segment for the given name. They
+        are written to disk by the next sync.
+
+        Parameters
+        ----------
+        name: str the collection or schema name of the documents.
+        documents: List[Dict] the documents to append.
+        """
+        with self._lock:
+            if name not in self._active:
+                self._active[name] = self._open_segment(name)
+                self._unsynced[name] = 0
+            _, segment = self._active[name]
+            segment.write(json.dumps(documents, default=str) + "\n")
+            self._unsynced[name] += len(documents)
+            if self._unsynced_since is None:
+                self._unsynced_since = monotonic()
+
+    def evict(self, name: str, count: int) -> None:
+        """Removes the first documents of the active segment for the given
+        name, the ones evicted from a full buffer, so they are not replayed.
+        The segment is not rewritten, a marker with the number of evicted
+        documents is appended instead.
+
+        Parameters
+        ----------
+        name: str the collection or schema name of the documents.
+        count: int the number of documents to remove.
+        """
+        with self._lock:
+            if name not in self._active or count <= 0:
+                return
+            _, segment = self._active[name]
+            segment.write(json.dumps({EVICTED_KEY: count}) + "\n")
+
+    def spill(self, name: str, documents: list[dict]) -> None:
+        """Stores documents that did not fit in memory. They are written to
+        their own segments, which are sent by the replay.
+
+        Parameters
+        ----------
+        name: str the collection or schema name of the documents.
+        documents: List[Dict] the documents to store.
+        """
+        with self._lock:
+            if name not in self._spilled:
+                self._spilled[name] = self._open_segment(name)
+            _, segment = self._spilled[name]
+            segment.write(json.dumps(documents, default=str) + "\n")
+
+    def next_deadline(self) -> float | None:
+        """Monotonic time at which the spool has to be synced or has a
+        segment to replay, None if there is nothing to do.
+        """
+        with self._lock:
+            deadlines = []
+            if self._pending or self._spilled:
+                deadlines.append(self._next_replay)
+            sync_deadline = self._sync_deadline()
+            if sync_deadline is not None:
+                deadlines.append(sync_deadline)
+            return min(deadlines, default=None)
+
+    def seal(self, name: str) -> Path | None:
+        """Closes the active segment for the given name so it can be sent.
+        It is written to disk by the next sync.
+
+        Returns
+        -------
+        Path | None: the sealed segment or None if there was no active one.
+        """
+        with self._lock:
+            if name not in self._active:
+                return None
+            path, segment = self._active.pop(name)
+            if self._unsynced.pop(name):
+                self._sealed.append(path)
+                if self._unsynced_since is None:
+                    self._unsynced_since = monotonic()
+            segment.close()
+            return path
+
+    def sync(self) -> None:
+        """Fsyncs every segment with documents not yet on disk. The fsyncs
+        run out of the spool lock, so the appends do not wait for them.
+        """
+        with self._lock:
+            descriptors = []
+            for name, unsynced in self._unsynced.items():
+                if unsynced:
+                    _, segment = self._active[name]
+                    segment.flush()
+                    descriptors.append(os.dup(segment.fileno()))
+                    self._unsynced[name] = 0
+            sealed, self._sealed = self._sealed, []
+            self._unsynced_since = None
+        for path in sealed:
+            try:
+                descriptors.append(os.open(path, os.O_RDONLY))
+            except FileNotFoundError:
+                # Already acknowledged
+                continue
+        for descriptor in descriptors:
+            try:
+                os.fsync(descriptor)
+            finally:
+                os.close(descriptor)
+
+    def sync_if_due(self) -> None:
+        """Fsyncs the segments if a batch is complete or the sync interval
+        is over.
+        """
+        with self._lock:
+            deadline = self._sync_deadline()
+        if deadline is not None and deadline <= monotonic():
+            self.sync()
+
+    def close(self) -> None:
+        """Fsyncs and closes the segments and unlocks the directory of the
+        spool, its segments are replayed by the next spool opened over the
+        same directory.
+        """
+        with self._lock:
+            for name in list(self._active):
+                path, segment = self._active.pop(name)
+                segment.close()
+                self._sealed.append(path)
+            self._unsynced = {}
+            self._seal_spilled()
+        self.sync()
+        if not any(self._directory.glob(f"*{SEGMENT_SUFFIX}")):
+            (self._directory / LOCK_FILE).unlink(missing_ok=True)
+            _remove_directory(self._directory)
+        self._lock_file.close()
+
+    def ack(self, segment: Path | None) -> None:
+        """Removes a segment whose documents were saved in the datalake."""
+        if segment is None:
+            return
+        with self._lock:
+            self._attempts.pop(segment, None)
+        segment.unlink(missing_ok=True)
+
+    def release(
+        self,
+        segment: Path | None,
+        attempted: bool = True,
+        documents: list[dict] | None = None,
+    ) -> None:
+        """Puts a segment that could not be sent at the end of the replay
+        queue. After max_attempts failed attempts it is moved to the
+        dead-letter directory instead.
+
+        Parameters
+        ----------
+        segment: Path | None the segment to release.
+        attempted: bool False if the documents were not sent, like when the
+            circuit is open, so the attempt is not counted.
+        documents: List[Dict] | None the documents of the segment that were
+            not sent, when only part of them failed. The segment is
+            rewritten with them, so the sent ones are not replayed.
+        """
+        if segment is None:
+            return
+        if documents is not None:
+            if not documents:
+                self.ack(segment)
+                return
+            _rewrite_segment(segment, documents)
+        with self._lock:
+            attempts = self._attempts.get(segment, 0) + int(attempted)
+            if attempts < self._max_attempts:
+                self._attempts[segment] = attempts
+                self._pending.append(segment)
+                return
+            self._attempts.pop(segment, None)
+        dead_letter = self._root / DEAD_LETTER_DIR
+        dead_letter.mkdir(exist_ok=True)
+        target = dead_letter / f"{self._directory.name}-{segment.name}"
+        segment.rename(target)
+        logger.error(
+            "Unable to send spool segment after %s attempts, moved to %s",
+            attempts,
+            target,
+            tags=LogTags.DATALAKE,
+        )
+
+    def next_replay(self) -> tuple[Path, str, list[dict]] | None:
+        """Returns the first pending segment if the replay rate allows it.
+        The caller must ack or release the returned segment.
+
+        Returns
+        -------
+        Tuple[Path, str, List[Dict]] | None: the segment, its name and
+        documents or None if there is nothing to replay yet.
+        """
+        with self._lock:
+            if monotonic() < self._next_replay:
+                return None
+            self._seal_spilled()
+            if not self._pending:
+                return None
+            segment = self._pending.pop(0)
+        documents = _read_segment(segment)
+        self._next_replay = monotonic() + len(documents) / self._replay_rate
+        return segment, _segment_name(segment), documents
+
+    def replay(self, send: Callable[[str, list[dict]], Any]) -> bool:
+        """Sends the first pending segment if the replay rate allows it.
+
+        Parameters
+        ----------
+        send: Callable the function used to send the documents, it receives
+            the name and the documents of the segment.
+
+        Returns
+        -------
+        bool: True if a segment was replayed successfully, False otherwise.
+        """
+        replay = self.next_replay()
+        if replay is None:
+            return False
+        segment, name, documents = replay
+        logger.debug(
+            "Replaying %s spooled documents",
+            len(documents),
+            tags=LogTags.DATALAKE,
+        )
+        try:
+            send(name, documents)
+        except Exception as exc:
+            self._replay_failed(segment, documents, exc)
+            return False
+        self.ack(segment)
+        return True
+
+    async def async_replay(
+        self, send: Callable[[str, list[dict]], Awaitable[Any]]
+    ) -> bool:
+        """Async version of replay."""
+        replay = self.next_replay()
+        if replay is None:
+            return False
+        segment, name, documents = replay
+        logger.debug(
+            "Replaying %s spooled documents",
+            len(documents),
+            tags=LogTags.DATALAKE,
+        )
+        try:
+            await send(name, documents)
+        except Exception as exc:
+            self._replay_failed(segment, documents, exc)
+            return False
+        self.ack(segment)
+        return True
+
+    def _replay_failed(
+        self, segment: Path, documents: list[dict], exc: Exception
+    ) -> None:
+        if isinstance(exc, CircuitOpenError):
+            self.release(segment, attempted=False)
+        elif is_permanent_error(exc):
+            # Sending the segment again would fail the same way
+            logger.error(
+                "The datalake rejected %s spooled documents, they are "
+                "discarded: %s",
+                len(documents),
+                exc,
+                tags=LogTags.DATALAKE,
+            )
+            self.ack(segment)
+        else:
+            logger.error(
+                "Unable to replay spooled documents",
+                exc_info=exc,
+                tags=LogTags.DATALAKE,
+            )
+            self.release(segment)
+
+    def _create_directory(self) -> tuple[Path, IO[str]]:
+        # The directory is locked before it gets its final name, so other
+        # spools never take it for an orphan.
+        staging = self._root / f".{uuid4().hex}"
+        staging.mkdir()
+        lock_file = open(staging / LOCK_FILE, "w")
+        _try_lock(lock_file)
+        directory = self._root / f"{os.getpid()}-{uuid4().hex[:8]}"
+        staging.rename(directory)
+        return directory, lock_file
+
+    def _adopt_orphans(self) -> list[Path]:
+        # Moves to this spool the segments of the unlocked subdirectories
+        # and the ones at the root, written by older versions.
+        adopted = [
+            self._adopt(segment)
+            for segment in sorted(self._root.glob(f"*{SEGMENT_SUFFIX}"))
+        ]
+        for directory in sorted(self._root.iterdir()):
+            if (
+                not directory.is_dir()
+                or directory == self._directory
+                or directory.name.startswith(".")
+                or directory.name == DEAD_LETTER_DIR
+            ):
+                continue
+            try:
+                lock_file = open(directory / LOCK_FILE, "r+")
+            except FileNotFoundError:
+                # Removed by the spool that owned it
+                continue
+            with lock_file:
+                if not _try_lock(lock_file):
+                    # Its spool is open
+                    continue
+                adopted.extend(
+                    self._adopt(segment)
+                    for segment in sorted(directory.glob(f"*{SEGMENT_SUFFIX}"))
+                )
+                (directory / LOCK_FILE).unlink(missing_ok=True)
+                _remove_directory(directory)
+        return [segment for segment in adopted if segment is not None]
+
+    def _adopt(self, segment: Path) -> Path | None:
+        target = self._segment_path(_segment_name(segment))
+        try:
+            segment.rename(target)
+        except FileNotFoundError:
+            # Adopted by another spool
+            return None
+        return target
+
+    def _segment_path(self, name: str) -> Path:
+        self._sequence += 1
+        return self._directory / (
+            f"{self._sequence:016d}-{name}{SEGMENT_SUFFIX}"
+        )
+
+    def _open_segment(self, name: str) -> tuple[Path, IO[str]]:
+        path = self._segment_path(name)
+        return path, open(path, "a")
+
+    def _seal_spilled(self) -> None:
+        for path, segment in self._spilled.values():
+            segment.close()
+            self._sealed.append(path)
+            self._pending.append(path)
+        if self._spilled and self._unsynced_since is None:
+            self._unsynced_since = monotonic()
+        self._spilled = {}
+
+    def _sync_deadline(self) -> float | None:
+        # Must be called holding the lock
+        if any(
+            unsynced >= self._fsync_batch
+            for unsynced in self._unsynced.values()
+        ):
+            return monotonic()
+        if self._unsynced_since is not None:
+            return self._unsynced_since + self._sync_interval
+        return None
+
+
+def _try_lock(lock_file: IO[str]) -> bool:
+    # Locks the file without blocking, False if another spool holds it.
+    # fcntl is imported here so the clients import on every platform, only
+    # the spool needs it.
+    try:
+        import fcntl
+    except ImportError:
+        raise RuntimeError(
+            "The datalake spool needs fcntl file locks, which are not "
+            "available on this platform. Unset DL_SPOOL_DIR and use another "
+            "overflow policy than SPILL to disable it."
+        ) from None
+    try:
+        fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except BlockingIOError:
+        return False
+    return True
+
+
+def _segment_name(segment: Path) -> str:
+    return segment.name.split("-", 1)[1].removesuffix(SEGMENT_SUFFIX)
+
+
+def _remove_directory(directory: Path) -> None:
+    try:
+        directory.rmdir()
+    except OSError:
+        # Not empty or already removed
+        pass
+
+
+def _read_segment(segment: Path) -> list[dict]:
+    documents = []
+    with open(segment) as f:
+        for line in f:
+            try:
+                line = json.loads(line)
+            except json.JSONDecodeError:
+                # The process died while the line was being written
+                logger.warning(
+                    "Skipping corrupted line in spool segment %s",
+                    segment,
+                    tags=LogTags.DATALAKE,
+                )
+                continue
+            if isinstance(line, dict):
+                # Documents evicted from the buffer after being appended
+                del documents[: line.get(EVICTED_KEY, 0)]
+            else:
+                documents.extend(line)
+    return documents
+
+
+def _rewrite_segment(segment: Path, documents: list[dict]) -> None:
+    # Replaces the segment atomically, the new content is on disk before
+    # the rename so a crash keeps either the old or the new segment.
+    staging = segment.with_suffix(".tmp")
+    with open(staging, "w") as f:
+        f.write(json.dumps(documents, default=str) + "\n")
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(staging, segment)
@@ -0,0 +1,82 @@
+from bisect import bisect_left
+from dataclasses import dataclass, field
+from threading import Lock
+from typing import Callable
+
+# Upper bounds in seconds of the flush latency histogram buckets
+FLUSH_LATENCY_BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+
+@dataclass
+class DatalakeStats:
+    """Snapshot of the statistics of a buffered datalake client. Sizes are
+    estimated from the JSON representation of the documents.
+    """
+
+    queue_depth: dict[str, int] = field(default_factory=dict)
+    enqueued_points: int = 0
+    enqueued_bytes: int = 0
+    sent_points: int = 0
+    sent_bytes: int = 0
+    dropped_points: int = 0
+    dropped_bytes: int = 0
+    flushes: int = 0
+    flush_latency: dict[float, int] = field(default_factory=dict)
+    retries: int = 0
+    oldest_point_age: float | None = None
+
+
+StatsCallback = Callable[[DatalakeStats], None]
+
+
+class DatalakeStatsRecorder:
+    """Thread safe counters behind DatalakeStats. The sizes are given by
+    the clients, which estimate them once per batch.
+    """
+
+    def __init__(self):
+        self._lock = Lock()
+        self._stats = DatalakeStats()
+        self._latency = [0] * (len(FLUSH_LATENCY_BUCKETS) + 1)
+
+    def enqueued(self, points: int, nbytes: int) -> None:
+        with self._lock:
+            self._stats.enqueued_points += points
+            self._stats.enqueued_bytes += nbytes
+
+    def dropped(self, points: int, nbytes: int) -> None:
+        with self._lock:
+            self._stats.dropped_points += points
+            self._stats.dropped_bytes += nbytes
+
+    def flushed(self, points: int, nbytes: int, latency: float) -> None:
+        """Records a flush with the number of points and bytes sent."""
+        with self._lock:
+            self._stats.flushes += 1
+            self._stats.sent_points += points
+            self._stats.sent_bytes += nbytes
+            self._latency[bisect_left(FLUSH_LATENCY_BUCKETS, latency)] += 1
+
+    def snapshot(
+        self,
+        queue_depth: dict[str, int],
+        retries: int,
+        oldest_point_age: float | None,
+    ) -> DatalakeStats:
+        """Returns a copy of the counters with the given gauges."""
+        with self._lock:
+            return DatalakeStats(
+                queue_depth=queue_depth,
+                enqueued_points=self._stats.enqueued_points,
+                enqueued_bytes=self._stats.enqueued_bytes,
+                sent_points=self._stats.sent_points,
+                sent_bytes=self._stats.sent_bytes,
+                dropped_points=self._stats.dropped_points,
+                dropped_bytes=self._stats.dropped_bytes,
+                flushes=self._stats.flushes,
+                flush_latency=dict(
+                    zip((*FLUSH_LATENCY_BUCKETS, float("inf")), self._latency)
+                ),
+                retries=retries,
+                oldest_point_age=oldest_point_age,
+            )
@@ -1,5 +1,6 @@
 from splight_lib.client.datalake.v3.builder import DatalakeClientBuilder
 from splight_lib.client.datalake.v3.remote_client import (
+    AsyncioBufferedRemoteDatalakeClient,
     BufferedAsyncRemoteDatalakeClient,
     BufferedSyncRemoteDataClient,
     SyncRemoteDatalakeClient,
@@ -10,4 +11,5 @@ __all__ = [
     SyncRemoteDatalakeClient,
     BufferedAsyncRemoteDatalakeClient,
     BufferedSyncRemoteDataClient,
+    AsyncioBufferedRemoteDatalakeClient,
 ]
@@ -2,6 +2,7 @@ from typing import Any
 
 from splight_lib.client.datalake.common.abstract import AbstractDatalakeClient
 from splight_lib.client.datalake.v3.remote_client import (
+    AsyncioBufferedRemoteDatalakeClient,
     BufferedAsyncRemoteDatalakeClient,
     BufferedSyncRemoteDataClient,
     SyncRemoteDatalakeClient,
@@ -12,6 +13,7 @@ DL_CLIENT_TYPE_MAP = {
     DatalakeClientType.BUFFERED_ASYNC: BufferedAsyncRemoteDatalakeClient,
     DatalakeClientType.BUFFERED_SYNC: BufferedSyncRemoteDataClient,
     DatalakeClientType.SYNC: SyncRemoteDatalakeClient,
+    DatalakeClientType.BUFFERED_ASYNCIO: AsyncioBufferedRemoteDatalakeClient,
 }
 
 
@@ -1,18 +1,27 @@
-from threading import Lock, Thread
-from time import sleep
-
 from furl import furl
-from retry import retry
 
 from splight_lib.auth import SplightAuthToken
 from splight_lib.client.datalake.common.abstract import AbstractDatalakeClient
-from splight_lib.client.datalake.common.buffer import DatalakeDocumentBuffer
+from splight_lib.client.datalake.common.buffered import (
+    BufferedAsyncDatalakeMixin,
+    BufferedAsyncioDatalakeMixin,
+    BufferedSyncDatalakeMixin,
+)
+from splight_lib.client.datalake.common.resilience import (
+    CircuitBreaker,
+    ResilientSender,
+)
 from splight_lib.client.datalake.v3.classmap import COLLECTION_PREFIXS_MAP
 from splight_lib.client.datalake.v3.exceptions import DatalakeRequestError
 from splight_lib.client.exceptions import SPLIGHT_REQUEST_EXCEPTIONS
+from splight_lib.client.singleflight import SingleFlight, request_key
 from splight_lib.logging._internal import LogTags, get_splight_logger
 from splight_lib.restclient import SplightRestClient
-from splight_lib.settings import SplightAPIVersion
+from splight_lib.restclient.client import SplightResponse
+from splight_lib.restclient.compression import ContentEncoding
+from splight_lib.settings import (
+    SplightAPIVersion,
+)
 
 logger = get_splight_logger()
 
@@ -26,6 +35,15 @@ class SyncRemoteDatalakeClient(AbstractDatalakeClient):
         access_id: str,
         secret_key: str,
         api_version: SplightAPIVersion = SplightAPIVersion.V3,
+        request_compression: ContentEncoding | None = None,
+        compression_threshold: int = 1024,
+        coalesce_reads: bool = False,
+        retry_tries: int = 3,
+        backoff_base: float = 0.5,
+        backoff_cap: float = 10,
+        breaker_threshold: int = 5,
+        breaker_reset_timeout: float = 30,
+        breaker_max_reset_timeout: float = 300,
         *args,
         **kwargs,
     ):
@@ -38,142 +56,111 @@ class SyncRemoteDatalakeClient(AbstractDatalakeClient):
         self._api_version = "v3"
         self._default_path = "data"
 
-        self._restclient = SplightRestClient()
+        self._restclient = SplightRestClient(
+            compression=request_compression,
+            compression_threshold=compression_threshold,
+        )
         self._restclient.update_headers(token.header)
+        self._reads = SingleFlight(enabled=coalesce_reads)
+        # Every request of the client, buffered or not, shares the retries
+        # and the circuit breaker.
+        self._sender = ResilientSender(
+            EXCEPTIONS,
+            tries=retry_tries,
+            backoff_base=backoff_base,
+            backoff_cap=backoff_cap,
+            breaker=CircuitBreaker(
+                failure_threshold=breaker_threshold,
+                reset_timeout=breaker_reset_timeout,
+                max_reset_timeout=breaker_max_reset_timeout,
+            ),
+        )
         logger.debug(
             "Remote datalake client initialized.", tags=LogTags.DATALAKE
         )
 
-    @retry(EXCEPTIONS, tries=3, delay=2, jitter=1)
     def save(self, records: dict) -> list[dict]:
-        prefix = self._get_prefix(records["collection"])
-        url = self._base_url / f"{prefix}/write/"
-        response = self._restclient.post(url, json=records)
-        if response.is_error:
-            raise DatalakeRequestError(response.status_code, response.text)
+        self._sender.call(self._post, records)
         return records["records"]
 
-    @retry(EXCEPTIONS, tries=3, delay=2, jitter=1)
+    def write(self, records: dict) -> list[dict]:
+        # The buffered clients override save, the records are always sent
+        # with the request of this class.
+        return SyncRemoteDatalakeClient.save(self, records)
+
     async def async_save(
         self,
         records: dict,
     ) -> list[dict]:
-        # POST /data/write
-        prefix = self._get_prefix(records["collection"])
-        url = self._base_url / f"{prefix}/write/"
-        response = await self._restclient.async_post(url, json=records)
-        if response.is_error:
-            raise DatalakeRequestError(response.status_code, response.text)
+        await self._sender.async_call(self._async_post, records)
         return records["records"]
 
-    @retry(EXCEPTIONS, tries=3, delay=2, jitter=1)
     def _get(self, request: dict) -> list[dict]:
         url = (
             self._base_url / f"{self._api_version}/{self._default_path}/read/"
         )
-        response = self._restclient.post(url, json=request)
-        if response.is_error:
-            raise DatalakeRequestError(response.status_code, response.text)
+        # The coalesced callers share the retries of the first one
+        response = self._reads.do(
+            request_key("POST", url, request),
+            lambda: self._sender.call(self._read, url, request),
+        )
         return response.json()
 
-    @retry(EXCEPTIONS, tries=3, delay=2, jitter=1)
     async def _async_get(self, request: dict) -> list[dict]:
         url = (
             self._base_url / f"{self._api_version}/{self._default_path}/read/"
         )
+        response = await self._reads.async_do(
+            request_key("POST", url, request),
+            lambda: self._sender.async_call(self._async_read, url, request),
+        )
+        return response.json()
+
+    def _post(self, records: dict) -> None:
+        # POST /data/write
+        prefix = self._get_prefix(records["collection"])
+        url = self._base_url / f"{prefix}/write/"
+        response = self._restclient.post(url, json=records)
+        if response.is_error:
+            raise DatalakeRequestError(response.status_code, response.text)
+
+    async def _async_post(self, records: dict) -> None:
+        prefix = self._get_prefix(records["collection"])
+        url = self._base_url / f"{prefix}/write/"
+        response = await self._restclient.async_post(url, json=records)
+        if response.is_error:
+            raise DatalakeRequestError(response.status_code, response.text)
+
+    def _read(self, url: furl, request: dict) -> SplightResponse:
+        response = self._restclient.post(url, json=request)
+        if response.is_error:
+            raise DatalakeRequestError(response.status_code, response.text)
+        return response
+
+    async def _async_read(self, url: furl, request: dict) -> SplightResponse:
         response = await self._restclient.async_post(url, json=request)
         if response.is_error:
             raise DatalakeRequestError(response.status_code, response.text)
-        return response.json()
+        return response
 
     def _get_prefix(self, collection: str) -> str:
         return f"{self._api_version}/{COLLECTION_PREFIXS_MAP.get(collection, self._default_path)}"
 
 
-class BufferedAsyncRemoteDatalakeClient(SyncRemoteDatalakeClient):
-    def __init__(
-        self,
-        base_url: str,
-        access_id: str,
-        secret_key: str,
-        api_version: SplightAPIVersion,
-        buffer_size: int = 500,
-        buffer_timeout: float = 60,
-        *args,
-        **kwargs,
-    ):
-        super().__init__(
-            base_url,
-            access_id,
-            secret_key,
-            buffer_size,
-            buffer_timeout,
-            *args,
-            **kwargs,
-        )
-        self._base_url = furl(base_url)
-        token = SplightAuthToken(
-            access_key=access_id,
-            secret_key=secret_key,
-        )
-        self._restclient = SplightRestClient()
-        self._restclient.update_headers(token.header)
-
-        logger.debug(
-            "Initializing buffer with size %s and timeout %s",
-            buffer_size,
-            buffer_timeout,
-        )
-        self._data_buffers = {
-            "default": DatalakeDocumentBuffer(buffer_size, buffer_timeout),
-        }
-        self._lock = Lock()
-        self._flush_thread = Thread(target=self._flusher, daemon=True)
-        self._flush_thread.start()
-        logger.debug(
-            "Buffered Remote datalake client initialized.",
-            tags=LogTags.DATALAKE,
-        )
+class _BufferedWritesMixin:
+    """Names and requests of the v3 buffered clients."""
 
-    def save(self, records: dict) -> list[dict]:
-        logger.debug("Saving documents in datalake", tags=LogTags.DATALAKE)
-        collection = records["collection"]
-        instances = records["records"]
-        buffer = self._data_buffers[collection]
-        with self._lock:
-            if buffer.should_flush():
-                logger.debug(
-                    "Flushing datalake buffer with %s elements",
-                    len(buffer.data),
-                )
-                self._send_documents(collection, buffer.data)
-                buffer.reset()
-            buffer.add_documents(instances)
-        return instances
+    api_version = SplightAPIVersion.V3
+    buffer_names = ("default",)
+    spool_name = "v3"
 
-    def _flusher(self):
-        while True:
-            for collection, buffer in self._data_buffers.items():
-                self._flush_buffer(collection, buffer)
-            sleep(0.5)
+    def _unpack(self, records: dict) -> tuple[str, list[dict]]:
+        return records["collection"], records["records"]
 
-    def _flush_buffer(
-        self, collection: str, buffer: DatalakeDocumentBuffer
-    ) -> None:
-        with self._lock:
-            if buffer.should_flush():
-                try:
-                    logger.debug(
-                        "Flushing datalake buffer with %s elements",
-                        len(buffer.data),
-                    )
-                    self._send_documents(collection, buffer.data)
-                    buffer.reset()
-                except Exception:
-                    logger.error("Unable to save documents", exc_info=True)
+    def _write_documents(self, collection: str, docs: list[dict]) -> None:
+        self._post_documents(collection, docs)
 
-    @retry(EXCEPTIONS, tries=3, delay=2, jitter=1)
-    def _send_documents(self, collection: str, docs: list[dict]) -> list[dict]:
+    def _post_documents(self, collection: str, docs: list[dict]) -> list[dict]:
         prefix = self._get_prefix(collection)
 
         url = self._base_url / f"{prefix}/write/"
@@ -186,76 +173,41 @@ class BufferedAsyncRemoteDatalakeClient(SyncRemoteDatalakeClient):
             raise DatalakeRequestError(response.status_code, response.text)
         return docs
 
-
-class BufferedSyncRemoteDataClient(SyncRemoteDatalakeClient):
-    def __init__(
-        self,
-        base_url: str,
-        access_id: str,
-        secret_key: str,
-        api_version: SplightAPIVersion,
-        buffer_size: int = 500,
-        buffer_timeout: float = 60,
-        *args,
-        **kwargs,
-    ):
-        super().__init__(
-            base_url,
-            access_id,
-            secret_key,
-            buffer_size,
-            buffer_timeout,
-            *args,
-            **kwargs,
-        )
-        self._base_url = furl(base_url)
-        token = SplightAuthToken(
-            access_key=access_id,
-            secret_key=secret_key,
-        )
-        self._restclient = SplightRestClient()
-        self._restclient.update_headers(token.header)
-
-        logger.debug(
-            "Initializing buffer with size %s and timeout %s",
-            buffer_size,
-            buffer_timeout,
-            tags=LogTags.DATALAKE,
-        )
-        self._data_buffers = {
-            "default": DatalakeDocumentBuffer(buffer_size, buffer_timeout),
-        }
-        self._lock = Lock()
-        logger.debug(
-            "Synchronous Buffered Remote datalake client initialized.",
-            tags=LogTags.DATALAKE,
-        )
-
-    def save(self, records: dict) -> list[dict]:
-        logger.debug("Saving documents in datalake", tags=LogTags.DATALAKE)
-        collection = records["collection"]
-        buffer = self._data_buffers[collection]
-        with self._lock:
-            buffer.add_documents(records["records"])
-            if buffer.should_flush():
-                logger.debug(
-                    "Flushing datalake buffer with %s elements",
-                    len(buffer.data),
-                    tags=LogTags.DATALAKE,
-                )
-                self._send_documents(collection, buffer.data)
-                buffer.reset()
-        return records["records"]
-
-    @retry(EXCEPTIONS, tries=3, delay=2, jitter=1)
-    def _send_documents(self, collection: str, docs: list[dict]) -> list[dict]:
+    async def _async_write_documents(
+        self, collection: str, docs: list[dict]
+    ) -> None:
         prefix = self._get_prefix(collection)
         url = self._base_url / f"{prefix}/write/"
         data = {
             "collection": collection,
             "records": docs,
         }
-        response = self._restclient.post(url, json=data)
+        response = await self._restclient.async_post(url, json=data)
         if response.is_error:
             raise DatalakeRequestError(response.status_code, response.text)
-        return docs
+
+
+class BufferedAsyncRemoteDatalakeClient(
+    _BufferedWritesMixin, BufferedAsyncDatalakeMixin, SyncRemoteDatalakeClient
+):
+    """Buffered datalake client that sends the documents from a background
+    thread.
+    """
+
+
+class BufferedSyncRemoteDataClient(
+    _BufferedWritesMixin, BufferedSyncDatalakeMixin, SyncRemoteDatalakeClient
+):
+    """Buffered datalake client that sends the documents from the save call
+    that fills a buffer.
+    """
+
+
+class AsyncioBufferedRemoteDatalakeClient(
+    _BufferedWritesMixin,
+    BufferedAsyncioDatalakeMixin,
+    SyncRemoteDatalakeClient,
+):
+    """Buffered datalake client for asyncio applications that sends the
+    documents from a task running in the event loop.
+    """
@@ -2,6 +2,7 @@ from typing import Any
 
 from splight_lib.client.datalake.common.abstract import AbstractDatalakeClient
 from splight_lib.client.datalake.v4.remote_client import (
+    AsyncioBufferedRemoteDatalakeClient,
     BufferedAsyncRemoteDatalakeClient,
     BufferedSyncRemoteDataClient,
     SyncRemoteDatalakeClient,
@@ -17,6 +18,7 @@ DL_CLIENT_TYPE_MAP = {
     DatalakeClientType.BUFFERED_ASYNC: BufferedAsyncRemoteDatalakeClient,
     DatalakeClientType.BUFFERED_SYNC: BufferedSyncRemoteDataClient,
     DatalakeClientType.SYNC: SyncRemoteDatalakeClient,
+    DatalakeClientType.BUFFERED_ASYNCIO: AsyncioBufferedRemoteDatalakeClient,
 }
 
 
@@ -39,5 +41,39 @@ def get_datalake_client() -> AbstractDatalakeClient:
             "api_version": SplightAPIVersion.V4,
             "buffer_size": datalake_settings.DL_BUFFER_SIZE,
             "buffer_timeout": datalake_settings.DL_BUFFER_TIMEOUT,
+            "buffer_max_documents": datalake_settings.DL_BUFFER_MAX_DOCUMENTS,
+            "buffer_max_payload_bytes": (
+                datalake_settings.DL_BUFFER_MAX_PAYLOAD_BYTES
+            ),
+            "buffer_overflow_policy": (
+                datalake_settings.DL_BUFFER_OVERFLOW_POLICY
+            ),
+            "buffer_block_timeout": datalake_settings.DL_BUFFER_BLOCK_TIMEOUT,
+            "spool_dir": datalake_settings.DL_SPOOL_DIR,
+            "spool_fsync_batch": datalake_settings.DL_SPOOL_FSYNC_BATCH,
+            "spool_replay_rate": datalake_settings.DL_SPOOL_REPLAY_RATE,
+            "flush_max_documents": datalake_settings.DL_FLUSH_MAX_DOCUMENTS,
+            "flush_max_bytes": datalake_settings.DL_FLUSH_MAX_BYTES,
+            "flush_parallelism": datalake_settings.DL_FLUSH_PARALLELISM,
+            "retry_tries": datalake_settings.DL_RETRY_TRIES,
+            "backoff_base": datalake_settings.DL_BACKOFF_BASE,
+            "backoff_cap": datalake_settings.DL_BACKOFF_CAP,
+            "breaker_threshold": datalake_settings.DL_BREAKER_THRESHOLD,
+            "breaker_reset_timeout": (
+                datalake_settings.DL_BREAKER_RESET_TIMEOUT
+            ),
+            "breaker_max_reset_timeout": (
+                datalake_settings.DL_BREAKER_MAX_RESET_TIMEOUT
+            ),
+            "reduction": datalake_settings.DL_REDUCTION,
+            "deadband": datalake_settings.DL_DEADBAND,
+            "max_silence": datalake_settings.DL_MAX_SILENCE,
+            "dedup": datalake_settings.DL_DEDUP,
+            "request_compression": datalake_settings.DL_REQUEST_COMPRESSION,
+            "compression_threshold": (
+                datalake_settings.DL_COMPRESSION_THRESHOLD
+            ),
+            "coalesce_reads": datalake_settings.DL_COALESCE_READS,
+            "write_format": datalake_settings.DL_WRITE_FORMAT,
         },
     )
@@ -0,0 +1,64 @@
+from splight_lib.client.datalake.v4.generic import TransitionSchemaName
+
+KEY_FIELDS = {
+    TransitionSchemaName.DEFAULT: ("asset", "attribute"),
+    TransitionSchemaName.SOLUTIONS: ("solution", "asset", "output"),
+}
+
+
+def encode_columnar(schema_name: str, data_points: list[dict]) -> dict:
+    """Encodes data points grouping them by key, each key is sent once with
+    its timestamps and values as parallel arrays. The relative order of the
+    points for the same key is kept.
+
+    Parameters
+    ----------
+    schema_name: str the schema of the data points.
+    data_points: List[Dict] the data points in row format.
+
+    Returns
+    -------
+    Dict: the write request body in columnar format.
+    """
+    fields = KEY_FIELDS[TransitionSchemaName(schema_name)]
+    series: dict[tuple, dict] = {}
+    for point in data_points:
+        key = tuple(point[field] for field in fields)
+        entry = series.get(key)
+        if entry is None:
+            entry = dict(zip(fields, key))
+            entry["timestamps"] = []
+            entry["values"] = []
+            series[key] = entry
+        entry["timestamps"].append(point["timestamp"])
+        entry["values"].append(point["value"])
+    return {
+        "records": {
+            "schema_name": schema_name,
+            "series": list(series.values()),
+        }
+    }
+
+
+def decode_columnar(request: dict) -> tuple[str, list[dict]]:
+    """Expands a columnar write request body into data points in row format.
+
+    Parameters
+    ----------
+    request: Dict the write request body in columnar format.
+
+    Returns
+    -------
+    Tuple[str, List[Dict]]: the schema name and the data points.
+    """
+    records = request["records"]
+    schema_name = records["schema_name"]
+    fields = KEY_FIELDS[TransitionSchemaName(schema_name)]
+    data_points = []
+    for entry in records["series"]:
+        key = {field: entry[field] for field in fields}
+        data_points.extend(
+            {**key, "timestamp": timestamp, "value": value}
+            for timestamp, value in zip(entry["timestamps"], entry["values"])
+        )
+    return schema_name, data_points
@@ -0,0 +1,113 @@
+from datetime import datetime, timezone
+from math import ceil, floor
+
+from splight_lib.client.datalake.common.ingestion import to_utc
+from splight_lib.client.datalake.v4.generic import TimeUnit, TransitionSort
+
+TIME_UNIT_SECONDS = {
+    TimeUnit.SECOND: 1,
+    TimeUnit.MINUTE: 60,
+    TimeUnit.HOUR: 3600,
+    TimeUnit.DAY: 86400,
+}
+# Windows are sized to be filled up to this fraction of the limit, so
+# density changes do not make most of them hit the limit.
+FILL_FACTOR = 0.8
+MAX_PARTITIONS = 1000
+
+Window = tuple[datetime, datetime]
+
+
+def time_window(seconds: float) -> tuple[TimeUnit, int]:
+    """Returns the largest time unit and the size of an aggregation window
+    of at least the given number of seconds.
+    """
+    seconds = max(ceil(seconds), 1)
+    for unit, unit_seconds in sorted(
+        TIME_UNIT_SECONDS.items(), key=lambda item: -item[1]
+    ):
+        if seconds % unit_seconds == 0:
+            return unit, seconds // unit_seconds
+    return TimeUnit.SECOND, seconds
+
+
+def split_window(
+    start: datetime, end: datetime, parts: int, bucket: float
+) -> list[Window]:
+    """Splits [start, end) into at most parts consecutive windows. The
+    inner bounds are multiples of bucket seconds, so aggregation windows
+    are never split.
+
+    Parameters
+    ----------
+    start: datetime the start of the window.
+    end: datetime the end of the window.
+    parts: int the number of windows wanted.
+    bucket: float the aggregation window size in seconds.
+
+    Returns
+    -------
+    List[Tuple[datetime, datetime]] the windows in chronological order.
+    """
+    begin, finish = start.timestamp(), end.timestamp()
+    step = max(ceil((finish - begin) / max(parts, 1) / bucket), 1) * bucket
+    bounds = [start]
+    bound = (floor(begin / step) + 1) * step
+    while bound < finish:
+        bounds.append(datetime.fromtimestamp(bound, timezone.utc))
+        bound += step
+    bounds.append(end)
+    return list(zip(bounds, bounds[1:]))
+
+
+def remaining_window(
+    page: list[dict], window: Window, bucket: float, descending: bool
+) -> Window | None:
+    """Returns the part of a window not covered by a page that hit the
+    limit, starting at the aggregation window of its last row, as the rows
+    of that timestamp may have been cut. None if the page does not move
+    past the window bound, so the rest can not be requested by time.
+    """
+    start, end = window
+    last = floor(to_utc(page[-1]["timestamp"]).timestamp() / bucket)
+    if descending:
+        bound = datetime.fromtimestamp((last + 1) * bucket, timezone.utc)
+        return (start, bound) if bound < end else None
+    bound = datetime.fromtimestamp(last * bucket, timezone.utc)
+    return (bound, end) if bound > start else None
+
+
+def estimate_partitions(
+    page: list[dict], start: datetime, end: datetime, limit: int
+) -> int:
+    """Estimates the number of windows [start, end) has to be split into
+    from the point density of a page that hit the limit.
+    """
+    timestamps = [to_utc(row["timestamp"]) for row in page]
+    covered = (max(timestamps) - min(timestamps)).total_seconds()
+    if covered <= 0:
+        return 2
+    density = len(page) / covered
+    expected = density * (end - start).total_seconds()
+    return min(max(ceil(expected / (limit * FILL_FACTOR)), 2), MAX_PARTITIONS)
+
+
+def stitch(
+    pages: list[list[dict]], key_fields: tuple[str, ...], sort: TransitionSort
+) -> list[dict]:
+    """Merges the pages of consecutive windows in sort order, dropping the
+    rows repeated at the window bounds.
+    """
+    rows, seen = [], set()
+    for page in pages:
+        for row in page:
+            key = (*(row.get(field) for field in key_fields), row["timestamp"])
+            if key in seen:
+                continue
+            seen.add(key)
+            rows.append(row)
+    rows.sort(
+        key=lambda row: to_utc(row["timestamp"]),
+        reverse=sort == TransitionSort.DESC,
+    )
+    return rows
@@ -1,21 +1,31 @@
-from threading import Lock, Thread
-from time import sleep
-
 from furl import furl
-from retry import retry
 
 from splight_lib.auth import SplightAuthToken
 from splight_lib.client.datalake.common.abstract import AbstractDatalakeClient
-from splight_lib.client.datalake.common.buffer import DatalakeDocumentBuffer
+from splight_lib.client.datalake.common.buffered import (
+    BufferedAsyncDatalakeMixin,
+    BufferedAsyncioDatalakeMixin,
+    BufferedSyncDatalakeMixin,
+)
+from splight_lib.client.datalake.common.resilience import (
+    CircuitBreaker,
+    ResilientSender,
+)
+from splight_lib.client.datalake.v4.encoding import encode_columnar
 from splight_lib.client.datalake.v4.exceptions import DatalakeRequestError
 from splight_lib.client.exceptions import SPLIGHT_REQUEST_EXCEPTIONS
+from splight_lib.client.singleflight import SingleFlight, request_key
 from splight_lib.logging._internal import LogTags, get_splight_logger
 from splight_lib.restclient import SplightRestClient
-from splight_lib.settings import SplightAPIVersion
+from splight_lib.restclient.client import SplightResponse
+from splight_lib.restclient.compression import ContentEncoding
+from splight_lib.settings import DatalakeWriteFormat, SplightAPIVersion
 
 logger = get_splight_logger()
 
 EXCEPTIONS = (*SPLIGHT_REQUEST_EXCEPTIONS, DatalakeRequestError)
+# Status codes returned by servers that do not support the columnar format
+COLUMNAR_UNSUPPORTED_CODES = (404, 405, 415, 501)
 
 
 class SyncRemoteDatalakeClient(AbstractDatalakeClient):
@@ -25,6 +35,16 @@ class SyncRemoteDatalakeClient(AbstractDatalakeClient):
         access_id: str,
         secret_key: str,
         api_version: SplightAPIVersion = SplightAPIVersion.V4,
+        write_format: DatalakeWriteFormat = DatalakeWriteFormat.ROW,
+        request_compression: ContentEncoding | None = None,
+        compression_threshold: int = 1024,
+        coalesce_reads: bool = False,
+        retry_tries: int = 3,
+        backoff_base: float = 0.5,
+        backoff_cap: float = 10,
+        breaker_threshold: int = 5,
+        breaker_reset_timeout: float = 30,
+        breaker_max_reset_timeout: float = 300,
         *args,
         **kwargs,
     ):
@@ -34,222 +54,113 @@ class SyncRemoteDatalakeClient(AbstractDatalakeClient):
             access_key=access_id,
             secret_key=secret_key,
         )
+        self._write_format = write_format
 
-        self._restclient = SplightRestClient()
+        self._restclient = SplightRestClient(
+            compression=request_compression,
+            compression_threshold=compression_threshold,
+        )
         self._restclient.update_headers(token.header)
+        self._reads = SingleFlight(enabled=coalesce_reads)
+        # Every request of the client, buffered or not, shares the retries
+        # and the circuit breaker.
+        self._sender = ResilientSender(
+            EXCEPTIONS,
+            tries=retry_tries,
+            backoff_base=backoff_base,
+            backoff_cap=backoff_cap,
+            breaker=CircuitBreaker(
+                failure_threshold=breaker_threshold,
+                reset_timeout=breaker_reset_timeout,
+                max_reset_timeout=breaker_max_reset_timeout,
+            ),
+        )
         logger.debug(
             "Remote datalake client initialized.", tags=LogTags.DATALAKE
         )
 
-    @retry(EXCEPTIONS, tries=3, delay=2, jitter=1)
     def save(self, records: dict) -> list[dict]:
-        url = self._base_url / f"{self.prefix}/write/"
-        response = self._restclient.post(url, json=records)
-        if response.is_error:
-            raise DatalakeRequestError(response.status_code, response.text)
+        instance = records["records"]
+        self._sender.call(
+            self._write, instance["schema_name"], instance["data_points"]
+        )
         return records["records"]
 
-    @retry(EXCEPTIONS, tries=3, delay=2, jitter=1)
+    def write(self, records: dict) -> list[dict]:
+        # The buffered clients override save, the records are always sent
+        # with the request of this class.
+        return SyncRemoteDatalakeClient.save(self, records)
+
     async def async_save(
         self,
         records: dict,
     ) -> list[dict]:
-        url = self._base_url / f"{self.prefix}/write/"
-        response = await self._restclient.async_post(url, json=records)
-        if response.is_error:
-            raise DatalakeRequestError(response.status_code, response.text)
+        instance = records["records"]
+        await self._sender.async_call(
+            self._async_write, instance["schema_name"], instance["data_points"]
+        )
         return records["records"]
 
-    @retry(EXCEPTIONS, tries=3, delay=2, jitter=1)
     def _get(self, request: dict) -> list[dict]:
         url = self._base_url / f"{self.prefix}/read/"
-        response = self._restclient.post(url, json=request)
-        if response.is_error:
-            raise DatalakeRequestError(response.status_code, response.text)
+        # The coalesced callers share the retries of the first one
+        response = self._reads.do(
+            request_key("POST", url, request),
+            lambda: self._sender.call(self._read, url, request),
+        )
         return response.json()
 
-    @retry(EXCEPTIONS, tries=3, delay=2, jitter=1)
     async def _async_get(self, request: dict) -> list[dict]:
         url = self._base_url / f"{self.prefix}/read/"
+        response = await self._reads.async_do(
+            request_key("POST", url, request),
+            lambda: self._sender.async_call(self._async_read, url, request),
+        )
+        return response.json()
+
+    def _read(self, url: furl, request: dict) -> SplightResponse:
+        response = self._restclient.post(url, json=request)
+        if response.is_error:
+            raise DatalakeRequestError(response.status_code, response.text)
+        return response
+
+    async def _async_read(self, url: furl, request: dict) -> SplightResponse:
         response = await self._restclient.async_post(url, json=request)
         if response.is_error:
             raise DatalakeRequestError(response.status_code, response.text)
-        return response.json()
+        return response
 
     @property
     def prefix(self) -> str:
         return "v4/data/transition"
 
-
-class BufferedAsyncRemoteDatalakeClient(SyncRemoteDatalakeClient):
-    def __init__(
-        self,
-        base_url: str,
-        access_id: str,
-        secret_key: str,
-        api_version: SplightAPIVersion,
-        buffer_size: int = 500,
-        buffer_timeout: float = 60,
-        *args,
-        **kwargs,
-    ):
-        super().__init__(
-            base_url=base_url,
-            access_id=access_id,
-            secret_key=secret_key,
-            buffer_size=buffer_size,
-            buffer_timeout=buffer_timeout,
-            *args,
-            **kwargs,
-        )
-        self._base_url = furl(base_url)
-
-        token = SplightAuthToken(
-            access_key=access_id,
-            secret_key=secret_key,
-        )
-        self._restclient = SplightRestClient()
-        self._restclient.update_headers(token.header)
-
-        logger.debug(
-            "Initializing buffer with size %s and timeout %s",
-            buffer_size,
-            buffer_timeout,
-        )
-        self._data_buffers = {
-            "default": DatalakeDocumentBuffer(buffer_size, buffer_timeout),
-            "solutions": DatalakeDocumentBuffer(buffer_size, buffer_timeout),
-        }
-        self._lock = Lock()
-        self._flush_thread = Thread(target=self._flusher, daemon=True)
-        self._flush_thread.start()
-        logger.debug(
-            "Buffered Remote datalake client initialized.",
-            tags=LogTags.DATALAKE,
-        )
-
-    def save(self, records: dict) -> list[dict]:
-        logger.debug("Saving documents in datalake", tags=LogTags.DATALAKE)
-        instance = records["records"]
-        data_points = instance["data_points"]
-        schema_name = instance["schema_name"]
-        buffer = self._data_buffers[schema_name]
-        with self._lock:
-            if buffer.should_flush():
-                logger.debug(
-                    "Flushing datalake buffer with %s elements",
-                    len(buffer.data),
-                )
-                self._send_documents(schema_name, buffer.data)
-                buffer.reset()
-            buffer.add_documents(data_points)
-        return data_points
-
-    def _flusher(self):
-        while True:
-            for schema_name, buffer in self._data_buffers.items():
-                self._flush_buffer(schema_name, buffer)
-            sleep(0.5)
-
-    def _flush_buffer(
-        self, schema_name: str, buffer: DatalakeDocumentBuffer
-    ) -> None:
-        with self._lock:
-            if buffer.should_flush():
-                try:
-                    logger.debug(
-                        "Flushing datalake buffer with %s elements",
-                        len(buffer.data),
-                    )
-                    self._send_documents(schema_name, buffer.data)
-                    buffer.reset()
-                except Exception:
-                    logger.error("Unable to save documents", exc_info=True)
-
-    @retry(EXCEPTIONS, tries=3, delay=2, jitter=1)
-    def _send_documents(
-        self, schema_name: str, data_points: list[dict]
-    ) -> list[dict]:
+    def _write(self, schema_name: str, data_points: list[dict]) -> None:
+        if self._write_format != DatalakeWriteFormat.ROW:
+            url = self._base_url / f"{self.prefix}/write/columnar/"
+            data = encode_columnar(schema_name, data_points)
+            response = self._restclient.post(url, json=data)
+            if not self._columnar_rejected(response):
+                return
         url = self._base_url / f"{self.prefix}/write/"
         data = {
             "records": {
                 "schema_name": schema_name,
                 "data_points": data_points,
-            },
+            }
         }
         response = self._restclient.post(url, json=data)
         if response.is_error:
             raise DatalakeRequestError(response.status_code, response.text)
-        return data_points
-
-
-class BufferedSyncRemoteDataClient(SyncRemoteDatalakeClient):
-    def __init__(
-        self,
-        base_url: str,
-        access_id: str,
-        secret_key: str,
-        api_version: SplightAPIVersion,
-        buffer_size: int = 500,
-        buffer_timeout: float = 60,
-        *args,
-        **kwargs,
-    ):
-        super().__init__(
-            base_url=base_url,
-            access_id=access_id,
-            secret_key=secret_key,
-            buffer_size=buffer_size,
-            buffer_timeout=buffer_timeout,
-            *args,
-            **kwargs,
-        )
-        self._base_url = furl(base_url)
-        token = SplightAuthToken(
-            access_key=access_id,
-            secret_key=secret_key,
-        )
-        self._restclient = SplightRestClient()
-        self._restclient.update_headers(token.header)
 
-        logger.debug(
-            "Initializing buffer with size %s and timeout %s",
-            buffer_size,
-            buffer_timeout,
-            tags=LogTags.DATALAKE,
-        )
-        self._data_buffers = {
-            "default": DatalakeDocumentBuffer(buffer_size, buffer_timeout),
-            "solutions": DatalakeDocumentBuffer(buffer_size, buffer_timeout),
-        }
-        self._lock = Lock()
-        logger.debug(
-            "Synchronous Buffered Remote datalake client initialized.",
-            tags=LogTags.DATALAKE,
-        )
-
-    def save(self, records: dict) -> list[dict]:
-        logger.debug("Saving documents in datalake", tags=LogTags.DATALAKE)
-        instance = records["records"]
-        schema_name = instance["schema_name"]
-        data_points = instance["data_points"]
-        buffer = self._data_buffers[schema_name]
-        with self._lock:
-            buffer.add_documents(data_points)
-            if buffer.should_flush():
-                logger.debug(
-                    "Flushing datalake buffer with %s elements",
-                    len(buffer.data),
-                    tags=LogTags.DATALAKE,
-                )
-                self._send_documents(schema_name, buffer.data)
-                buffer.reset()
-        return data_points
-
-    @retry(EXCEPTIONS, tries=3, delay=2, jitter=1)
-    def _send_documents(
+    async def _async_write(
         self, schema_name: str, data_points: list[dict]
-    ) -> list[dict]:
+    ) -> None:
+        if self._write_format != DatalakeWriteFormat.ROW:
+            url = self._base_url / f"{self.prefix}/write/columnar/"
+            data = encode_columnar(schema_name, data_points)
+            response = await self._restclient.async_post(url, json=data)
+            if not self._columnar_rejected(response):
+                return
         url = self._base_url / f"{self.prefix}/write/"
         data = {
             "records": {
@@ -257,7 +168,73 @@ class BufferedSyncRemoteDataClient(SyncRemoteDatalakeClient):
                 "data_points": data_points,
             }
         }
-        response = self._restclient.post(url, json=data)
+        response = await self._restclient.async_post(url, json=data)
         if response.is_error:
             raise DatalakeRequestError(response.status_code, response.text)
-        return data_points
+
+    def _columnar_rejected(self, response: SplightResponse) -> bool:
+        """Checks the response to a columnar write. When the format is AUTO
+        and the server does not support it, the client falls back to the
+        row format for the following writes.
+        """
+        if (
+            self._write_format == DatalakeWriteFormat.AUTO
+            and response.status_code in COLUMNAR_UNSUPPORTED_CODES
+        ):
+            logger.info(
+                "Columnar write format not supported, using row format",
+                tags=LogTags.DATALAKE,
+            )
+            self._write_format = DatalakeWriteFormat.ROW
+            return True
+        if response.is_error:
+            raise DatalakeRequestError(response.status_code, response.text)
+        return False
+
+
+class _BufferedWritesMixin:
+    """Names and requests of the v4 buffered clients."""
+
+    api_version = SplightAPIVersion.V4
+    buffer_names = ("default", "solutions")
+    spool_name = "v4"
+
+    def _unpack(self, records: dict) -> tuple[str, list[dict]]:
+        instance = records["records"]
+        return instance["schema_name"], instance["data_points"]
+
+    def _write_documents(
+        self, schema_name: str, data_points: list[dict]
+    ) -> None:
+        self._write(schema_name, data_points)
+
+    async def _async_write_documents(
+        self, schema_name: str, data_points: list[dict]
+    ) -> None:
+        await self._async_write(schema_name, data_points)
+
+
+class BufferedAsyncRemoteDatalakeClient(
+    _BufferedWritesMixin, BufferedAsyncDatalakeMixin, SyncRemoteDatalakeClient
+):
+    """Buffered datalake client that sends the documents from a background
+    thread.
+    """
+
+
+class BufferedSyncRemoteDataClient(
+    _BufferedWritesMixin, BufferedSyncDatalakeMixin, SyncRemoteDatalakeClient
+):
+    """Buffered datalake client that sends the documents from the save call
+    that fills a buffer.
+    """
+
+
+class AsyncioBufferedRemoteDatalakeClient(
+    _BufferedWritesMixin,
+    BufferedAsyncioDatalakeMixin,
+    SyncRemoteDatalakeClient,
+):
+    """Buffered datalake client for asyncio applications that sends the
+    documents from a task running in the event loop.
+    """
@@ -42,3 +42,14 @@ class InstanceNotFound(Exception):
 
 class InvalidModel(Exception):
     pass
+
+
+class CircuitOpenError(Exception):
+    def __init__(self, retry_in: float):
+        self._msg = (
+            f"Circuit is open after repeated failures, next attempt in "
+            f"{retry_in:.1f} seconds"
+        )
+
+    def __str__(self) -> str:
+        return self._msg
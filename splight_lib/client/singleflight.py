@@ -0,0 +1,114 @@
+import asyncio
+import json
+from concurrent.futures import CancelledError, Future
+from threading import Lock, get_ident
+from typing import Any, Awaitable, Callable, Hashable, TypeVar
+
+R = TypeVar("R")
+
+
+def request_key(
+    method: str, url: Any, body: Any = None, params: Any = None
+) -> tuple[str, str, str, str]:
+    """Builds the key of a request, with its body and params serialized
+    with sorted keys so equal requests have the same key.
+    """
+
+    def canonical(value: Any) -> str:
+        return json.dumps(
+            value, sort_keys=True, separators=(",", ":"), default=str
+        )
+
+    return (method, str(url), canonical(body), canonical(params))
+
+
+class _Flight:
+    def __init__(self):
+        self.future: Future = Future()
+        self.thread = get_ident()
+
+
+class SingleFlight:
+    """Shares a call between the concurrent callers with the same key.
+
+    The first caller runs the call and the ones that arrive while it is in
+    flight wait for its result or exception, from other threads or from
+    asyncio tasks. Once the call finishes, the next caller with that key
+    runs a new call. A sync caller never waits for a call started from its
+    own thread, as it would block the event loop running it.
+    """
+
+    def __init__(self, enabled: bool = True):
+        self._enabled = enabled
+        self._lock = Lock()
+        self._flights: dict[Hashable, _Flight] = {}
+
+    def do(self, key: Hashable, function: Callable[[], R]) -> R:
+        """Calls function, or waits for the call in flight with the same
+        key.
+        """
+        if not self._enabled:
+            return function()
+        while True:
+            with self._lock:
+                flight = self._flights.get(key)
+                if flight is None:
+                    flight = self._flights[key] = _Flight()
+                    break
+                if flight.thread == get_ident():
+                    return function()
+            try:
+                return flight.future.result()
+            except CancelledError:
+                # The leader was cancelled, try to lead a new call
+                continue
+        try:
+            result = function()
+        except BaseException as exc:
+            self._land(key, flight)
+            flight.future.set_exception(exc)
+            raise
+        self._land(key, flight)
+        flight.future.set_result(result)
+        return result
+
+    async def async_do(
+        self, key: Hashable, function: Callable[[], Awaitable[R]]
+    ) -> R:
+        """Awaits function, or waits for the call in flight with the same
+        key.
+        """
+        if not self._enabled:
+            return await function()
+        while True:
+            with self._lock:
+                flight = self._flights.get(key)
+                if flight is None:
+                    flight = self._flights[key] = _Flight()
+                    break
+            try:
+                # The shield keeps the cancellation of this task from
+                # cancelling the call shared with the other callers.
+                return await asyncio.shield(asyncio.wrap_future(flight.future))
+            except asyncio.CancelledError:
+                if not flight.future.cancelled():
+                    raise
+        try:
+            result = await function()
+        except asyncio.CancelledError:
+            self._land(key, flight)
+            flight.future.cancel()
+            raise
+        except BaseException as exc:
+            self._land(key, flight)
+            flight.future.set_exception(exc)
+            raise
+        self._land(key, flight)
+        flight.future.set_result(result)
+        return result
+
+    def _land(self, key: Hashable, flight: _Flight) -> None:
+        # Callers arriving after this one run a new call
+        with self._lock:
+            if self._flights.get(key) is flight:
+                del self._flights[key]
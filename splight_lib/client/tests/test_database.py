@@ -1,4 +1,6 @@
 import os
+from concurrent.futures import ThreadPoolExecutor
+from threading import Event
 
 import pytest  # noqa E402
 from furl import furl  # noqa E402
@@ -169,6 +171,29 @@ def test_get_with_id(mocker: MockerFixture):
     assert result["id"] == mock_instance_id
 
 
+def test_concurrent_retrieves_share_one_request(mocker: MockerFixture):
+    client = RemoteDatabaseClient(
+        base_url=base_url,
+        access_id=os.getenv("ACCESS_ID"),
+        secret_key=os.getenv("SECRET_KEY"),
+        api_version="v3",
+        coalesce_reads=True,
+    )
+
+    def get(url):
+        Event().wait(timeout=0.1)
+        return MockResponse({"name": "instance_name", "id": "123"})
+
+    mock_get = mocker.patch.object(SplightRestClient, "get", side_effect=get)
+    with ThreadPoolExecutor(max_workers=3) as executor:
+        results = list(
+            executor.map(lambda _: client._get("alert", id="123"), range(3))
+        )
+
+    mock_get.assert_called_once()
+    assert [result["id"] for result in results] == ["123"] * 3
+
+
 def test_get_without_id(mocker: MockerFixture):
     secret_key = os.getenv("SECRET_KEY")
     access_id = os.getenv("ACCESS_ID")
@@ -1,11 +1,80 @@
+import asyncio
 import os
+from datetime import datetime, timedelta, timezone
+from threading import Barrier, Event, Thread, Timer
+from time import monotonic
 
+import numpy as np
+import pandas as pd
+import pytest
 from pytest_mock import MockerFixture
 
+from splight_lib.client.datalake.common.abstract import (
+    AbstractDatalakeClient,
+    close_datalake_clients,
+)
+from splight_lib.client.datalake.common.arrays import DatalakeArrays
+from splight_lib.client.datalake.common.batching import (
+    DatalakeBatchSender,
+    address_key,
+    split_batches,
+)
+from splight_lib.client.datalake.common.buffer import (
+    DatalakeDocumentBuffer,
+    documents_size,
+)
+from splight_lib.client.datalake.common.concurrency import (
+    async_map_concurrently,
+    map_concurrently,
+)
+from splight_lib.client.datalake.common.disk_cache import DatalakeDiskCache
+from splight_lib.client.datalake.common.reduction import (
+    DatalakeWriteReducer,
+    coalesce,
+)
+from splight_lib.client.datalake.common.resample import (
+    resample,
+    resample_frame,
+)
+from splight_lib.client.datalake.common.resilience import (
+    CircuitBreaker,
+    CircuitState,
+    ResilientSender,
+)
+from splight_lib.client.datalake.common.spool import DatalakeSpool
 from splight_lib.client.datalake.v3 import (  # noqa E402
     SyncRemoteDatalakeClient,
 )
+from splight_lib.client.datalake.v4 import (
+    AsyncioBufferedRemoteDatalakeClient,
+    BufferedAsyncRemoteDatalakeClient,
+    BufferedSyncRemoteDataClient,
+)
+from splight_lib.client.datalake.v4 import (
+    SyncRemoteDatalakeClient as V4SyncRemoteDatalakeClient,
+)
+from splight_lib.client.datalake.v4.encoding import (
+    decode_columnar,
+    encode_columnar,
+)
+from splight_lib.client.datalake.v4.exceptions import DatalakeRequestError
+from splight_lib.client.exceptions import CircuitOpenError
+from splight_lib.client.singleflight import SingleFlight
 from splight_lib.restclient import SplightRestClient
+from splight_lib.restclient.compression import (
+    ContentEncoding,
+    resolve_encoding,
+)
+from splight_lib.settings import (
+    DatalakeOverflowPolicy,
+    DatalakeReduction,
+    DatalakeWriteFormat,
+)
+from splight_lib.testing.datalake import (
+    COLUMNAR_WRITE_PATH,
+    WRITE_PATH,
+    LocalDatalakeServer,
+)
 
 base_url = "http://test.com"
 os.environ["ACCESS_ID"] = "access_id"
@@ -71,3 +140,1100 @@ def test_save(mocker: MockerFixture):
     result = client.save(records)
     mock_post.assert_called_once()
     assert result == instances
+
+
+def test_buffered_async_save_does_not_wait_for_send(mocker: MockerFixture):
+    release = Event()
+    sent = []
+
+    def slow_send(schema_name, data_points):
+        release.wait(timeout=5)
+        sent.extend(data_points)
+        return data_points
+
+    client = BufferedAsyncRemoteDatalakeClient(
+        base_url=base_url,
+        access_id=os.getenv("ACCESS_ID"),
+        secret_key=os.getenv("SECRET_KEY"),
+        api_version="v4",
+        buffer_size=2,
+        buffer_timeout=60,
+    )
+    mocker.patch.object(client, "_send_documents", side_effect=slow_send)
+    points = [{"value": i} for i in range(10)]
+
+    start = monotonic()
+    for point in points:
+        client.save(
+            {"records": {"schema_name": "default", "data_points": [point]}}
+        )
+    assert monotonic() - start < 1
+
+    release.set()
+    deadline = monotonic() + 5
+    while len(sent) < len(points) and monotonic() < deadline:
+        release.wait(timeout=0.05)
+    assert sent == points
+
+
+def test_buffered_async_flushes_each_schema_at_its_deadline(
+    mocker: MockerFixture,
+):
+    sent = {}
+
+    def send(schema_name, data_points):
+        sent[schema_name] = monotonic()
+        return data_points
+
+    client = BufferedAsyncRemoteDatalakeClient(
+        base_url=base_url,
+        access_id=os.getenv("ACCESS_ID"),
+        secret_key=os.getenv("SECRET_KEY"),
+        api_version="v4",
+        buffer_size=100,
+        buffer_timeout=0.3,
+    )
+    mocker.patch.object(client, "_send_documents", side_effect=send)
+    client._data_buffers["default"].reset()
+    start = monotonic()
+    client.save(
+        {"records": {"schema_name": "default", "data_points": [{"v": 1}]}}
+    )
+    while "default" not in sent and monotonic() - start < 2:
+        Event().wait(timeout=0.02)
+
+    assert 0.3 <= sent["default"] - start < 0.6
+    assert "solutions" not in sent
+
+
+def test_buffered_async_close_drains_buffers(mocker: MockerFixture):
+    client = BufferedAsyncRemoteDatalakeClient(
+        base_url=base_url,
+        access_id=os.getenv("ACCESS_ID"),
+        secret_key=os.getenv("SECRET_KEY"),
+        api_version="v4",
+        buffer_size=100,
+        buffer_timeout=60,
+    )
+    send = mocker.patch.object(client, "_send_documents")
+    mock_write = mocker.patch.object(client, "_write")
+    for schema_name in ("default", "solutions"):
+        client.save(
+            {
+                "records": {
+                    "schema_name": schema_name,
+                    "data_points": [{"value": 1}],
+                }
+            }
+        )
+    send.assert_not_called()
+
+    client.close(timeout=2)
+    client.close(timeout=2)
+
+    assert {call.args[0] for call in send.call_args_list} == {
+        "default",
+        "solutions",
+    }
+    assert not client._flush_thread.is_alive()
+    client.save(
+        {"records": {"schema_name": "default", "data_points": [{"v": 2}]}}
+    )
+    mock_write.assert_called_once_with("default", [{"v": 2}])
+
+
+def test_asyncio_buffered_client_batches_until_flush(mocker: MockerFixture):
+    mock_post = mocker.patch.object(
+        SplightRestClient,
+        "async_post",
+        new_callable=mocker.AsyncMock,
+        return_value=MockResponse({}),
+    )
+    client = AsyncioBufferedRemoteDatalakeClient(
+        base_url=base_url,
+        access_id=os.getenv("ACCESS_ID"),
+        secret_key=os.getenv("SECRET_KEY"),
+        api_version="v4",
+        buffer_size=10,
+        buffer_timeout=60,
+    )
+    points = [{"value": i} for i in range(3)]
+
+    async def write():
+        for point in points:
+            await client.async_save(
+                {"records": {"schema_name": "default", "data_points": [point]}}
+            )
+        await asyncio.sleep(0)
+        assert mock_post.call_count == 0
+        await client.flush()
+        await client.aclose()
+
+    asyncio.run(write())
+    mock_post.assert_called_once()
+    sent = mock_post.call_args.kwargs["json"]["records"]
+    assert sent == {"schema_name": "default", "data_points": points}
+
+
+def test_asyncio_buffered_client_respects_the_payload_bound(
+    mocker: MockerFixture,
+):
+    mock_post = mocker.patch.object(
+        SplightRestClient,
+        "async_post",
+        new_callable=mocker.AsyncMock,
+        return_value=MockResponse({}),
+    )
+    client = AsyncioBufferedRemoteDatalakeClient(
+        base_url=base_url,
+        access_id=os.getenv("ACCESS_ID"),
+        secret_key=os.getenv("SECRET_KEY"),
+        api_version="v4",
+        buffer_size=100,
+        buffer_timeout=60,
+        buffer_max_payload_bytes=200,
+        buffer_overflow_policy=DatalakeOverflowPolicy.DROP_NEWEST,
+    )
+    buffer = client._data_buffers["default"]
+
+    async def write():
+        # The flusher task does not run until the writer yields
+        for i in range(20):
+            await client.async_save(
+                {
+                    "records": {
+                        "schema_name": "default",
+                        "data_points": [{"value": i}],
+                    }
+                }
+            )
+        assert buffer.nbytes <= 100
+        await client.aclose()
+
+    asyncio.run(write())
+    sent = [
+        point
+        for call in mock_post.call_args_list
+        for point in call.kwargs["json"]["records"]["data_points"]
+    ]
+    assert sent == [{"value": i} for i in range(len(sent))]
+    assert client.stats().dropped_points == 20 - len(sent)
+    assert len(sent) < 20
+
+
+def test_asyncio_buffered_save_without_loop_warns_once(
+    mocker: MockerFixture,
+):
+    client = AsyncioBufferedRemoteDatalakeClient(
+        base_url=base_url,
+        access_id=os.getenv("ACCESS_ID"),
+        secret_key=os.getenv("SECRET_KEY"),
+        api_version="v4",
+    )
+    write = mocker.patch.object(client, "write")
+    logger = mocker.patch("splight_lib.client.datalake.common.buffered.logger")
+    records = {"records": {"schema_name": "default", "data_points": [{}]}}
+
+    client.save(records)
+    client.save(records)
+
+    assert write.call_count == 2
+    logger.warning.assert_called_once()
+
+
+def test_asyncio_buffered_aclose_retries_until_the_timeout(
+    mocker: MockerFixture,
+):
+    client = AsyncioBufferedRemoteDatalakeClient(
+        base_url=base_url,
+        access_id=os.getenv("ACCESS_ID"),
+        secret_key=os.getenv("SECRET_KEY"),
+        api_version="v4",
+        buffer_size=100,
+        buffer_timeout=60,
+        retry_tries=1,
+        breaker_threshold=1,
+        breaker_reset_timeout=0.05,
+    )
+    write = mocker.patch.object(
+        client, "_async_write", new_callable=mocker.AsyncMock
+    )
+    write.side_effect = ValueError
+    client._sender._exceptions = (ValueError,)
+    logger = mocker.patch("splight_lib.client.datalake.common.buffered.logger")
+
+    async def close():
+        await client.async_save(
+            {"records": {"schema_name": "default", "data_points": [{"v": 1}]}}
+        )
+        await client.aclose(timeout=0.3)
+
+    asyncio.run(close())
+
+    assert write.call_count >= 2
+    assert client._data_buffers["default"].data == [{"v": 1}]
+    logger.warning.assert_any_call(
+        "Datalake client closed, %s documents were not sent",
+        1,
+        tags=mocker.ANY,
+    )
+
+
+def test_spool_replays_unacknowledged_segments(tmp_path):
+    spool = DatalakeSpool(tmp_path, fsync_batch=1)
+    spool.append("default", [{"value": 1}])
+    spool.append("default", [{"value": 2}])
+    acked = spool.seal("default")
+    spool.ack(acked)
+    spool.append("default", [{"value": 3}])
+    spool.release(spool.seal("default"))
+    spool.append("solutions", [{"value": 4}])
+    spool.close()
+
+    # A new spool over the same directory simulates a process restart
+    restarted = DatalakeSpool(tmp_path, replay_rate=float("inf"))
+    assert restarted.pending == 2
+    sent = []
+    while restarted.replay(lambda name, docs: sent.append((name, docs))):
+        pass
+    assert sent == [
+        ("default", [{"value": 3}]),
+        ("solutions", [{"value": 4}]),
+    ]
+    assert list(tmp_path.glob("**/*.seg")) == []
+    restarted.close()
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_spools_sharing_a_directory_keep_their_segments(tmp_path):
+    first = DatalakeSpool(tmp_path, replay_rate=float("inf"))
+    second = DatalakeSpool(tmp_path, replay_rate=float("inf"))
+    first.append("default", [{"value": 1}])
+    first.release(first.seal("default"))
+    first.sync()
+
+    # An open spool is not an orphan, the segment stays with its owner
+    third = DatalakeSpool(tmp_path)
+    assert second.pending == third.pending == 0
+    assert first.pending == 1
+    third.close()
+
+    first.close()
+    adopted = DatalakeSpool(tmp_path, replay_rate=float("inf"))
+    assert adopted.pending == 1
+    assert second.pending == 0
+
+
+def test_spool_moves_failing_segments_to_the_tail(tmp_path):
+    spool = DatalakeSpool(tmp_path, replay_rate=float("inf"), max_attempts=2)
+    for value in (1, 2):
+        spool.append("default", [{"value": value}])
+        spool.release(spool.seal("default"))
+    sent = []
+
+    def send(name, documents):
+        sent.append(documents[0]["value"])
+        if documents[0]["value"] == 1:
+            raise ValueError("Error")
+
+    while spool.replay(send) or spool.pending:
+        pass
+
+    # The failing segment does not stall the other one
+    assert sent == [1, 2]
+    dead_letter = list((tmp_path / "dead-letter").iterdir())
+    assert len(dead_letter) == 1
+    assert list(spool.directory.glob("*.seg")) == []
+
+
+def test_spool_keeps_only_the_unsent_documents(tmp_path):
+    spool = DatalakeSpool(tmp_path, replay_rate=float("inf"))
+    spool.append("default", [{"value": 1}, {"value": 2}])
+    spool.append("default", [{"value": 3}])
+    # The two oldest documents were evicted from a full buffer
+    spool.evict("default", 2)
+    spool.append("default", [{"value": 4}])
+    spool.release(spool.seal("default"))
+    spool.append("solutions", [{"value": 5}, {"value": 6}])
+    spool.release(spool.seal("solutions"), documents=[{"value": 6}])
+    spool.append("solutions", [{"value": 7}])
+    spool.release(spool.seal("solutions"), documents=[])
+
+    sent = []
+    while spool.replay(lambda name, docs: sent.append((name, docs))):
+        pass
+    assert sent == [
+        ("default", [{"value": 3}, {"value": 4}]),
+        ("solutions", [{"value": 6}]),
+    ]
+    spool.close()
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_buffered_flush_spools_only_the_failed_sub_batches(
+    mocker: MockerFixture, tmp_path
+):
+    client = BufferedSyncRemoteDataClient(
+        base_url=base_url,
+        access_id=os.getenv("ACCESS_ID"),
+        secret_key=os.getenv("SECRET_KEY"),
+        api_version="v4",
+        buffer_size=100,
+        buffer_timeout=60,
+        spool_dir=str(tmp_path),
+    )
+    client._batch_sender = DatalakeBatchSender(address_key, max_documents=1)
+
+    def write(name, documents):
+        if documents[0]["asset"] == "failing":
+            raise ValueError("Error")
+
+    mocker.patch.object(client, "_write_documents", side_effect=write)
+    client.save(
+        {
+            "records": {
+                "schema_name": "default",
+                "data_points": [
+                    {"asset": "sent", "attribute": "attr", "value": 1},
+                    {"asset": "failing", "attribute": "attr", "value": 2},
+                ],
+            }
+        }
+    )
+    client.close(timeout=5)
+
+    replayed = DatalakeSpool(tmp_path / "v4", replay_rate=float("inf"))
+    sent = []
+    replayed.replay(lambda name, docs: sent.extend(docs))
+    assert [doc["asset"] for doc in sent] == ["failing"]
+    replayed.close()
+
+
+@pytest.mark.parametrize(
+    "policy,expected_data,expected_overflow,expected_dropped",
+    [
+        (DatalakeOverflowPolicy.DROP_OLDEST, [2, 3, 4], [0, 1], 2),
+        (DatalakeOverflowPolicy.DROP_NEWEST, [0, 1, 2], [3, 4], 2),
+        (DatalakeOverflowPolicy.SPILL, [0, 1, 2], [3, 4], 0),
+    ],
+)
+def test_bounded_buffer_overflow_policies(
+    policy, expected_data, expected_overflow, expected_dropped
+):
+    buffer = DatalakeDocumentBuffer(
+        buffer_size=100,
+        buffer_timeout=60,
+        max_documents=3,
+        overflow_policy=policy,
+    )
+    buffer.add_documents([{"value": 0}, {"value": 1}])
+    _, overflow = buffer.add_documents([{"value": i} for i in range(2, 5)])
+
+    assert [doc["value"] for doc in buffer.data] == expected_data
+    assert [doc["value"] for doc in overflow] == expected_overflow
+    assert buffer.dropped == expected_dropped
+    assert buffer.is_full()
+    assert buffer.should_flush()
+
+
+def test_bounded_buffer_by_bytes():
+    document = {"value": 1}
+    buffer = DatalakeDocumentBuffer(
+        buffer_size=100,
+        buffer_timeout=60,
+        max_bytes=3 * documents_size([document] * 5) // 5,
+        overflow_policy=DatalakeOverflowPolicy.DROP_NEWEST,
+    )
+    accepted, overflow = buffer.add_documents([document] * 5)
+    assert len(accepted) == 3
+    assert len(overflow) == 2
+    assert not buffer.has_room([document])
+    buffer.swap()
+    assert buffer.nbytes == 0
+    assert buffer.has_room([document])
+
+
+def test_split_batches_keeps_order_per_key():
+    documents = [
+        {"asset": f"asset-{i % 3}", "attribute": "attr", "value": i}
+        for i in range(30)
+    ]
+    lanes = split_batches(
+        documents, address_key, max_documents=4, max_bytes=1024, lanes=2
+    )
+
+    assert all(len(batch) <= 4 for lane in lanes for batch in lane)
+    assert sorted(
+        doc["value"] for lane in lanes for batch in lane for doc in batch
+    ) == list(range(30))
+    for lane in lanes:
+        values = [doc["value"] for batch in lane for doc in batch]
+        for asset in {f"asset-{i}" for i in range(3)}:
+            per_key = [v for v in values if documents[v]["asset"] == asset]
+            assert per_key == sorted(per_key)
+
+
+def test_batch_sender_returns_failed_sub_batches():
+    documents = [
+        {"asset": f"asset-{i % 4}", "attribute": "attr", "value": i}
+        for i in range(20)
+    ]
+
+    def send(name, batch):
+        if any(doc["asset"] == "asset-1" for doc in batch):
+            raise ValueError("Error")
+
+    sender = DatalakeBatchSender(address_key, max_documents=2, parallelism=4)
+    failed = sender.send(send, "default", documents)
+
+    assert len(failed) < len(documents)
+    assert all(doc in failed for doc in documents if doc["asset"] == "asset-1")
+
+
+def _points(values, start=0):
+    return [
+        {
+            "asset": "asset",
+            "attribute": "attr",
+            "timestamp": f"2024-01-01T00:00:{start + i:02d}Z",
+            "value": value,
+        }
+        for i, value in enumerate(values)
+    ]
+
+
+@pytest.mark.parametrize(
+    "reduction,deadband,expected",
+    [
+        (DatalakeReduction.NONE, 0, [1, 1, 1.2, 1.5, 3, 3]),
+        (DatalakeReduction.ABSOLUTE, 0.4, [1, 1.5, 3]),
+        (DatalakeReduction.PERCENT, 10, [1, 1.2, 1.5, 3]),
+    ],
+)
+def test_write_reducer_deadband(reduction, deadband, expected):
+    reducer = DatalakeWriteReducer(
+        address_key, reduction=reduction, deadband=deadband
+    )
+    points = _points([1, 1, 1.2, 1.5, 3, 3])
+
+    written = reducer.reduce("default", points)
+
+    assert [point["value"] for point in written] == expected
+
+
+def test_write_reducer_swinging_door_and_heartbeat():
+    reducer = DatalakeWriteReducer(
+        address_key,
+        reduction=DatalakeReduction.SWINGING_DOOR,
+        deadband=0.5,
+        max_silence=30,
+    )
+    # A ramp followed by a step, only the corners are needed
+    ramp = _points([0, 1, 2, 3, 4, 10, 10, 10])
+
+    written = reducer.reduce("default", ramp)
+    held = reducer.flush()
+
+    assert [point["value"] for point in written] == [0, 4, 10]
+    assert [point["value"] for point in held["default"]] == [10]
+    heartbeat = reducer.reduce("default", _points([10], start=45))
+    assert [point["value"] for point in heartbeat] == [10]
+    ((key, ratio),) = reducer.ratios().items()
+    assert key[0] == "default"
+    assert ratio == 9 / 5
+
+
+def test_coalesce_keeps_last_value_per_timestamp():
+    points = _points([1, 2]) + _points([3])
+
+    assert [point["value"] for point in coalesce(points, address_key)] == [
+        3,
+        2,
+    ]
+
+
+def test_circuit_breaker_short_circuits_and_probes():
+    calls = []
+
+    def failing():
+        calls.append(monotonic())
+        raise ValueError("Error")
+
+    sender = ResilientSender(
+        (ValueError,),
+        tries=3,
+        backoff_base=0,
+        breaker=CircuitBreaker(failure_threshold=2, reset_timeout=0.2),
+    )
+    with pytest.raises(ValueError):
+        sender.call(failing)
+    # The retries stop as soon as the circuit opens
+    assert len(calls) == 2
+    assert sender.breaker.state == CircuitState.OPEN
+    with pytest.raises(CircuitOpenError):
+        sender.call(failing)
+    assert len(calls) == 2
+
+    Event().wait(timeout=0.25)
+    assert sender.call(lambda: "ok") == "ok"
+    assert sender.breaker.state == CircuitState.CLOSED
+
+
+def test_buffered_async_requeues_failed_documents(mocker: MockerFixture):
+    client = BufferedAsyncRemoteDatalakeClient(
+        base_url=base_url,
+        access_id=os.getenv("ACCESS_ID"),
+        secret_key=os.getenv("SECRET_KEY"),
+        api_version="v4",
+        buffer_size=100,
+        buffer_timeout=60,
+        retry_tries=1,
+        breaker_threshold=1,
+        breaker_reset_timeout=60,
+    )
+    write = mocker.patch.object(client, "_write", side_effect=ValueError)
+    client._sender._exceptions = (ValueError,)
+    buffer = client._data_buffers["default"]
+    with client._lock:
+        buffer.add_documents([{"value": 1}, {"value": 2}])
+
+    client._flush_buffer("default", buffer)
+
+    write.assert_called_once()
+    assert buffer.data == [{"value": 1}, {"value": 2}]
+    assert client._sender.breaker.state == CircuitState.OPEN
+
+
+def test_close_drains_documents_failed_by_the_flusher(mocker: MockerFixture):
+    client = BufferedAsyncRemoteDatalakeClient(
+        base_url=base_url,
+        access_id=os.getenv("ACCESS_ID"),
+        secret_key=os.getenv("SECRET_KEY"),
+        api_version="v4",
+        buffer_size=1,
+        buffer_timeout=60,
+        retry_tries=1,
+    )
+    sending, fail = Event(), Event()
+
+    def write(schema_name, data_points):
+        if not sending.is_set():
+            sending.set()
+            fail.wait(timeout=1)
+            raise ValueError("failed")
+
+    mock_write = mocker.patch.object(client, "_write", side_effect=write)
+    client._sender._exceptions = (ValueError,)
+    client.save(
+        {"records": {"schema_name": "default", "data_points": [{"v": 1}]}}
+    )
+    assert sending.wait(timeout=1)
+    # The flush in flight fails while close waits for the flusher
+    Timer(0.1, fail.set).start()
+
+    client.close(timeout=5)
+
+    assert mock_write.call_count == 2
+    assert mock_write.call_args.args == ("default", [{"v": 1}])
+    assert client.stats().dropped_points == 0
+
+
+def test_close_settles_segments_of_sends_still_running(
+    mocker: MockerFixture, tmp_path
+):
+    client = BufferedSyncRemoteDataClient(
+        base_url=base_url,
+        access_id=os.getenv("ACCESS_ID"),
+        secret_key=os.getenv("SECRET_KEY"),
+        api_version="v4",
+        buffer_size=100,
+        buffer_timeout=60,
+        spool_dir=str(tmp_path),
+    )
+    release = Event()
+    mocker.patch.object(
+        client, "_write", side_effect=lambda *args: release.wait(5)
+    )
+    client.save(
+        {"records": {"schema_name": "default", "data_points": [{"v": 1}]}}
+    )
+
+    client.close(timeout=0.05)
+
+    # The segment is neither released nor replayed while it is being sent
+    assert len(list(tmp_path.glob("**/*.seg"))) == 1
+    assert DatalakeSpool(tmp_path / "v4").pending == 0
+    release.set()
+    deadline = monotonic() + 5
+    while list(tmp_path.glob("**/*.seg")) and monotonic() < deadline:
+        Event().wait(timeout=0.02)
+    assert list(tmp_path.glob("**/*.seg")) == []
+
+
+def test_reads_and_writes_share_the_circuit_breaker(mocker: MockerFixture):
+    client = V4SyncRemoteDatalakeClient(
+        base_url=base_url,
+        access_id=os.getenv("ACCESS_ID"),
+        secret_key=os.getenv("SECRET_KEY"),
+        retry_tries=1,
+        breaker_threshold=2,
+    )
+    client._sender._exceptions = (ValueError,)
+    post = mocker.patch.object(
+        client._restclient, "post", side_effect=ValueError("Error")
+    )
+    for _ in range(2):
+        with pytest.raises(ValueError):
+            client._get({"source": "default"})
+
+    # The failed reads opened the circuit, the write is not sent
+    with pytest.raises(CircuitOpenError):
+        client.save({"records": {"schema_name": "default", "data_points": []}})
+    assert post.call_count == 2
+
+
+def test_close_datalake_clients_shares_the_timeout(mocker: MockerFixture):
+    timeouts = []
+
+    class SlowClient(AbstractDatalakeClient):
+        def close(self, timeout=None):
+            timeouts.append(timeout)
+            Event().wait(timeout=min(timeout, 0.1))
+
+        def save(self, records):
+            return []
+
+        async def async_save(self, records):
+            return []
+
+        def _get(self, request):
+            return []
+
+        async def _async_get(self, request):
+            return []
+
+    mocker.patch.dict(AbstractDatalakeClient._instances, clear=True)
+    # Each class is a singleton, registered when it is instantiated
+    for name in ("First", "Second", "Third"):
+        type(name, (SlowClient,), {})()
+
+    start = monotonic()
+    close_datalake_clients(0.15)
+
+    assert monotonic() - start < 0.25
+    assert timeouts[0] == pytest.approx(0.15, abs=0.01)
+    assert timeouts[1] < 0.1
+    assert timeouts[2] == 0
+
+
+def test_rejected_documents_are_dropped(mocker: MockerFixture):
+    client = BufferedAsyncRemoteDatalakeClient(
+        base_url=base_url,
+        access_id=os.getenv("ACCESS_ID"),
+        secret_key=os.getenv("SECRET_KEY"),
+        api_version="v4",
+        buffer_size=100,
+        buffer_timeout=60,
+        retry_tries=3,
+        breaker_threshold=1,
+    )
+    write = mocker.patch.object(
+        client, "_write", side_effect=DatalakeRequestError(400, "invalid")
+    )
+    buffer = client._data_buffers["default"]
+    with client._lock:
+        buffer.add_documents([{"value": 1}, {"value": 2}])
+
+    client._flush_buffer("default", buffer)
+
+    write.assert_called_once()
+    assert buffer.data == []
+    assert client._sender.breaker.state == CircuitState.CLOSED
+    assert client.stats().dropped_points == 2
+
+
+def test_circuit_breaker_probe_always_resolves():
+    def unexpected():
+        raise KeyError("bug")
+
+    sender = ResilientSender(
+        (ValueError,),
+        tries=1,
+        breaker=CircuitBreaker(failure_threshold=1, reset_timeout=0.05),
+    )
+    with pytest.raises(ValueError):
+        sender.call(_raise, ValueError())
+    Event().wait(timeout=0.1)
+    with pytest.raises(KeyError):
+        sender.call(unexpected)
+    assert sender.breaker.state == CircuitState.OPEN
+
+    async def cancelled():
+        raise asyncio.CancelledError()
+
+    Event().wait(timeout=0.2)
+    with pytest.raises(asyncio.CancelledError):
+        asyncio.run(sender.async_call(cancelled))
+    assert sender.breaker.state == CircuitState.OPEN
+    assert sender.call(lambda: "ok") == "ok"
+
+
+def _raise(exc: Exception):
+    raise exc
+
+
+def test_buffered_sync_stats(mocker: MockerFixture):
+    client = BufferedSyncRemoteDataClient(
+        base_url=base_url,
+        access_id=os.getenv("ACCESS_ID"),
+        secret_key=os.getenv("SECRET_KEY"),
+        api_version="v4",
+        buffer_size=3,
+        buffer_timeout=60,
+    )
+    mocker.patch.object(client, "_write")
+    callback = mocker.Mock()
+    client.set_stats_callback(callback)
+    records = {
+        "records": {"schema_name": "default", "data_points": _points([1, 2])}
+    }
+
+    client.save(records)
+    stats = client.stats()
+    assert stats.queue_depth == {"default": 2, "solutions": 0}
+    assert stats.enqueued_points == 2
+    assert stats.oldest_point_age >= 0
+    callback.assert_not_called()
+
+    client.save(records)
+    stats = callback.call_args.args[0]
+    assert stats.queue_depth == {"default": 0, "solutions": 0}
+    assert stats.enqueued_points == stats.sent_points == 4
+    assert stats.sent_bytes == stats.enqueued_bytes
+    assert stats.flushes == sum(stats.flush_latency.values()) == 1
+    assert stats.oldest_point_age is None
+
+
+def test_buffered_save_encodes_each_batch_once(mocker: MockerFixture):
+    client = BufferedSyncRemoteDataClient(
+        base_url=base_url,
+        access_id=os.getenv("ACCESS_ID"),
+        secret_key=os.getenv("SECRET_KEY"),
+        api_version="v4",
+        buffer_size=100,
+        buffer_timeout=60,
+        buffer_max_payload_bytes=1024 * 1024,
+        buffer_overflow_policy=DatalakeOverflowPolicy.BLOCK,
+    )
+    size = mocker.Mock(wraps=documents_size)
+    mocker.patch(
+        "splight_lib.client.datalake.common.buffered.documents_size", size
+    )
+    mocker.patch(
+        "splight_lib.client.datalake.common.buffer.documents_size", size
+    )
+    mocker.patch(
+        "splight_lib.client.datalake.common.batching.documents_size", size
+    )
+    mock_write = mocker.patch.object(client, "_write_documents")
+    records = {
+        "records": {"schema_name": "default", "data_points": _points([1, 2])}
+    }
+
+    client.save(records)
+    client.save(records)
+
+    assert size.call_count == 2
+    stats = client.stats()
+    assert 0 < stats.enqueued_bytes <= 2 * documents_size(_points([1, 2]))
+    assert client._data_buffers["default"].nbytes == stats.enqueued_bytes
+
+    # The flush splits the documents with the sizes tracked by the buffer
+    client._batch_sender = DatalakeBatchSender(
+        address_key, max_bytes=stats.enqueued_bytes // 2, parallelism=1
+    )
+    client.close(timeout=5)
+    assert size.call_count == 2
+    assert [len(call.args[1]) for call in mock_write.call_args_list] == [2, 2]
+
+
+def test_map_concurrently_keeps_order():
+    def slow(item):
+        Event().wait(timeout=(5 - item) / 100)
+        return item * 2
+
+    async def async_slow(item):
+        await asyncio.sleep((5 - item) / 100)
+        return item * 2
+
+    expected = [0, 2, 4, 6, 8]
+    assert map_concurrently(slow, range(5), max_workers=3) == expected
+    assert (
+        asyncio.run(async_map_concurrently(async_slow, range(5), 3))
+        == expected
+    )
+
+
+def test_identical_reads_share_one_request(mocker: MockerFixture):
+    client = V4SyncRemoteDatalakeClient(
+        base_url=base_url,
+        access_id="access_id",
+        secret_key="secret_key",
+        coalesce_reads=True,
+    )
+    barrier = Barrier(4)
+    release = Event()
+
+    def post(url, json):
+        release.wait(timeout=1)
+        return MockResponse([{"value": 1}])
+
+    mock_post = mocker.patch.object(
+        SplightRestClient, "post", side_effect=post
+    )
+    results = []
+
+    def read(request):
+        barrier.wait()
+        results.append(client._get(request))
+
+    threads = [
+        Thread(target=read, args=({"b": 1, "a": [2]},)),
+        Thread(target=read, args=({"a": [2], "b": 1},)),
+        Thread(target=read, args=({"a": [2], "b": 1},)),
+        Thread(target=read, args=({"a": [3], "b": 1},)),
+    ]
+    for thread in threads:
+        thread.start()
+    Event().wait(timeout=0.1)
+    release.set()
+    for thread in threads:
+        thread.join()
+
+    assert mock_post.call_count == 2
+    assert results == [[{"value": 1}]] * 4
+
+
+def test_single_flight_across_tasks_and_cancellation():
+    flight = SingleFlight()
+    calls = []
+
+    async def fetch():
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        return len(calls)
+
+    async def main():
+        leader = asyncio.create_task(flight.async_do("key", fetch))
+        await asyncio.sleep(0)
+        followers = [
+            asyncio.create_task(flight.async_do("key", fetch))
+            for _ in range(3)
+        ]
+        await asyncio.sleep(0)
+        assert await asyncio.gather(leader, *followers) == [1] * 4
+
+        # A cancelled leader makes a waiting caller run the call again
+        leader = asyncio.create_task(flight.async_do("key", fetch))
+        await asyncio.sleep(0)
+        follower = asyncio.create_task(flight.async_do("key", fetch))
+        await asyncio.sleep(0)
+        leader.cancel()
+        assert await follower == 3
+        assert leader.cancelled()
+
+    asyncio.run(main())
+    assert len(calls) == 3
+
+
+def _seconds_arrays(start: int, stop: int) -> DatalakeArrays:
+    seconds = np.arange(start, stop)
+    return DatalakeArrays(
+        timestamp=(
+            np.datetime64("2024-01-01T00:00:00", "ns")
+            + seconds.astype("timedelta64[s]")
+        ),
+        value=seconds.astype(float),
+        key=np.zeros(len(seconds), dtype=np.int32),
+        keys=[("asset", "attr")],
+    )
+
+
+def test_disk_cache_serves_covered_ranges(tmp_path):
+    cache = DatalakeDiskCache(tmp_path, settled=0)
+    start = datetime(2024, 1, 1, tzinfo=timezone.utc)
+
+    def at(second: int) -> datetime:
+        return start + timedelta(seconds=second)
+
+    cache.put("key", at(0), at(59), _seconds_arrays(0, 60))
+    cache.put("key", at(59), at(119), _seconds_arrays(59, 120))
+
+    arrays = cache.get("key", at(10), at(100))
+    assert arrays.value.tolist() == list(range(10, 101))
+    assert arrays.keys == [("asset", "attr")]
+    single = cache.get("key", at(5), at(6))
+    assert isinstance(single.value, np.memmap)
+    assert cache.get("key", at(100), at(130)) is None
+    assert cache.get("other", at(0), at(10)) is None
+
+
+def test_disk_cache_evicts_least_recently_read(tmp_path):
+    cache = DatalakeDiskCache(tmp_path, max_bytes=3000, settled=0)
+    start = datetime(2024, 1, 1, tzinfo=timezone.utc)
+    for key in ("a", "b", "c"):
+        cache.put(key, start, start, _seconds_arrays(0, 60))
+        Event().wait(timeout=0.01)
+
+    assert cache.get("a", start, start) is None
+    assert cache.get("c", start, start) is not None
+
+
+@pytest.mark.parametrize(
+    "aggregation", ["sum", "avg", "min", "max", "count", "last"]
+)
+def test_resample_matches_window_aggregations(aggregation):
+    rng = np.random.default_rng(0)
+    offsets = np.sort(rng.integers(0, 3600 * 10**9, 500))
+    timestamps = np.datetime64("2024-01-01", "ns") + offsets.astype(
+        "timedelta64[ns]"
+    )
+    values = rng.normal(size=500)
+    codes = rng.integers(0, 3, 500).astype(np.int32)
+    arrays = DatalakeArrays(
+        timestamps, values, codes, [("a",), ("b",), ("c",)]
+    )
+
+    result = resample(arrays, 300, aggregation)
+
+    df = pd.DataFrame({"key": codes, "value": values})
+    windows = pd.Series(timestamps).dt.floor("300s")
+    expected = getattr(
+        df.groupby(["key", windows]).value,
+        "mean" if aggregation == "avg" else aggregation,
+    )()
+    assert np.allclose(result.value, expected.to_numpy())
+    assert (result.key == expected.index.get_level_values(0)).all()
+    assert (result.timestamp == expected.index.get_level_values(1)).all()
+
+
+def test_resample_time_weighted_average_and_step():
+    arrays = DatalakeArrays(
+        timestamp=np.array(
+            [
+                "2024-01-01T00:00:00",
+                "2024-01-01T00:00:30",
+                "2024-01-01T00:01:30",
+            ],
+            dtype="datetime64[ns]",
+        ),
+        value=np.array([0.0, 10.0, 20.0]),
+    )
+
+    average = resample(arrays, 60, "time_weighted_avg")
+    step = resample(arrays, 60, "step", end="2024-01-01T00:03:00")
+
+    assert average.value.tolist() == [5.0, 15.0]
+    assert step.value.tolist() == [0.0, 10.0, 20.0]
+    assert step.timestamp[-1] == np.datetime64("2024-01-01T00:02:00")
+
+
+def test_resample_frame_by_key_columns():
+    df = pd.DataFrame(
+        {
+            "value": [1.0, 2.0, 3.0, 5.0],
+            "asset": ["x", "y", "x", "x"],
+            "attribute": "power",
+        },
+        index=[
+            "2024-01-01T00:00:00Z",
+            "2024-01-01T00:00:10Z",
+            "2024-01-01T00:00:20Z",
+            "2024-01-01T00:01:20Z",
+        ],
+    )
+
+    result = resample_frame(df, "1min", "avg", by=["asset", "attribute"])
+
+    assert result["asset"].tolist() == ["x", "y", "x"]
+    assert result["value"].tolist() == [2.0, 2.0, 5.0]
+    assert str(result.index.tz) == "UTC"
+
+
+def test_columnar_encoding_groups_points_by_key():
+    data_points = [
+        {"asset": "a1", "attribute": "x", "timestamp": "t1", "value": 1},
+        {"asset": "a2", "attribute": "x", "timestamp": "t1", "value": 2},
+        {"asset": "a1", "attribute": "x", "timestamp": "t2", "value": 3},
+    ]
+    request = encode_columnar("default", data_points)
+    assert request["records"]["series"] == [
+        {
+            "asset": "a1",
+            "attribute": "x",
+            "timestamps": ["t1", "t2"],
+            "values": [1, 3],
+        },
+        {
+            "asset": "a2",
+            "attribute": "x",
+            "timestamps": ["t1"],
+            "values": [2],
+        },
+    ]
+    schema_name, decoded = decode_columnar(request)
+    assert schema_name == "default"
+    assert sorted(decoded, key=lambda p: p["value"]) == data_points
+
+
+@pytest.mark.parametrize(
+    "server_columnar,expected_paths",
+    [
+        (True, [COLUMNAR_WRITE_PATH, COLUMNAR_WRITE_PATH]),
+        (False, [WRITE_PATH, WRITE_PATH]),
+    ],
+)
+def test_auto_write_format_negotiation(server_columnar, expected_paths):
+    data_points = [
+        {"asset": "a", "attribute": "x", "timestamp": "t", "value": 1.0}
+    ]
+    records = {
+        "records": {"schema_name": "default", "data_points": data_points}
+    }
+    with LocalDatalakeServer(columnar=server_columnar) as server:
+        client = V4SyncRemoteDatalakeClient(
+            base_url=server.url,
+            access_id=os.getenv("ACCESS_ID"),
+            secret_key=os.getenv("SECRET_KEY"),
+            write_format=DatalakeWriteFormat.AUTO,
+        )
+        client.save(records)
+        client.save(records)
+    assert [write.path for write in server.writes] == expected_paths
+    assert all(write.data_points == data_points for write in server.writes)
+
+
+@pytest.mark.parametrize(
+    "encoding", [ContentEncoding.GZIP, ContentEncoding.ZSTD]
+)
+def test_compressed_columnar_writes_round_trip(encoding):
+    data_points = [
+        {"asset": "a", "attribute": attribute, "timestamp": "t", "value": i}
+        for i, attribute in enumerate(["x", "y", "x"])
+    ]
+    with LocalDatalakeServer(columnar=True) as server:
+        client = V4SyncRemoteDatalakeClient(
+            base_url=server.url,
+            access_id=os.getenv("ACCESS_ID"),
+            secret_key=os.getenv("SECRET_KEY"),
+            write_format=DatalakeWriteFormat.COLUMNAR,
+            request_compression=encoding,
+            compression_threshold=0,
+        )
+        client.save(
+            {"records": {"schema_name": "default", "data_points": data_points}}
+        )
+    (write,) = server.writes
+    assert write.path == COLUMNAR_WRITE_PATH
+    assert write.content_encoding == resolve_encoding(encoding)
+    assert sorted(write.data_points, key=lambda p: p["value"]) == data_points
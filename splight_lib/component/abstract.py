@@ -1,9 +1,10 @@
 import os
+import signal
 import sys
 from abc import ABC, abstractmethod
 from collections import namedtuple
 from tempfile import NamedTemporaryFile
-from threading import Thread
+from threading import Thread, current_thread, main_thread
 from time import sleep
 from typing import Callable, Type
 
@@ -96,6 +97,13 @@ class SplightBaseComponent(ABC):
             self.stop()
 
         self.start = self._wrap_start(self.start)
+        self._stopping = False
+        self._previous_sigterm = None
+        # Signal handlers can only be set from the main thread
+        if current_thread() is main_thread():
+            self._previous_sigterm = signal.signal(
+                signal.SIGTERM, self._handle_sigterm
+            )
 
     def _setup_component(self, component_id: str):
         self._spec = self._load_spec()
@@ -137,8 +145,29 @@ class SplightBaseComponent(ABC):
     def execution_engine(self) -> ExecutionEngine:
         return self._execution_engine
 
+    def _handle_sigterm(self, signum, frame):
+        # The handler runs in the main thread, interrupting whatever it was
+        # doing, even a save holding the lock of a datalake client. So it
+        # does not block: it unwinds the main thread with SystemExit and
+        # the documents are sent by the exit path of start.
+        previous = self._previous_sigterm
+        if callable(previous):
+            previous(signum, frame)
+        if self._stopping:
+            return
+        logger.info(
+            "Received SIGTERM, stopping component", tags=LogTags.COMPONENT
+        )
+        self._stopping = True
+        self._health_check.stop()
+        raise SystemExit(0)
+
     def _register_exit(self):
-        if self._execution_engine.state == EngineStatus.FAILED:
+        # os._exit skips the interpreter shutdown, so the buffered datalake
+        # documents are sent by the engine stop before.
+        failed = self._execution_engine.state == EngineStatus.FAILED
+        self._execution_engine.stop()
+        if failed:
             os._exit(1)
         else:
             os._exit(0)
@@ -166,16 +195,22 @@ class SplightBaseComponent(ABC):
             # can get that error and the component will fail
             self._health_check_thread.start()
             try:
-                original_start()
-            except Exception as exc:
-                logger.exception(exc, tags=LogTags.COMPONENT)
-                self._health_check.stop()
-                self._health_check_thread.join()
-                self._execution_engine.stop()
-                os._exit(1)
-
-            # Wait for healthcheck to update before stopping everything
-            sleep(HealthCheckProcessor.HEALTHCHECK_INTERVAL)
+                try:
+                    original_start()
+                except Exception as exc:
+                    logger.exception(exc, tags=LogTags.COMPONENT)
+                    self._health_check.stop()
+                    self._health_check_thread.join()
+                    self._execution_engine.stop()
+                    os._exit(1)
+                # Wait for healthcheck to update before stopping everything
+                sleep(HealthCheckProcessor.HEALTHCHECK_INTERVAL)
+            except SystemExit:
+                # Raised by the SIGTERM handler, the component exits below
+                if not self._stopping:
+                    raise
+            # A SIGTERM received from now on does not interrupt the exit
+            self._stopping = True
             self._health_check.stop()
             self._health_check_thread.join()
             self._register_exit()
@@ -0,0 +1,61 @@
+import signal
+
+import pytest
+from pytest_mock import MockerFixture
+
+from splight_lib.component.abstract import (
+    HealthCheckProcessor,
+    SplightBaseComponent,
+)
+from splight_lib.settings import datalake_settings
+
+
+class Component(SplightBaseComponent):
+    def start(self) -> None:
+        # Simulates a SIGTERM received while the component is running
+        signal.raise_signal(signal.SIGTERM)
+
+
+@pytest.fixture
+def previous_handler():
+    handler = signal.getsignal(signal.SIGTERM)
+    previous = []
+    signal.signal(
+        signal.SIGTERM, lambda signum, frame: previous.append(signum)
+    )
+    yield previous
+    signal.signal(signal.SIGTERM, handler)
+
+
+@pytest.fixture
+def component(mocker: MockerFixture, previous_handler) -> Component:
+    mocker.patch.object(SplightBaseComponent, "_setup_component")
+    mocker.patch.object(HealthCheckProcessor, "HEALTHCHECK_INTERVAL", 0.01)
+    return Component()
+
+
+def test_sigterm_handler_chains_and_does_not_block(
+    mocker: MockerFixture, component: Component, previous_handler: list
+):
+    close = mocker.patch("splight_lib.execution.engine.close_datalake_clients")
+
+    with pytest.raises(SystemExit):
+        component._handle_sigterm(signal.SIGTERM, None)
+    # A second signal while stopping is only chained
+    component._handle_sigterm(signal.SIGTERM, None)
+
+    assert previous_handler == [signal.SIGTERM, signal.SIGTERM]
+    close.assert_not_called()
+
+
+def test_sigterm_drains_clients_once_in_the_exit_path(
+    mocker: MockerFixture, component: Component, previous_handler: list
+):
+    close = mocker.patch("splight_lib.execution.engine.close_datalake_clients")
+    exit_ = mocker.patch("splight_lib.component.abstract.os._exit")
+
+    component.start()
+
+    assert previous_handler == [signal.SIGTERM]
+    close.assert_called_once_with(datalake_settings.DL_CLOSE_TIMEOUT)
+    exit_.assert_called_once_with(0)
@@ -6,8 +6,10 @@ from apscheduler.schedulers.background import BackgroundScheduler
 from apscheduler.schedulers.blocking import BlockingScheduler
 from strenum import PascalCaseStrEnum
 
+from splight_lib.client.datalake import close_datalake_clients
 from splight_lib.execution.task import BaseTask
 from splight_lib.logging._internal import LogTags, get_splight_logger
+from splight_lib.settings import datalake_settings
 
 
 class EngineStatus(PascalCaseStrEnum):
@@ -66,11 +68,15 @@ class ExecutionEngine:
         self._logger.info("Execution Engine started", tags=LogTags.RUNTIME)
 
     def stop(self):
-        """Stops all the schedulers and its task without waiting to finish."""
+        """Stops all the schedulers and its task without waiting to finish.
+        The documents buffered by the datalake clients are sent before
+        returning, waiting at most DL_CLOSE_TIMEOUT seconds.
+        """
         if self._blocking_sch.running:
             self._blocking_sch.shutdown(wait=False)
         if self._background_sch.running:
             self._background_sch.shutdown(wait=False)
+        close_datalake_clients(datalake_settings.DL_CLOSE_TIMEOUT)
         self._running = False
         self._state = EngineStatus.STOPPED
         self._logger.info("Execution Engine stopped", tags=LogTags.RUNTIME)
@@ -1,13 +1,50 @@
+import json
 from datetime import datetime
 from enum import Enum
 from hashlib import sha256
-from typing import Annotated, Any, Generator, Generic, Literal, TypeVar
+from operator import itemgetter
+from typing import (
+    Annotated,
+    Any,
+    AsyncIterator,
+    Generator,
+    Generic,
+    Iterator,
+    Literal,
+    TypeVar,
+)
 
+import numpy as np
+import pandas as pd
 from pydantic import BaseModel, ConfigDict, Field, PrivateAttr
 from typing_extensions import Self
 
 from splight_lib.client.datalake import DatalakeClientBuilder
 from splight_lib.client.datalake.common.abstract import AbstractDatalakeClient
+from splight_lib.client.datalake.common.arrays import (
+    DatalakeArrays,
+    decode_wide_rows,
+    value_dtype,
+)
+from splight_lib.client.datalake.common.concurrency import (
+    async_map_concurrently,
+    map_concurrently,
+)
+from splight_lib.client.datalake.common.cursor import aiter_pages, iter_pages
+from splight_lib.client.datalake.common.disk_cache import (
+    DatalakeDiskCache,
+    get_disk_cache,
+)
+from splight_lib.client.datalake.common.frames import (
+    address_columns,
+    wide_frame,
+)
+from splight_lib.client.datalake.common.ingestion import format_timestamps
+from splight_lib.client.datalake.common.read_batching import (
+    ReadMerger,
+    async_batched_read,
+    batched_read,
+)
 from splight_lib.client.datalake.v3.constants import StepName
 from splight_lib.models._v3.asset import Asset
 from splight_lib.models._v3.attribute import Attribute
@@ -38,6 +75,39 @@ def get_datalake_client() -> AbstractDatalakeClient:
             "api_version": SplightAPIVersion.V3,
             "buffer_size": datalake_settings.DL_BUFFER_SIZE,
             "buffer_timeout": datalake_settings.DL_BUFFER_TIMEOUT,
+            "buffer_max_documents": datalake_settings.DL_BUFFER_MAX_DOCUMENTS,
+            "buffer_max_payload_bytes": (
+                datalake_settings.DL_BUFFER_MAX_PAYLOAD_BYTES
+            ),
+            "buffer_overflow_policy": (
+                datalake_settings.DL_BUFFER_OVERFLOW_POLICY
+            ),
+            "buffer_block_timeout": datalake_settings.DL_BUFFER_BLOCK_TIMEOUT,
+            "spool_dir": datalake_settings.DL_SPOOL_DIR,
+            "spool_fsync_batch": datalake_settings.DL_SPOOL_FSYNC_BATCH,
+            "spool_replay_rate": datalake_settings.DL_SPOOL_REPLAY_RATE,
+            "flush_max_documents": datalake_settings.DL_FLUSH_MAX_DOCUMENTS,
+            "flush_max_bytes": datalake_settings.DL_FLUSH_MAX_BYTES,
+            "flush_parallelism": datalake_settings.DL_FLUSH_PARALLELISM,
+            "retry_tries": datalake_settings.DL_RETRY_TRIES,
+            "backoff_base": datalake_settings.DL_BACKOFF_BASE,
+            "backoff_cap": datalake_settings.DL_BACKOFF_CAP,
+            "breaker_threshold": datalake_settings.DL_BREAKER_THRESHOLD,
+            "breaker_reset_timeout": (
+                datalake_settings.DL_BREAKER_RESET_TIMEOUT
+            ),
+            "breaker_max_reset_timeout": (
+                datalake_settings.DL_BREAKER_MAX_RESET_TIMEOUT
+            ),
+            "reduction": datalake_settings.DL_REDUCTION,
+            "deadband": datalake_settings.DL_DEADBAND,
+            "max_silence": datalake_settings.DL_MAX_SILENCE,
+            "dedup": datalake_settings.DL_DEDUP,
+            "request_compression": datalake_settings.DL_REQUEST_COMPRESSION,
+            "compression_threshold": (
+                datalake_settings.DL_COMPRESSION_THRESHOLD
+            ),
+            "coalesce_reads": datalake_settings.DL_COALESCE_READS,
         },
     )
 
@@ -121,25 +191,285 @@ class DataRequest(Generic[T], BaseModel):
     def as_pipeline(self) -> list[dict[str, Any]]:
         return [step.to_step() for step in self.pipeline]
 
-    def apply(self) -> list[T]:
+    def apply(self, max_concurrency: int | None = None) -> list[T]:
+        """Retrieves the data of the traces. Traces are requested in batches
+        of MAX_NUM_TRACES sent concurrently.
+
+        Parameters
+        ----------
+        max_concurrency: int | None maximum number of batches requested at
+            the same time, defaults to DL_READ_CONCURRENCY.
+        """
+        return self._merge_responses(self._fetch(max_concurrency))
+
+    async def async_apply(self, max_concurrency: int | None = None) -> list[T]:
+        """Retrieves the data of the traces. Traces are requested in batches
+        of MAX_NUM_TRACES sent concurrently.
+
+        Parameters
+        ----------
+        max_concurrency: int | None maximum number of batches requested at
+            the same time, defaults to DL_READ_CONCURRENCY.
+        """
+        responses = await self._async_fetch(max_concurrency)
+        return self._merge_responses(responses)
+
+    def apply_dataframe(
+        self, max_concurrency: int | None = None
+    ) -> pd.DataFrame:
+        """Retrieves the data of the traces as a wide DataFrame, indexed by
+        timestamp with one column per trace, labeled by asset and attribute.
+        The DataFrame is built from the responses without models.
+
+        Parameters
+        ----------
+        max_concurrency: int | None maximum number of batches requested at
+            the same time, defaults to DL_READ_CONCURRENCY.
+        """
+        return self._wide_frame(self._fetch(max_concurrency))
+
+    async def async_apply_dataframe(
+        self, max_concurrency: int | None = None
+    ) -> pd.DataFrame:
+        """Async version of apply_dataframe."""
+        return self._wide_frame(await self._async_fetch(max_concurrency))
+
+    def apply_arrays(
+        self, with_keys: bool = False, max_concurrency: int | None = None
+    ) -> DatalakeArrays:
+        """Retrieves the data of the traces as arrays decoded straight from
+        the responses, without models.
+
+        Parameters
+        ----------
+        with_keys: bool whether to return the (asset, attribute) code of
+            each point.
+        max_concurrency: int | None maximum number of batches requested at
+            the same time, defaults to DL_READ_CONCURRENCY.
+        """
+        responses = self._fetch(max_concurrency)
+        rows = [row for response in responses for row in response["results"]]
+        keys = None
+        if with_keys:
+            keys = [
+                (trace.address["asset"], trace.address["attribute"])
+                for trace in self.traces
+            ]
+        return decode_wide_rows(
+            rows,
+            [trace.ref_id for trace in self.traces],
+            value_dtype(self.__orig_class__.__args__[0]),
+            keys,
+        )
+
+    def apply_records(
+        self, max_concurrency: int | None = None
+    ) -> list[dict[str, Any]]:
+        """Retrieves the data of the traces as rows with the timestamp,
+        value, asset and attribute of each point, without models.
+        """
+        return [
+            row
+            for response in self._fetch(max_concurrency)
+            for row in self._to_rows(response["results"])
+        ]
+
+    def _fetch(self, max_concurrency: int | None) -> list[dict]:
         dl_client = get_datalake_client()
-        request = self.model_dump(mode="json")
-        traces = request.pop("traces")
-        data = []
-        for batch in chunk_list(traces, MAX_NUM_TRACES):
-            request["traces"] = batch
-            response = dl_client.get(request)
-            data.extend(self._parse_respose(response["results"]))
-        return data
+        disk_cache = self._disk_cache()
+
+        def get(request: dict) -> dict:
+            if disk_cache is None:
+                return batched_read(_TRACE_MERGER, request, dl_client.get)
+            response = self._from_disk(disk_cache, request)
+            if response is None:
+                response = batched_read(_TRACE_MERGER, request, dl_client.get)
+                self._to_disk(disk_cache, request, response["results"])
+            return response
+
+        return map_concurrently(
+            get,
+            self._batch_requests(),
+            max_workers=max_concurrency
+            or datalake_settings.DL_READ_CONCURRENCY,
+        )
+
+    async def _async_fetch(self, max_concurrency: int | None) -> list[dict]:
+        dl_client = get_datalake_client()
+        disk_cache = self._disk_cache()
+
+        async def get(request: dict) -> dict:
+            if disk_cache is None:
+                return await async_batched_read(
+                    _TRACE_MERGER, request, dl_client.async_get
+                )
+            response = self._from_disk(disk_cache, request)
+            if response is None:
+                response = await async_batched_read(
+                    _TRACE_MERGER, request, dl_client.async_get
+                )
+                self._to_disk(disk_cache, request, response["results"])
+            return response
+
+        return await async_map_concurrently(
+            get,
+            self._batch_requests(),
+            max_workers=max_concurrency
+            or datalake_settings.DL_READ_CONCURRENCY,
+        )
+
+    def _disk_cache(self) -> DatalakeDiskCache | None:
+        # Only closed ranges sorted by timestamp that ended before the
+        # settled horizon
+        disk_cache = get_disk_cache()
+        if (
+            disk_cache is None
+            or self.sort_field != "timestamp"
+            or self.from_timestamp is None
+            or self.to_timestamp is None
+            or not disk_cache.is_settled(self.to_timestamp)
+        ):
+            return None
+        return disk_cache
+
+    def _from_disk(
+        self, disk_cache: DatalakeDiskCache, request: dict
+    ) -> dict | None:
+        arrays = disk_cache.get(
+            _disk_cache_key(request), self.from_timestamp, self.to_timestamp
+        )
+        if arrays is None:
+            return None
+        refs = [ref for (ref,) in arrays.keys]
+        rows: dict[str, dict] = {}
+        for timestamp, code, value in zip(
+            format_timestamps(arrays.timestamp),
+            arrays.key.tolist(),
+            arrays.value.tolist(),
+        ):
+            rows.setdefault(timestamp, {"timestamp": timestamp})[
+                refs[code]
+            ] = value
+        results = list(rows.values())
+        if self.sort_direction == -1:
+            results.reverse()
+        return {"results": results[: self.limit]}
+
+    def _to_disk(
+        self, disk_cache: DatalakeDiskCache, request: dict, rows: list[dict]
+    ) -> None:
+        # Responses that hit the limit do not have the whole range
+        if len(rows) >= self.limit:
+            return
+        refs = [trace["ref_id"] for trace in request["traces"]]
+        arrays = decode_wide_rows(
+            rows, refs, np.dtype(object), [(ref,) for ref in refs]
+        )
+        disk_cache.put(
+            _disk_cache_key(request),
+            self.from_timestamp,
+            self.to_timestamp,
+            arrays,
+        )
+
+    def _wide_frame(self, responses: list[dict]) -> pd.DataFrame:
+        model_class = self.__orig_class__.__args__[0]
+        value = model_class.model_fields.get("value")
+        dtype = float if value and value.annotation in (float, int) else object
+        frames = [
+            wide_frame(
+                response["results"],
+                [trace.ref_id for trace in batch],
+                dtype,
+            )
+            for batch, response in zip(
+                chunk_list(self.traces, MAX_NUM_TRACES), responses
+            )
+        ]
+        if not frames:
+            return pd.DataFrame()
+        frame = frames[0] if len(frames) == 1 else pd.concat(frames, axis=1)
+        frame.columns = address_columns(
+            [
+                (trace.address["asset"], trace.address["attribute"])
+                for trace in self.traces
+            ]
+        )
+        return frame.sort_index(ascending=self.sort_direction == 1)
 
-    async def async_apply(self) -> list[T]:
+    def iter_apply(self) -> Iterator[list[dict]]:
+        """Pages through the data of the traces with a timestamp cursor,
+        requesting the next page while the current one is processed.
+
+        Returns
+        -------
+        Iterator with pages of rows with the timestamp, value, asset and
+        attribute of each point.
+        """
+        dl_client = get_datalake_client()
+        for page in iter_pages(
+            lambda bound: dl_client.get(self._cursor_request(bound))[
+                "results"
+            ],
+            limit=self.limit,
+            descending=self.sort_direction == -1,
+            row_key=itemgetter("timestamp"),
+        ):
+            yield self._to_rows(page)
+
+    async def aiter_apply(self) -> AsyncIterator[list[dict]]:
+        """Async version of iter_apply."""
         dl_client = get_datalake_client()
+
+        async def fetch(bound: datetime | None) -> list[dict]:
+            response = await dl_client.async_get(self._cursor_request(bound))
+            return response["results"]
+
+        async for page in aiter_pages(
+            fetch,
+            limit=self.limit,
+            descending=self.sort_direction == -1,
+            row_key=itemgetter("timestamp"),
+        ):
+            yield self._to_rows(page)
+
+    def _cursor_request(self, bound: datetime | None) -> dict[str, Any]:
+        if self.sort_field != "timestamp":
+            raise ValueError("Cursor reads must be sorted by timestamp")
+        if len(self.traces) > MAX_NUM_TRACES:
+            raise ValueError(
+                f"Cursor reads support up to {MAX_NUM_TRACES} traces"
+            )
+        update = {}
+        if bound is not None and self.sort_direction == -1:
+            update["to_timestamp"] = bound
+        elif bound is not None:
+            update["from_timestamp"] = bound
+        return self.model_copy(update=update).model_dump(mode="json")
+
+    def _to_rows(self, response: list[dict]) -> list[dict]:
+        return [
+            {
+                "timestamp": item["timestamp"],
+                "value": value,
+                **self._traces_ref[key],
+            }
+            for item in response
+            for key, value in item.items()
+            if key != "timestamp" and value is not None
+        ]
+
+    def _batch_requests(self) -> list[dict[str, Any]]:
         request = self.model_dump(mode="json")
         traces = request.pop("traces")
+        return [
+            {**request, "traces": batch}
+            for batch in chunk_list(traces, MAX_NUM_TRACES)
+        ]
+
+    def _merge_responses(self, responses: list[dict]) -> list[T]:
         data = []
-        for batch in chunk_list(traces, MAX_NUM_TRACES):
-            request["traces"] = batch
-            response = await dl_client.async_get(request)
+        for response in responses:
             data.extend(self._parse_respose(response["results"]))
         return data
 
@@ -172,6 +502,79 @@ class DataRecords(BaseModel):
         await dl_client.async_save(self.model_dump(mode="json"))
 
 
+def _disk_cache_key(request: dict) -> dict:
+    # The range and the page size are not part of the key
+    return {
+        key: value
+        for key, value in request.items()
+        if key
+        not in ("from_timestamp", "to_timestamp", "limit", "max_time_ms")
+    }
+
+
+def _merged_ref_id(trace: dict) -> str:
+    # Equal traces share a ref_id in merged requests, whatever their ref_id
+    return hash(
+        json.dumps(
+            {key: value for key, value in trace.items() if key != "ref_id"},
+            sort_keys=True,
+        )
+    )
+
+
+class _TraceMerger(ReadMerger):
+    """Merges the traces of read requests with the same collection, range
+    and sort.
+    """
+
+    max_keys = MAX_NUM_TRACES
+
+    def group_key(self, request: dict) -> str:
+        return json.dumps(
+            {
+                key: value
+                for key, value in request.items()
+                if key not in ("traces", "limit")
+            },
+            sort_keys=True,
+            default=str,
+        )
+
+    def size(self, request: dict) -> int:
+        return len(request["traces"])
+
+    def merge(self, requests: list[dict]) -> dict:
+        traces: dict[str, dict] = {}
+        for request in requests:
+            for trace in request["traces"]:
+                ref_id = _merged_ref_id(trace)
+                traces.setdefault(ref_id, {**trace, "ref_id": ref_id})
+        return {
+            **requests[0],
+            "traces": list(traces.values()),
+            "limit": self.merged_limit(requests),
+        }
+
+    def split(self, request: dict, merged: dict, response: dict) -> dict:
+        refs = [
+            (_merged_ref_id(trace), trace["ref_id"])
+            for trace in request["traces"]
+        ]
+        rows = []
+        for row in response["results"]:
+            values = {
+                ref_id: row[merged_ref_id]
+                for merged_ref_id, ref_id in refs
+                if row.get(merged_ref_id) is not None
+            }
+            if values:
+                rows.append({"timestamp": row["timestamp"], **values})
+        return {**response, "results": rows[: request["limit"]]}
+
+
+_TRACE_MERGER = _TraceMerger()
+
+
 def chunk_list(
     datas: list[Any], chunksize: int
 ) -> Generator[list[Any], None, None]:
@@ -1,10 +1,27 @@
 from datetime import datetime, timezone
-from typing import Any, ClassVar, Dict, TypeVar
+from typing import (
+    Any,
+    AsyncIterator,
+    ClassVar,
+    Dict,
+    Iterator,
+    Sequence,
+    TypeVar,
+)
 
 import pandas as pd
 from pydantic import BaseModel, ConfigDict, Field
 from typing_extensions import Self
 
+from splight_lib.client.datalake.common.arrays import DatalakeArrays
+from splight_lib.client.datalake.common.cursor import ReadFormat, format_rows
+from splight_lib.client.datalake.common.frames import parse_timestamps
+from splight_lib.client.datalake.common.ingestion import (
+    ProgressCallback,
+    format_timestamps,
+    iter_records,
+    upload_chunks,
+)
 from splight_lib.models._v3.asset import Asset
 from splight_lib.models._v3.attribute import Attribute
 from splight_lib.models._v3.datalake import (
@@ -12,7 +29,9 @@ from splight_lib.models._v3.datalake import (
     DataRequest,
     PipelineStep,
     Trace,
+    get_datalake_client,
 )
+from splight_lib.settings import datalake_settings
 
 
 class SplightDatalakeBaseModel(BaseModel):
@@ -50,6 +69,51 @@ class SplightDatalakeBaseModel(BaseModel):
         instances = await request.async_apply()
         return instances
 
+    @classmethod
+    def iter_get(
+        cls,
+        asset: str | Asset,
+        attribute: str | Attribute,
+        extra_pipeline: list[dict[str, Any]] = [],
+        output: ReadFormat = ReadFormat.MODELS,
+        **params: Dict,
+    ) -> Iterator[list[Self] | list[dict] | dict]:
+        """Iterates over the data in pages of limit points, following the
+        timestamps with a cursor instead of loading the whole range, so the
+        memory used does not depend on its length. The next page is
+        requested while the current one is processed.
+
+        Parameters
+        ----------
+        asset: str | Asset the asset of the data.
+        attribute: str | Attribute the attribute of the data.
+        extra_pipeline: List[Dict] extra steps of the query pipeline.
+        output: ReadFormat whether the pages are lists of models, lists of
+            dicts or dicts of numpy arrays.
+        **params: the parameters of get, like from_timestamp and limit.
+        """
+        request = _to_data_request(
+            cls, asset, attribute, extra_pipeline, **params
+        )
+        for rows in request.iter_apply():
+            yield format_rows(rows, output, cls)
+
+    @classmethod
+    async def aiter_get(
+        cls,
+        asset: str | Asset,
+        attribute: str | Attribute,
+        extra_pipeline: list[dict[str, Any]] = [],
+        output: ReadFormat = ReadFormat.MODELS,
+        **params: Dict,
+    ) -> AsyncIterator[list[Self] | list[dict] | dict]:
+        """Async version of iter_get."""
+        request = _to_data_request(
+            cls, asset, attribute, extra_pipeline, **params
+        )
+        async for rows in request.aiter_apply():
+            yield format_rows(rows, output, cls)
+
     @classmethod
     def get_dataframe(
         cls,
@@ -61,13 +125,73 @@ class SplightDatalakeBaseModel(BaseModel):
         request = _to_data_request(
             cls, asset, attribute, extra_pipeline, **params
         )
-        instances = request.apply()
-        df = pd.DataFrame([instance.model_dump() for instance in instances])
-        if not df.empty:
-            df.index = df["timestamp"]
-            df.drop(columns="timestamp", inplace=True)
+        df = pd.DataFrame(request.apply_records())
+        if df.empty:
+            return df
+        df.index = parse_timestamps(df.pop("timestamp").tolist())
+        # Same columns as the dump of the models, without building them
+        for name, field in cls.model_fields.items():
+            if name not in df.columns and name != "timestamp":
+                df[name] = field.get_default(call_default_factory=True)
+        df = df[[name for name in cls.model_fields if name != "timestamp"]]
+        value = cls.model_fields.get("value")
+        if value and value.annotation is float:
+            df["value"] = df["value"].astype(float)
         return df
 
+    @classmethod
+    def get_arrays(
+        cls,
+        asset: str | Asset,
+        attribute: str | Attribute,
+        extra_pipeline: list[dict[str, Any]] = [],
+        **params: Dict,
+    ) -> DatalakeArrays:
+        """Returns the data as a datetime64[ns] timestamp array and a typed
+        value array, decoded from the response without models. Use
+        DatalakeArrays.to_series to get a Series sharing the arrays.
+
+        Parameters
+        ----------
+        asset: str | Asset the asset of the data.
+        attribute: str | Attribute the attribute of the data.
+        extra_pipeline: List[Dict] extra steps of the query pipeline.
+        **params: the parameters of get, like from_timestamp and limit.
+        """
+        request = _to_data_request(
+            cls, asset, attribute, extra_pipeline, **params
+        )
+        return request.apply_arrays()
+
+    @classmethod
+    def get_wide_dataframe(
+        cls,
+        addresses: Sequence[tuple[str | Asset, str | Attribute]],
+        extra_pipeline: list[dict[str, Any]] = [],
+        **params: Dict,
+    ) -> pd.DataFrame:
+        """Returns the data of many attributes as a DataFrame indexed by
+        timestamp with one column per attribute. The columns have asset and
+        attribute levels and the DataFrame is built from the responses
+        without models.
+
+        Parameters
+        ----------
+        addresses: Sequence of (asset, attribute) pairs.
+        extra_pipeline: List[Dict] extra steps of the query pipeline of each
+            attribute.
+        **params: the parameters of get, like from_timestamp and limit.
+        """
+        request = _to_data_request(
+            cls, addresses[0][0], addresses[0][1], extra_pipeline, **params
+        )
+        for asset, attribute in addresses[1:]:
+            trace = Trace.from_address(asset, attribute)
+            for step in extra_pipeline:
+                trace.add_step(PipelineStep.from_dict(step))
+            request.add_trace(trace)
+        return request.apply_dataframe()
+
     def save(self) -> None:
         records = self._to_record()
         records.apply()
@@ -77,14 +201,41 @@ class SplightDatalakeBaseModel(BaseModel):
         await records.async_apply()
 
     @classmethod
-    def save_dataframe(cls, df: pd.DataFrame):
+    def save_dataframe(
+        cls,
+        df: pd.DataFrame,
+        chunk_size: int | None = None,
+        max_workers: int | None = None,
+        progress: ProgressCallback | None = None,
+    ):
+        """Saves the rows of a DataFrame. The rows are sent in chunks with
+        concurrent requests that bypass the client buffer, the DataFrame
+        is not modified.
+
+        Parameters
+        ----------
+        df: pd.DataFrame the rows to save, with a timestamp column. Naive
+            timestamps are taken as UTC.
+        chunk_size: int | None number of rows per request, defaults to
+            DL_INGEST_CHUNK_SIZE.
+        max_workers: int | None maximum number of concurrent requests,
+            defaults to DL_INGEST_MAX_WORKERS.
+        progress: Callable | None called with the number of rows sent so
+            far and the total number of rows after each chunk.
+        """
         df = _fix_dataframe_timestamp(df)
-        instances = df.to_dict("records")
-        records = DataRecords(
-            collection=cls._collection_name,
-            records=instances,
+        client = get_datalake_client()
+        upload_chunks(
+            iter_records(
+                df, chunk_size or datalake_settings.DL_INGEST_CHUNK_SIZE
+            ),
+            lambda chunk: client.write(
+                {"collection": cls._collection_name, "records": chunk}
+            ),
+            total=len(df),
+            max_workers=max_workers or datalake_settings.DL_INGEST_MAX_WORKERS,
+            progress=progress,
         )
-        records.apply()
 
     def dict(self, *args, **kwargs) -> Dict:
         d = super().model_dump(*args, **kwargs)
@@ -126,12 +277,4 @@ def _to_data_request(
 
 
 def _fix_dataframe_timestamp(df: pd.DataFrame) -> pd.DataFrame:
-    if df["timestamp"][0].tz is None:
-        df["timestamp"] = df["timestamp"].apply(
-            lambda x: x.tz_localize(tz="UTC").strftime("%Y-%m-%dT%H:%M:%S.%fZ")
-        )
-    else:
-        df["timestamp"] = df["timestamp"].apply(
-            lambda x: x.tz_convert(tz="UTC").strftime("%Y-%m-%dT%H:%M:%S.%fZ")
-        )
-    return df
+    return df.assign(timestamp=format_timestamps(df["timestamp"]))
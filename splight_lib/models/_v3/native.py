@@ -1,12 +1,14 @@
 from datetime import datetime, timedelta, timezone
-from typing import ClassVar, Literal
+from typing import ClassVar, Literal, Sequence
 
 import pandas as pd
 from pydantic import field_validator
 from typing_extensions import Self
 
+from splight_lib.client.datalake.v3.constants import StepName
 from splight_lib.models._v3.asset import Asset
 from splight_lib.models._v3.attribute import Attribute
+from splight_lib.models._v3.datalake import DataRequest, PipelineStep, Trace
 from splight_lib.models._v3.datalake_base import SplightDatalakeBaseModel
 
 
@@ -61,6 +63,72 @@ class NativeOutput(SplightDatalakeBaseModel):
             return result[0]
         return None
 
+    @classmethod
+    def latest_many(
+        cls,
+        addresses: Sequence[tuple[str | Asset, str | Attribute]],
+        expiration: timedelta | None = None,
+    ) -> dict[tuple[str, str], Self]:
+        """Returns the last value of many attributes. Each trace keeps only
+        its last document, the traces are requested in concurrent batches
+        of MAX_NUM_TRACES.
+
+        Parameters
+        ----------
+        addresses: Sequence of (asset, attribute) pairs.
+        expiration: timedelta | None how old the values can be.
+
+        Returns
+        -------
+        Dict with the values by (asset id, attribute id), addresses without
+        values are missing.
+        """
+        request = cls._to_latest_request(addresses, expiration)
+        return cls._latest_by_address(request.apply())
+
+    @classmethod
+    async def async_latest_many(
+        cls,
+        addresses: Sequence[tuple[str | Asset, str | Attribute]],
+        expiration: timedelta | None = None,
+    ) -> dict[tuple[str, str], Self]:
+        """Async version of latest_many."""
+        request = cls._to_latest_request(addresses, expiration)
+        return cls._latest_by_address(await request.async_apply())
+
+    @classmethod
+    def _to_latest_request(
+        cls,
+        addresses: Sequence[tuple[str | Asset, str | Attribute]],
+        expiration: timedelta | None,
+    ) -> DataRequest:
+        from_timestamp = None
+        if expiration:
+            from_timestamp = datetime.now(timezone.utc) - expiration
+        request = DataRequest[cls](
+            collection=cls._collection_name, from_timestamp=from_timestamp
+        )
+        traces = {}
+        for asset, attribute in addresses:
+            trace = Trace.from_address(asset, attribute)
+            traces.setdefault(trace.ref_id, trace)
+        for trace in traces.values():
+            trace.add_step(
+                PipelineStep(name=StepName.SORT, operation={"timestamp": -1})
+            )
+            trace.add_step(PipelineStep(name=StepName.LIMIT, operation=1))
+            request.add_trace(trace)
+        return request
+
+    @staticmethod
+    def _latest_by_address(instances: list[Self]) -> dict[tuple, Self]:
+        latest = {}
+        for instance in instances:
+            key = (instance.asset, instance.attribute)
+            if key not in latest or instance.timestamp > latest[key].timestamp:
+                latest[key] = instance
+        return latest
+
 
 class Number(NativeOutput):
     value: float
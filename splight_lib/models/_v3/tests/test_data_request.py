@@ -0,0 +1,69 @@
+import asyncio
+
+import numpy as np
+import pandas as pd
+from pytest_mock import MockerFixture
+
+from splight_lib.client.datalake import batch_reads
+from splight_lib.models._v3 import datalake
+from splight_lib.models._v3.native import Number
+
+
+def _get(request: dict) -> dict:
+    refs = [trace["ref_id"] for trace in request["traces"]]
+    return {
+        "results": [
+            {
+                "timestamp": f"2024-01-01T00:00:0{second}Z",
+                **{
+                    ref: None if (second, position) == (1, 0) else second
+                    for position, ref in enumerate(refs)
+                },
+            }
+            for second in range(3)
+        ]
+    }
+
+
+def test_get_wide_dataframe_without_models(mocker: MockerFixture):
+    client = mocker.MagicMock()
+    client.get.side_effect = _get
+    mocker.patch.object(datalake, "get_datalake_client", return_value=client)
+    mocker.patch.object(datalake, "MAX_NUM_TRACES", 2)
+    mocker.patch.object(
+        Number, "__init__", side_effect=AssertionError("no models")
+    )
+
+    df = Number.get_wide_dataframe([("a1", "x"), ("a1", "y"), ("a2", "x")])
+
+    assert client.get.call_count == 2
+    assert df.shape == (3, 3)
+    assert df.index.is_monotonic_decreasing
+    assert isinstance(df.columns.levels[0], pd.CategoricalIndex)
+    assert df[("a1", "y")].tolist() == [2.0, 1.0, 0.0]
+    assert np.isnan(df.loc["2024-01-01T00:00:01Z", ("a1", "x")])
+    assert np.isnan(df.loc["2024-01-01T00:00:01Z", ("a2", "x")])
+
+
+def test_batch_reads_merges_traces(mocker: MockerFixture):
+    client = mocker.MagicMock()
+    client.async_get = mocker.AsyncMock(side_effect=_get)
+    mocker.patch.object(datalake, "get_datalake_client", return_value=client)
+
+    async def read() -> list[list[Number]]:
+        with batch_reads(delay=0.05):
+            return await asyncio.gather(
+                Number.async_get("a1", "x"),
+                Number.async_get("a1", "y"),
+                Number.async_get("a1", "x"),
+            )
+
+    first, second, repeated = asyncio.run(read())
+
+    assert client.async_get.call_count == 1
+    assert len(client.async_get.call_args.args[0]["traces"]) == 2
+    assert {value.attribute for value in first} == {"x"}
+    assert {value.attribute for value in second} == {"y"}
+    assert [value.value for value in first] == [0.0, 2.0]
+    assert [value.value for value in repeated] == [0.0, 2.0]
+    assert [value.value for value in second] == [0.0, 1.0, 2.0]
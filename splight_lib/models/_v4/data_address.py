@@ -27,7 +27,8 @@ class DataAddresses(BaseModel):
         params["attribute"] = self.attribute
         return self._type_map[self.type].get_dataframe(**params)
 
-    def save_dataframe(self, dataframe: pd.DataFrame):
-        dataframe["asset"] = self.asset
-        dataframe["attribute"] = self.attribute
-        self._type_map[self.type].save_dataframe(dataframe)
+    def save_dataframe(self, dataframe: pd.DataFrame, **params):
+        dataframe = dataframe.assign(
+            asset=self.asset, attribute=self.attribute
+        )
+        self._type_map[self.type].save_dataframe(dataframe, **params)
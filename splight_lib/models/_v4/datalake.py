@@ -1,8 +1,32 @@
-from typing import Annotated, Literal
+import json
+from datetime import datetime, timezone
+from typing import Annotated, Any, AsyncIterator, Generator, Iterator, Literal
 
+import numpy as np
 from pydantic import BaseModel, Field
 
+from splight_lib.client.datalake.common.arrays import decode_rows
+from splight_lib.client.datalake.common.concurrency import (
+    async_map_concurrently,
+    map_concurrently,
+)
+from splight_lib.client.datalake.common.cursor import aiter_pages, iter_pages
+from splight_lib.client.datalake.common.disk_cache import (
+    DatalakeDiskCache,
+    get_disk_cache,
+)
+from splight_lib.client.datalake.common.ingestion import (
+    format_timestamps,
+    to_utc,
+)
+from splight_lib.client.datalake.common.read_batching import (
+    ReadMerger,
+    async_batched_read,
+    batched_read,
+)
+from splight_lib.client.datalake.common.read_cache import get_read_cache
 from splight_lib.client.datalake.v4.builder import get_datalake_client
+from splight_lib.client.datalake.v4.encoding import KEY_FIELDS
 from splight_lib.client.datalake.v4.generic import (
     AggregationFunction,
     Timestamp,
@@ -11,6 +35,24 @@ from splight_lib.client.datalake.v4.generic import (
     TransitionSort,
     Value,
 )
+from splight_lib.client.datalake.v4.partitioning import (
+    TIME_UNIT_SECONDS,
+    Window,
+    estimate_partitions,
+    remaining_window,
+    split_window,
+    stitch,
+)
+from splight_lib.logging._internal import LogTags, get_splight_logger
+from splight_lib.settings import datalake_settings
+
+logger = get_splight_logger()
+
+# Plan of a partitioned read, yields the requests of each round and
+# receives their results.
+ReadPlan = Generator[list[dict], list[list[dict]], list[dict]]
+# Maximum number of key entries of the requests merged by batch_reads
+MAX_BATCH_ENTRIES = 500
 
 
 class DefaultEntryKey(BaseModel):
@@ -53,6 +95,61 @@ QueryKeys = Annotated[
 ]
 
 
+class _EntryMerger(ReadMerger):
+    """Merges the key entries of read requests with the same window,
+    aggregation and sort.
+    """
+
+    max_keys = MAX_BATCH_ENTRIES
+
+    def group_key(self, request: dict) -> str:
+        window = {
+            key: value
+            for key, value in request.items()
+            if key not in ("keys", "limit")
+        }
+        return json.dumps(
+            [request["keys"]["schema_name"], window],
+            sort_keys=True,
+            default=str,
+        )
+
+    def size(self, request: dict) -> int:
+        return len(request["keys"]["entries"])
+
+    def merge(self, requests: list[dict]) -> dict:
+        entries: dict[tuple, dict] = {}
+        for request in requests:
+            for entry in request["keys"]["entries"]:
+                entries.setdefault(self._entry_key(request, entry), entry)
+        first = requests[0]
+        return {
+            **first,
+            "keys": {**first["keys"], "entries": list(entries.values())},
+            "limit": self.merged_limit(requests),
+        }
+
+    def split(self, request: dict, merged: dict, response: dict) -> dict:
+        wanted = {
+            self._entry_key(request, entry)
+            for entry in request["keys"]["entries"]
+        }
+        rows = [
+            row
+            for row in response["results"]
+            if self._entry_key(request, row) in wanted
+        ]
+        return {**response, "results": rows[: request["limit"]]}
+
+    @staticmethod
+    def _entry_key(request: dict, entry: dict) -> tuple:
+        schema_name = TransitionSchemaName(request["keys"]["schema_name"])
+        return tuple(entry.get(field) for field in KEY_FIELDS[schema_name])
+
+
+_ENTRY_MERGER = _EntryMerger()
+
+
 class DataReadRequest(BaseModel):
     keys: QueryKeys
     start: Timestamp | None = None
@@ -65,16 +162,292 @@ class DataReadRequest(BaseModel):
 
     def apply(self) -> dict:
         dl_client = get_datalake_client()
+        if self._cacheable():
+            return get_read_cache().read(
+                self._cache_key(),
+                self.start,
+                self.limit,
+                self.sort == TransitionSort.DESC,
+                self._row_key,
+                lambda tail_start: dl_client.get(
+                    self._tail_request(tail_start)
+                )["results"],
+            )
+        disk_cache = self._disk_cache()
+        if disk_cache is not None:
+            rows = self._from_disk(disk_cache)
+            if rows is not None:
+                return rows
         request = self.model_dump(mode="json")
-        response = dl_client.get(request)
+        response = batched_read(_ENTRY_MERGER, request, dl_client.get)
+        if disk_cache is not None:
+            self._to_disk(disk_cache, response["results"])
         return response["results"]
 
     async def async_apply(self) -> dict:
         dl_client = get_datalake_client()
+        if self._cacheable():
+
+            async def fetch(tail_start: datetime | None) -> list[dict]:
+                response = await dl_client.async_get(
+                    self._tail_request(tail_start)
+                )
+                return response["results"]
+
+            return await get_read_cache().async_read(
+                self._cache_key(),
+                self.start,
+                self.limit,
+                self.sort == TransitionSort.DESC,
+                self._row_key,
+                fetch,
+            )
+        disk_cache = self._disk_cache()
+        if disk_cache is not None:
+            rows = self._from_disk(disk_cache)
+            if rows is not None:
+                return rows
         request = self.model_dump(mode="json")
-        response = await dl_client.async_get(request)
+        response = await async_batched_read(
+            _ENTRY_MERGER, request, dl_client.async_get
+        )
+        if disk_cache is not None:
+            self._to_disk(disk_cache, response["results"])
         return response["results"]
 
+    def apply_partitioned(self, max_concurrency: int | None = None) -> list:
+        """Retrieves all the data between start and end, not only the first
+        page of limit results. The rest of the range not covered by a first
+        page is split into windows sized from its point density, which are
+        requested concurrently. The rest of the windows that hit the limit
+        is split again until they do not, a single aggregation window with
+        more than limit points is truncated with a warning.
+
+        Parameters
+        ----------
+        max_concurrency: int | None maximum number of requests at the same
+            time, defaults to DL_READ_CONCURRENCY.
+
+        Returns
+        -------
+        List with the results of all the windows in sort order.
+        """
+        dl_client = get_datalake_client()
+        plan = self._read_plan()
+        requests = next(plan)
+        try:
+            while True:
+                responses = map_concurrently(
+                    dl_client.get,
+                    requests,
+                    max_workers=max_concurrency
+                    or datalake_settings.DL_READ_CONCURRENCY,
+                )
+                requests = plan.send(
+                    [response["results"] for response in responses]
+                )
+        except StopIteration as stop:
+            return stop.value
+
+    async def async_apply_partitioned(
+        self, max_concurrency: int | None = None
+    ) -> list:
+        """Async version of apply_partitioned.
+
+        Parameters
+        ----------
+        max_concurrency: int | None maximum number of requests at the same
+            time, defaults to DL_READ_CONCURRENCY.
+
+        Returns
+        -------
+        List with the results of all the windows in sort order.
+        """
+        dl_client = get_datalake_client()
+        plan = self._read_plan()
+        requests = next(plan)
+        try:
+            while True:
+                responses = await async_map_concurrently(
+                    dl_client.async_get,
+                    requests,
+                    max_workers=max_concurrency
+                    or datalake_settings.DL_READ_CONCURRENCY,
+                )
+                requests = plan.send(
+                    [response["results"] for response in responses]
+                )
+        except StopIteration as stop:
+            return stop.value
+
+    def iter_apply(self) -> Iterator[list[dict]]:
+        """Pages through all the data between start and end with a timestamp
+        cursor, requesting the next page while the current one is processed.
+
+        Returns
+        -------
+        Iterator with the results of each page.
+        """
+        dl_client = get_datalake_client()
+        yield from iter_pages(
+            lambda bound: dl_client.get(self._cursor_request(bound))[
+                "results"
+            ],
+            limit=self.limit,
+            descending=self.sort == TransitionSort.DESC,
+            row_key=self._row_key,
+        )
+
+    async def aiter_apply(self) -> AsyncIterator[list[dict]]:
+        """Async version of iter_apply."""
+        dl_client = get_datalake_client()
+
+        async def fetch(bound: datetime | None) -> list[dict]:
+            response = await dl_client.async_get(self._cursor_request(bound))
+            return response["results"]
+
+        async for page in aiter_pages(
+            fetch,
+            limit=self.limit,
+            descending=self.sort == TransitionSort.DESC,
+            row_key=self._row_key,
+        ):
+            yield page
+
+    def _cursor_request(self, bound: datetime | None) -> dict[str, Any]:
+        if bound is None:
+            return self.model_dump(mode="json")
+        if self.sort == TransitionSort.DESC:
+            return self._window_request(self.start, bound)
+        return self._window_request(bound, self.end)
+
+    def _disk_cache(self) -> DatalakeDiskCache | None:
+        # Only closed ranges that ended before the settled horizon
+        disk_cache = get_disk_cache()
+        if (
+            disk_cache is None
+            or self.start is None
+            or self.end is None
+            or not disk_cache.is_settled(self.end)
+        ):
+            return None
+        return disk_cache
+
+    def _from_disk(self, disk_cache: DatalakeDiskCache) -> list[dict] | None:
+        arrays = disk_cache.get(self._cache_key(), self.start, self.end)
+        if arrays is None:
+            return None
+        step = -1 if self.sort == TransitionSort.DESC else 1
+        points = slice(None, None, step)
+        timestamps = format_timestamps(arrays.timestamp[points][: self.limit])
+        values = arrays.value[points][: self.limit].tolist()
+        codes = arrays.key[points][: self.limit].tolist()
+        fields = KEY_FIELDS[self.keys.schema_name]
+        keys = [dict(zip(fields, key)) for key in arrays.keys]
+        return [
+            {**keys[code], "timestamp": timestamp, "value": value}
+            for timestamp, value, code in zip(timestamps, values, codes)
+        ]
+
+    def _to_disk(
+        self, disk_cache: DatalakeDiskCache, rows: list[dict]
+    ) -> None:
+        # Responses that hit the limit do not have the whole range
+        if len(rows) >= self.limit:
+            return
+        arrays = decode_rows(
+            rows, np.dtype(object), KEY_FIELDS[self.keys.schema_name]
+        )
+        disk_cache.put(self._cache_key(), self.start, self.end, arrays)
+
+    def _cacheable(self) -> bool:
+        # Only sliding windows, the ones that end now, are cached
+        return (
+            datalake_settings.DL_READ_CACHE
+            and self.start is not None
+            and self.end is None
+        )
+
+    def _cache_key(self) -> tuple:
+        return (
+            self.keys.schema_name,
+            tuple(
+                tuple(entry.model_dump().values())
+                for entry in self.keys.entries
+            ),
+            self.aggregation,
+            self.time_window_unit,
+            self.time_window_size,
+        )
+
+    def _tail_request(self, tail_start: datetime | None) -> dict[str, Any]:
+        if tail_start is None:
+            return self.model_dump(mode="json")
+        return self._window_request(tail_start, None)
+
+    def _row_key(self, row: dict) -> tuple:
+        fields = KEY_FIELDS[self.keys.schema_name]
+        return (*(row.get(field) for field in fields), row["timestamp"])
+
+    def _read_plan(self) -> ReadPlan:
+        if self.start is None:
+            raise ValueError("A start is required for partitioned reads")
+        start = to_utc(self.start)
+        end = to_utc(self.end or datetime.now(timezone.utc))
+        bucket = (
+            TIME_UNIT_SECONDS[self.time_window_unit] * self.time_window_size
+        )
+        key_fields = KEY_FIELDS[self.keys.schema_name]
+        # The first page gives the point density, if it is not full it
+        # already has all the data.
+        (page,) = yield [self._window_request(start, end)]
+        if len(page) < self.limit:
+            return page
+        # Full pages are kept and only the rest of their window is
+        # requested again, the rows repeated at the bounds are stitched.
+        pages = [page]
+        rest = self._rest_of(page, (start, end), bucket)
+        windows = []
+        if rest is not None:
+            parts = estimate_partitions(page, *rest, self.limit)
+            windows = split_window(*rest, parts, bucket)
+        while windows:
+            results = yield [
+                self._window_request(*window) for window in windows
+            ]
+            pending = []
+            for window, page in zip(windows, results):
+                pages.append(page)
+                if len(page) < self.limit:
+                    continue
+                rest = self._rest_of(page, window, bucket)
+                if rest is not None:
+                    pending.extend(split_window(*rest, 2, bucket))
+            windows = pending
+        return stitch(pages, key_fields, self.sort)
+
+    def _rest_of(
+        self, page: list[dict], window: Window, bucket: float
+    ) -> Window | None:
+        rest = remaining_window(
+            page, window, bucket, self.sort == TransitionSort.DESC
+        )
+        if rest is None:
+            logger.warning(
+                "More than %s points between %s and %s in a single "
+                "aggregation window, the read is truncated",
+                self.limit,
+                *window,
+                tags=LogTags.DATALAKE,
+            )
+        return rest
+
+    def _window_request(
+        self, start: datetime, end: datetime
+    ) -> dict[str, Any]:
+        window = self.model_copy(update={"start": start, "end": end})
+        return window.model_dump(mode="json")
+
 
 class DefaultDataPoint(DefaultEntryKey):
     value: Value
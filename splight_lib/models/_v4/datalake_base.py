@@ -1,10 +1,33 @@
-from datetime import datetime, timezone
-from typing import ClassVar, Dict
+from datetime import datetime, timedelta, timezone
+from typing import Any, AsyncIterator, ClassVar, Dict, Iterator, Sequence
 
+import numpy as np
 import pandas as pd
 from pydantic import BaseModel, ConfigDict, Field
 from typing_extensions import Self
 
+from splight_lib.client.datalake.common.arrays import (
+    DatalakeArrays,
+    decode_rows,
+    value_dtype,
+)
+from splight_lib.client.datalake.common.concurrency import (
+    async_map_concurrently,
+    map_concurrently,
+)
+from splight_lib.client.datalake.common.cursor import ReadFormat, format_rows
+from splight_lib.client.datalake.common.ingestion import (
+    ProgressCallback,
+    format_timestamps,
+    iter_records,
+    upload_chunks,
+)
+from splight_lib.client.datalake.v4.builder import get_datalake_client
+from splight_lib.client.datalake.v4.encoding import KEY_FIELDS
+from splight_lib.client.datalake.v4.generic import (
+    TransitionSchemaName,
+    TransitionSort,
+)
 from splight_lib.models._v4.datalake import (
     DataReadRequest,
     DataWriteRequest,
@@ -13,6 +36,21 @@ from splight_lib.models._v4.datalake import (
     SolutionKeys,
     SolutionRecords,
 )
+from splight_lib.settings import datalake_settings
+
+# Number of keys read by each request of latest_many
+LATEST_MANY_CHUNK_SIZE = 100
+# Rows requested per key by latest_many, so a few keys with points newer
+# than the last point of the others rarely fill the page
+LATEST_MANY_ROWS_PER_KEY = 10
+# Kinds of values, as inferred by pandas, accepted by save_dataframe
+DATAFRAME_VALUE_TYPES = {
+    "boolean",
+    "floating",
+    "integer",
+    "mixed-integer-float",
+    "string",
+}
 
 
 class SplightDatalakeBaseModel(BaseModel):
@@ -47,6 +85,43 @@ class SplightDatalakeBaseModel(BaseModel):
         )
         return await request.async_apply()
 
+    @classmethod
+    def _get_arrays(
+        cls,
+        key_entries: list[dict[str, str]],
+        with_keys: bool = False,
+        **params: dict,
+    ) -> DatalakeArrays:
+        request = cls.__to_read_request(key_entries, **params)
+        key_fields = KEY_FIELDS[TransitionSchemaName(cls._schema_name)]
+        return decode_rows(
+            request.apply(),
+            value_dtype(cls),
+            key_fields if with_keys else None,
+        )
+
+    @classmethod
+    def _iter_get(
+        cls,
+        key_entries: list[dict[str, str]],
+        output: ReadFormat = ReadFormat.MODELS,
+        **params: dict,
+    ) -> Iterator[list[Self] | list[dict] | dict]:
+        request = cls.__to_read_request(key_entries, **params)
+        for rows in request.iter_apply():
+            yield format_rows(rows, output, cls)
+
+    @classmethod
+    async def _aiter_get(
+        cls,
+        key_entries: list[dict[str, str]],
+        output: ReadFormat = ReadFormat.MODELS,
+        **params: dict,
+    ) -> AsyncIterator[list[Self] | list[dict] | dict]:
+        request = cls.__to_read_request(key_entries, **params)
+        async for rows in request.aiter_apply():
+            yield format_rows(rows, output, cls)
+
     @classmethod
     def _get_dataframe(
         cls,
@@ -64,6 +139,115 @@ class SplightDatalakeBaseModel(BaseModel):
             df.drop(columns="timestamp", inplace=True)
         return df
 
+    @classmethod
+    def _latest_many(
+        cls, key_entries: list[dict[str, str]], expiration: timedelta | None
+    ) -> dict[tuple, Self]:
+        start = cls.__expiration_start(expiration)
+        results = map_concurrently(
+            lambda chunk: cls.__read_latest(chunk, start),
+            cls.__latest_chunks(key_entries),
+            max_workers=datalake_settings.DL_READ_CONCURRENCY,
+        )
+        return cls.__latest_models(results)
+
+    @classmethod
+    async def _async_latest_many(
+        cls, key_entries: list[dict[str, str]], expiration: timedelta | None
+    ) -> dict[tuple, Self]:
+        start = cls.__expiration_start(expiration)
+        results = await async_map_concurrently(
+            lambda chunk: cls.__async_read_latest(chunk, start),
+            cls.__latest_chunks(key_entries),
+            max_workers=datalake_settings.DL_READ_CONCURRENCY,
+        )
+        return cls.__latest_models(results)
+
+    @classmethod
+    def __read_latest(
+        cls, entries: list[dict[str, str]], start: datetime | None
+    ) -> dict[tuple, dict]:
+        # A descending read of many keys, keeping the first row of each.
+        # Keys whose points were pushed out of a full page by the points of
+        # other keys are read again, without the keys already found.
+        latest: dict[tuple, dict] = {}
+        while entries:
+            request = cls.__to_latest_request(entries, start)
+            rows = request.apply()
+            entries = cls.__add_latest(latest, entries, rows, request.limit)
+        return latest
+
+    @classmethod
+    async def __async_read_latest(
+        cls, entries: list[dict[str, str]], start: datetime | None
+    ) -> dict[tuple, dict]:
+        latest: dict[tuple, dict] = {}
+        while entries:
+            request = cls.__to_latest_request(entries, start)
+            rows = await request.async_apply()
+            entries = cls.__add_latest(latest, entries, rows, request.limit)
+        return latest
+
+    @classmethod
+    def __latest_chunks(
+        cls, key_entries: list[dict[str, str]]
+    ) -> list[list[dict[str, str]]]:
+        entries = list(
+            {tuple(entry.items()): entry for entry in key_entries}.values()
+        )
+        return [
+            entries[i : i + LATEST_MANY_CHUNK_SIZE]
+            for i in range(0, len(entries), LATEST_MANY_CHUNK_SIZE)
+        ]
+
+    @classmethod
+    def __to_latest_request(
+        cls, entries: list[dict[str, str]], start: datetime | None
+    ) -> DataReadRequest:
+        return cls.__to_read_request(
+            entries,
+            start=start,
+            sort=TransitionSort.DESC,
+            limit=LATEST_MANY_ROWS_PER_KEY * len(entries),
+        )
+
+    @classmethod
+    def __add_latest(
+        cls,
+        latest: dict[tuple, dict],
+        entries: list[dict[str, str]],
+        rows: list[dict],
+        limit: int,
+    ) -> list[dict[str, str]]:
+        # Adds the first row of each key and returns the entries that still
+        # have to be read, none if the page was not full.
+        fields = KEY_FIELDS[TransitionSchemaName(cls._schema_name)]
+        for row in rows:
+            latest.setdefault(tuple(row[field] for field in fields), row)
+        if len(rows) < limit:
+            return []
+        return [
+            entry
+            for entry in entries
+            if tuple(entry[field] for field in fields) not in latest
+        ]
+
+    @classmethod
+    def __latest_models(
+        cls, results: list[dict[tuple, dict]]
+    ) -> dict[tuple, Self]:
+        return {
+            key: cls.model_validate(row)
+            for latest in results
+            for key, row in latest.items()
+        }
+
+    @staticmethod
+    def __expiration_start(expiration: timedelta | None) -> datetime | None:
+        if not expiration:
+            return None
+        return datetime.now(timezone.utc) - expiration
+
     @classmethod
     def __to_read_request(
         cls,
@@ -103,11 +287,115 @@ class SplightDatalakeBaseModel(BaseModel):
         await request.async_apply()
 
     @classmethod
-    def save_dataframe(cls, df: pd.DataFrame):
-        df = _fix_dataframe_timestamp(df)
-        instances = df.to_dict("records")
-        request = cls.__to_write_request(data_points=instances)
-        request.apply()
+    def save_dataframe(
+        cls,
+        df: pd.DataFrame,
+        chunk_size: int | None = None,
+        max_workers: int | None = None,
+        progress: ProgressCallback | None = None,
+    ):
+        """Saves the rows of a DataFrame. The rows are sent in chunks with
+        concurrent requests that bypass the client buffer, the DataFrame
+        is not modified. The columns are validated as a whole before any
+        row is sent, columns other than the keys, timestamp and value are
+        ignored.
+
+        Parameters
+        ----------
+        df: pd.DataFrame the rows to save, with the key columns of the
+            schema, a timestamp and a value column. Naive timestamps are
+            taken as UTC.
+        chunk_size: int | None number of rows per request, defaults to
+            DL_INGEST_CHUNK_SIZE.
+        max_workers: int | None maximum number of concurrent requests,
+            defaults to DL_INGEST_MAX_WORKERS.
+        progress: Callable | None called with the number of rows sent so
+            far and the total number of rows after each chunk.
+
+        Raises
+        ------
+        ValueError if a column is missing, has missing values or values of
+        the wrong type.
+        """
+        schema_name = TransitionSchemaName(cls._schema_name)
+        keys = KEY_FIELDS[schema_name]
+        df = _validate_dataframe(
+            df, schema_name, [*keys, "timestamp", "value"]
+        )
+        try:
+            df = _fix_dataframe_timestamp(df)
+        except (TypeError, ValueError) as exc:
+            raise ValueError(f"Invalid timestamps: {exc}") from exc
+        client = get_datalake_client()
+        upload_chunks(
+            iter_records(
+                df, chunk_size or datalake_settings.DL_INGEST_CHUNK_SIZE
+            ),
+            lambda chunk: client.write(
+                {
+                    "records": {
+                        "schema_name": schema_name,
+                        "data_points": chunk,
+                    }
+                }
+            ),
+            total=len(df),
+            max_workers=max_workers or datalake_settings.DL_INGEST_MAX_WORKERS,
+            progress=progress,
+        )
+
+    @classmethod
+    def _to_bulk_request(
+        cls,
+        key: dict[str, str],
+        timestamps: Sequence[datetime] | np.ndarray,
+        values: Sequence[Any] | np.ndarray,
+        dtype: type | None = None,
+    ) -> dict:
+        # Builds the write request body from the arrays without creating a
+        # model for each data point.
+        timestamps = format_timestamps(timestamps)
+        values = np.asarray(values, dtype=dtype).tolist()
+        if len(timestamps) != len(values):
+            raise ValueError(
+                "timestamps and values must have the same length, got "
+                f"{len(timestamps)} and {len(values)}"
+            )
+        key = {
+            name: value.id if isinstance(value, BaseModel) else value
+            for name, value in key.items()
+        }
+        return {
+            "records": {
+                "schema_name": cls._schema_name,
+                "data_points": [
+                    {**key, "timestamp": timestamp, "value": value}
+                    for timestamp, value in zip(timestamps, values)
+                ],
+            }
+        }
+
+    @classmethod
+    def _save_many(
+        cls,
+        key: dict[str, str],
+        timestamps: Sequence[datetime] | np.ndarray,
+        values: Sequence[Any] | np.ndarray,
+        dtype: type | None = None,
+    ) -> None:
+        request = cls._to_bulk_request(key, timestamps, values, dtype)
+        get_datalake_client().save(request)
+
+    @classmethod
+    async def _async_save_many(
+        cls,
+        key: dict[str, str],
+        timestamps: Sequence[datetime] | np.ndarray,
+        values: Sequence[Any] | np.ndarray,
+        dtype: type | None = None,
+    ) -> None:
+        request = cls._to_bulk_request(key, timestamps, values, dtype)
+        await get_datalake_client().async_save(request)
 
     def dict(self, *args, **kwargs) -> Dict:
         d = super().model_dump(*args, **kwargs)
@@ -117,13 +405,36 @@ class SplightDatalakeBaseModel(BaseModel):
         }
 
 
-def _fix_dataframe_timestamp(df: pd.DataFrame) -> pd.DataFrame:
-    if df["timestamp"][0].tz is None:
-        df["timestamp"] = df["timestamp"].apply(
-            lambda x: x.tz_localize(tz="UTC").strftime("%Y-%m-%dT%H:%M:%S.%fZ")
+def _validate_dataframe(
+    df: pd.DataFrame, schema_name: TransitionSchemaName, columns: list[str]
+) -> pd.DataFrame:
+    # Checks the columns of save_dataframe with vectorized operations, so
+    # no model is built for each row. Returns the columns to save.
+    missing = [column for column in columns if column not in df.columns]
+    if missing:
+        raise ValueError(
+            f"Missing columns {missing} to save {schema_name.value} data "
+            f"points, the DataFrame has {list(df.columns)}"
         )
-    else:
-        df["timestamp"] = df["timestamp"].apply(
-            lambda x: x.tz_convert(tz="UTC").strftime("%Y-%m-%dT%H:%M:%S.%fZ")
+    df = df[columns]
+    nulls = df.isna()
+    if nulls.to_numpy().any():
+        counts = nulls.sum()
+        raise ValueError(
+            "Missing or NaN values in the columns "
+            f"{counts[counts > 0].to_dict()}"
+        )
+    for key in columns[:-2]:
+        if not pd.api.types.is_string_dtype(df[key]):
+            raise ValueError(f"The {key} column must have strings")
+    kind = pd.api.types.infer_dtype(df["value"], skipna=False)
+    if kind not in DATAFRAME_VALUE_TYPES:
+        raise ValueError(
+            "The value column must have numbers, booleans or strings, "
+            f"got {kind} values"
         )
     return df
+
+
+def _fix_dataframe_timestamp(df: pd.DataFrame) -> pd.DataFrame:
+    return df.assign(timestamp=format_timestamps(df["timestamp"]))
@@ -1,10 +1,13 @@
 from datetime import datetime, timedelta, timezone
-from typing import ClassVar, Literal
+from typing import Any, AsyncIterator, ClassVar, Iterator, Literal, Sequence
 
+import numpy as np
 import pandas as pd
 from pydantic import field_validator
 from typing_extensions import Self
 
+from splight_lib.client.datalake.common.arrays import DatalakeArrays
+from splight_lib.client.datalake.common.cursor import ReadFormat
 from splight_lib.models._v4.asset import Asset
 from splight_lib.models._v4.attribute import Attribute
 from splight_lib.models._v4.datalake_base import SplightDatalakeBaseModel
@@ -16,6 +19,7 @@ class NativeOutput(SplightDatalakeBaseModel):
     output_format: str | None = None
     _schema_name: ClassVar[Literal["default"]] = "default"
     _output_format: ClassVar[str] = "default"
+    _value_type: ClassVar[type | None] = None
 
     @field_validator("output_format", mode="before")
     def set_output_format(cls, v) -> str:
@@ -37,6 +41,62 @@ class NativeOutput(SplightDatalakeBaseModel):
             [{"asset": asset, "attribute": attribute}], **params
         )
 
+    @classmethod
+    def get_arrays(
+        cls, asset: str | Asset, attribute: str | Attribute, **params: dict
+    ) -> DatalakeArrays:
+        """Returns the data as a datetime64[ns] timestamp array and a typed
+        value array, decoded from the response without models. Use
+        DatalakeArrays.to_series to get a Series sharing the arrays.
+
+        Parameters
+        ----------
+        asset: str | Asset the asset of the data.
+        attribute: str | Attribute the attribute of the data.
+        **params: the parameters of get, like start, end and limit.
+        """
+        return super()._get_arrays(
+            [{"asset": asset, "attribute": attribute}], **params
+        )
+
+    @classmethod
+    def iter_get(
+        cls,
+        asset: str | Asset,
+        attribute: str | Attribute,
+        output: ReadFormat = ReadFormat.MODELS,
+        **params: dict,
+    ) -> Iterator[list[Self] | list[dict] | dict]:
+        """Iterates over the data in pages of limit points, following the
+        timestamps with a cursor instead of loading the whole range, so the
+        memory used does not depend on its length. The next page is
+        requested while the current one is processed.
+
+        Parameters
+        ----------
+        asset: str | Asset the asset of the data.
+        attribute: str | Attribute the attribute of the data.
+        output: ReadFormat whether the pages are lists of models, lists of
+            dicts or dicts of numpy arrays.
+        **params: the parameters of get, like start, end and limit.
+        """
+        return super()._iter_get(
+            [{"asset": asset, "attribute": attribute}], output, **params
+        )
+
+    @classmethod
+    def aiter_get(
+        cls,
+        asset: str | Asset,
+        attribute: str | Attribute,
+        output: ReadFormat = ReadFormat.MODELS,
+        **params: dict,
+    ) -> AsyncIterator[list[Self] | list[dict] | dict]:
+        """Async version of iter_get."""
+        return super()._aiter_get(
+            [{"asset": asset, "attribute": attribute}], output, **params
+        )
+
     @classmethod
     def get_dataframe(
         cls, asset: str | Asset, attribute: str | Attribute, **params: dict
@@ -47,6 +107,47 @@ class NativeOutput(SplightDatalakeBaseModel):
         df["output_format"] = cls._output_format
         return df
 
+    @classmethod
+    def save_many(
+        cls,
+        asset: str | Asset,
+        attribute: str | Attribute,
+        timestamps: Sequence[datetime] | np.ndarray,
+        values: Sequence[Any] | np.ndarray,
+    ) -> None:
+        """Saves many values of an attribute in a single write, without
+        creating a model for each value.
+
+        Parameters
+        ----------
+        asset: str | Asset the asset of the values.
+        attribute: str | Attribute the attribute of the values.
+        timestamps: Sequence | np.ndarray the timestamps of the values,
+            naive timestamps are taken as UTC.
+        values: Sequence | np.ndarray the values.
+        """
+        cls._save_many(
+            {"asset": asset, "attribute": attribute},
+            timestamps,
+            values,
+            dtype=cls._value_type,
+        )
+
+    @classmethod
+    async def async_save_many(
+        cls,
+        asset: str | Asset,
+        attribute: str | Attribute,
+        timestamps: Sequence[datetime] | np.ndarray,
+        values: Sequence[Any] | np.ndarray,
+    ) -> None:
+        await cls._async_save_many(
+            {"asset": asset, "attribute": attribute},
+            timestamps,
+            values,
+            dtype=cls._value_type,
+        )
+
     @classmethod
     def latest(
         cls,
@@ -65,23 +166,58 @@ class NativeOutput(SplightDatalakeBaseModel):
             return result[0]
         return None
 
+    @classmethod
+    def latest_many(
+        cls,
+        addresses: Sequence[tuple[str | Asset, str | Attribute]],
+        expiration: timedelta | None = None,
+    ) -> dict[tuple[str, str], Self]:
+        """Returns the last value of many attributes. The attributes are
+        read in chunks, with a descending request per chunk, concurrently.
+
+        Parameters
+        ----------
+        addresses: Sequence of (asset, attribute) pairs.
+        expiration: timedelta | None how old the values can be.
+
+        Returns
+        -------
+        Dict with the values by (asset id, attribute id), addresses without
+        values in the expiration are missing.
+        """
+        return super()._latest_many(_address_entries(addresses), expiration)
+
+    @classmethod
+    async def async_latest_many(
+        cls,
+        addresses: Sequence[tuple[str | Asset, str | Attribute]],
+        expiration: timedelta | None = None,
+    ) -> dict[tuple[str, str], Self]:
+        """Async version of latest_many."""
+        return await super()._async_latest_many(
+            _address_entries(addresses), expiration
+        )
+
 
 class Number(NativeOutput):
     value: float
     output_format: Literal["Number"] = "Number"
     _output_format: ClassVar[str] = "Number"
+    _value_type: ClassVar[type] = float
 
 
 class String(NativeOutput):
     value: str
     output_format: Literal["String"] = "String"
     _output_format: ClassVar[str] = "String"
+    _value_type: ClassVar[type] = str
 
 
 class Boolean(NativeOutput):
     value: bool
     output_format: Literal["Boolean"] = "Boolean"
     _output_format: ClassVar[str] = "Boolean"
+    _value_type: ClassVar[type] = bool
 
 
 class SolutionOutputDocument(SplightDatalakeBaseModel):
@@ -110,6 +246,69 @@ class SolutionOutputDocument(SplightDatalakeBaseModel):
         ]
         return await super()._async_get(solution_keys, **params)
 
+    @classmethod
+    def get_arrays(
+        cls, solution: str, output: str, asset: str, **params: dict
+    ) -> DatalakeArrays:
+        """Returns the data as a datetime64[ns] timestamp array and a typed
+        value array, decoded from the response without models. Use
+        DatalakeArrays.to_series to get a Series sharing the arrays.
+
+        Parameters
+        ----------
+        solution: str the solution of the data.
+        output: str the solution output.
+        asset: str the asset of the data.
+        **params: the parameters of get, like start, end and limit.
+        """
+        solution_keys = [
+            {"solution": solution, "output": output, "asset": asset}
+        ]
+        return super()._get_arrays(solution_keys, **params)
+
+    @classmethod
+    def iter_get(
+        cls,
+        solution: str,
+        output: str,
+        asset: str,
+        output_format: ReadFormat = ReadFormat.MODELS,
+        **params: dict,
+    ) -> Iterator[list[Self] | list[dict] | dict]:
+        """Iterates over the data in pages of limit points, following the
+        timestamps with a cursor instead of loading the whole range, so the
+        memory used does not depend on its length. The next page is
+        requested while the current one is processed.
+
+        Parameters
+        ----------
+        solution: str the solution of the data.
+        output: str the solution output.
+        asset: str the asset of the data.
+        output_format: ReadFormat whether the pages are lists of models, lists of
+            dicts or dicts of numpy arrays.
+        **params: the parameters of get, like start, end and limit.
+        """
+        solution_keys = [
+            {"solution": solution, "output": output, "asset": asset}
+        ]
+        return super()._iter_get(solution_keys, output_format, **params)
+
+    @classmethod
+    def aiter_get(
+        cls,
+        solution: str,
+        output: str,
+        asset: str,
+        output_format: ReadFormat = ReadFormat.MODELS,
+        **params: dict,
+    ) -> AsyncIterator[list[Self] | list[dict] | dict]:
+        """Async version of iter_get."""
+        solution_keys = [
+            {"solution": solution, "output": output, "asset": asset}
+        ]
+        return super()._aiter_get(solution_keys, output_format, **params)
+
     @classmethod
     def get_dataframe(
         cls, solution: str, output: str, asset: str, **params: dict
@@ -119,6 +318,48 @@ class SolutionOutputDocument(SplightDatalakeBaseModel):
         ]
         return super()._get_dataframe(solution_keys, **params)
 
+    @classmethod
+    def save_many(
+        cls,
+        solution: str,
+        output: str,
+        asset: str | Asset,
+        timestamps: Sequence[datetime] | np.ndarray,
+        values: Sequence[Any] | np.ndarray,
+    ) -> None:
+        """Saves many values of a solution output in a single write,
+        without creating a model for each value.
+
+        Parameters
+        ----------
+        solution: str the solution of the values.
+        output: str the output of the values.
+        asset: str | Asset the asset of the values.
+        timestamps: Sequence | np.ndarray the timestamps of the values,
+            naive timestamps are taken as UTC.
+        values: Sequence | np.ndarray the values.
+        """
+        cls._save_many(
+            {"solution": solution, "asset": asset, "output": output},
+            timestamps,
+            values,
+        )
+
+    @classmethod
+    async def async_save_many(
+        cls,
+        solution: str,
+        output: str,
+        asset: str | Asset,
+        timestamps: Sequence[datetime] | np.ndarray,
+        values: Sequence[Any] | np.ndarray,
+    ) -> None:
+        await cls._async_save_many(
+            {"solution": solution, "asset": asset, "output": output},
+            timestamps,
+            values,
+        )
+
     @classmethod
     def latest(
         cls,
@@ -138,3 +379,68 @@ class SolutionOutputDocument(SplightDatalakeBaseModel):
         if result:
             return result[0]
         return None
+
+    @classmethod
+    def latest_many(
+        cls,
+        addresses: Sequence[tuple[str, str, str]],
+        expiration: timedelta | None = None,
+    ) -> dict[tuple[str, str, str], Self]:
+        """Returns the last value of many solution outputs. The outputs are
+        read in chunks, with a descending request per chunk, concurrently.
+
+        Parameters
+        ----------
+        addresses: Sequence of (solution, output, asset) tuples.
+        expiration: timedelta | None how old the values can be.
+
+        Returns
+        -------
+        Dict with the values by (solution, output, asset), addresses without
+        values in the expiration are missing.
+        """
+        latest = super()._latest_many(_solution_entries(addresses), expiration)
+        return _by_solution_address(latest)
+
+    @classmethod
+    async def async_latest_many(
+        cls,
+        addresses: Sequence[tuple[str, str, str]],
+        expiration: timedelta | None = None,
+    ) -> dict[tuple[str, str, str], Self]:
+        """Async version of latest_many."""
+        latest = await super()._async_latest_many(
+            _solution_entries(addresses), expiration
+        )
+        return _by_solution_address(latest)
+
+
+def _address_entries(
+    addresses: Sequence[tuple[str | Asset, str | Attribute]],
+) -> list[dict[str, str]]:
+    return [
+        {
+            "asset": asset.id if isinstance(asset, Asset) else asset,
+            "attribute": (
+                attribute.id if isinstance(attribute, Attribute) else attribute
+            ),
+        }
+        for asset, attribute in addresses
+    ]
+
+
+def _solution_entries(
+    addresses: Sequence[tuple[str, str, str]],
+) -> list[dict[str, str]]:
+    return [
+        {"solution": solution, "output": output, "asset": asset}
+        for solution, output, asset in addresses
+    ]
+
+
+def _by_solution_address(latest: dict[tuple, Any]) -> dict[tuple, Any]:
+    # The datalake keys are (solution, asset, output)
+    return {
+        (solution, output, asset): value
+        for (solution, asset, output), value in latest.items()
+    }
@@ -0,0 +1,268 @@
+from datetime import datetime, timezone
+
+import numpy as np
+import pandas as pd
+import pytest
+from pytest_mock import MockerFixture
+
+from splight_lib.models._v4 import native
+from splight_lib.models._v4.data_address import DataAddresses
+from splight_lib.models._v4.native import Number, SolutionOutputDocument
+
+
+def test_save_many_builds_request_without_models(mocker: MockerFixture):
+    client = mocker.MagicMock()
+    mocker.patch.object(
+        native.SplightDatalakeBaseModel,
+        "model_dump",
+        side_effect=AssertionError("no models should be dumped"),
+    )
+    mocker.patch(
+        "splight_lib.models._v4.datalake_base.get_datalake_client",
+        return_value=client,
+    )
+    timestamps = np.array(
+        ["2024-01-01T00:00:00", "2024-01-01T00:00:01.5"],
+        dtype="datetime64[ns]",
+    )
+
+    Number.save_many("asset", "attr", timestamps, np.array([1, 2]))
+
+    client.save.assert_called_once_with(
+        {
+            "records": {
+                "schema_name": "default",
+                "data_points": [
+                    {
+                        "asset": "asset",
+                        "attribute": "attr",
+                        "timestamp": "2024-01-01T00:00:00.000000Z",
+                        "value": 1.0,
+                    },
+                    {
+                        "asset": "asset",
+                        "attribute": "attr",
+                        "timestamp": "2024-01-01T00:00:01.500000Z",
+                        "value": 2.0,
+                    },
+                ],
+            }
+        }
+    )
+
+
+def test_save_many_checks_lengths():
+    with pytest.raises(ValueError):
+        SolutionOutputDocument.save_many(
+            "solution",
+            "output",
+            "asset",
+            [datetime.now(timezone.utc)],
+            [1, 2],
+        )
+
+
+def test_save_dataframe_in_chunks_without_mutation(mocker: MockerFixture):
+    client = mocker.MagicMock()
+    mocker.patch(
+        "splight_lib.models._v4.datalake_base.get_datalake_client",
+        return_value=client,
+    )
+    df = pd.DataFrame(
+        {
+            "timestamp": pd.date_range("2024-01-01", periods=25, freq="s"),
+            "value": np.arange(25, dtype=float),
+        }
+    )
+    original = df.copy()
+    progress = []
+
+    DataAddresses(
+        asset="asset", attribute="attr", type="Number"
+    ).save_dataframe(
+        df,
+        chunk_size=10,
+        max_workers=2,
+        progress=lambda sent, total: progress.append((sent, total)),
+    )
+
+    pd.testing.assert_frame_equal(df, original)
+    chunks = [
+        call.args[0]["records"]["data_points"]
+        for call in client.write.call_args_list
+    ]
+    assert sorted(len(chunk) for chunk in chunks) == [5, 10, 10]
+    assert progress[-1] == (25, 25)
+    first = min(chunks, key=lambda chunk: chunk[0]["value"])[0]
+    assert first == {
+        "asset": "asset",
+        "attribute": "attr",
+        "timestamp": "2024-01-01T00:00:00.000000Z",
+        "value": 0.0,
+    }
+
+
+@pytest.mark.parametrize(
+    "frame, error",
+    [
+        (
+            pd.DataFrame({"timestamp": [datetime(2024, 1, 1)], "value": [1]}),
+            ValueError,
+        ),
+        (
+            pd.DataFrame(
+                {
+                    "asset": ["asset", "asset"],
+                    "attribute": ["attr", "attr"],
+                    "timestamp": pd.date_range("2024-01-01", periods=2),
+                    "value": [1.0, np.nan],
+                }
+            ),
+            ValueError,
+        ),
+        (
+            pd.DataFrame(
+                {
+                    "asset": ["asset"],
+                    "attribute": [None],
+                    "timestamp": [datetime(2024, 1, 1)],
+                    "value": [1.0],
+                }
+            ),
+            ValueError,
+        ),
+        (
+            pd.DataFrame(
+                {
+                    "asset": ["asset"],
+                    "attribute": ["attr"],
+                    "timestamp": [datetime(2024, 1, 1)],
+                    "value": [[1.0]],
+                }
+            ),
+            ValueError,
+        ),
+        (
+            pd.DataFrame(
+                {
+                    "asset": ["asset"],
+                    "attribute": ["attr"],
+                    "timestamp": ["yesterday"],
+                    "value": [1.0],
+                }
+            ),
+            ValueError,
+        ),
+    ],
+)
+def test_save_dataframe_validates_the_rows(
+    mocker: MockerFixture, frame: pd.DataFrame, error: type
+):
+    client = mocker.MagicMock()
+    mocker.patch(
+        "splight_lib.models._v4.datalake_base.get_datalake_client",
+        return_value=client,
+    )
+
+    with pytest.raises(error):
+        Number.save_dataframe(frame)
+
+    client.write.assert_not_called()
+
+
+def test_latest_many_reads_the_keys_in_chunks(mocker: MockerFixture):
+    requests = []
+
+    def get(request):
+        requests.append(request)
+        entries = request["keys"]["entries"]
+        # asset-0 has many recent points that fill the first page
+        rows = [
+            {
+                "asset": "asset-0",
+                "attribute": "attr",
+                "timestamp": f"2024-01-01T00:01:{second:02d}Z",
+                "value": 10.0,
+            }
+            for second in range(59, -1, -1)
+            if {"asset": "asset-0", "attribute": "attr"} in entries
+        ]
+        rows += [
+            {
+                **entry,
+                "timestamp": f"2024-01-01T00:00:{second:02d}.5Z",
+                "value": value,
+            }
+            for second, value in ((30, 2.0), (0, 1.0))
+            for entry in entries
+            if entry["asset"] != "asset-0"
+        ]
+        return {"results": rows[: request["limit"]]}
+
+    client = mocker.MagicMock()
+    client.get.side_effect = get
+    mocker.patch(
+        "splight_lib.models._v4.datalake.get_datalake_client",
+        return_value=client,
+    )
+    mocker.patch(
+        "splight_lib.models._v4.datalake_base.LATEST_MANY_CHUNK_SIZE", 4
+    )
+    addresses = [(f"asset-{i}", "attr") for i in range(10)]
+
+    latest = Number.latest_many(addresses + addresses[:5])
+
+    # Three chunks and a second read of the keys hidden by asset-0
+    assert len(requests) == 4
+    assert sorted(len(request["keys"]["entries"]) for request in requests) == [
+        2,
+        3,
+        4,
+        4,
+    ]
+    assert {request["sort"] for request in requests} == {-1}
+    assert {request["start"] for request in requests} == {None}
+    assert len(latest) == 10
+    assert latest[("asset-0", "attr")].value == 10.0
+    assert latest[("asset-7", "attr")].value == 2.0
+    assert latest[("asset-7", "attr")].timestamp == datetime(
+        2024, 1, 1, 0, 0, 30, 500000, tzinfo=timezone.utc
+    )
+
+
+def test_get_arrays_decodes_without_models(mocker: MockerFixture):
+    client = mocker.MagicMock()
+    client.get.return_value = {
+        "results": [
+            {
+                "asset": "asset",
+                "attribute": "attr",
+                "timestamp": "2024-01-01T00:00:01.500000Z",
+                "value": 2,
+            },
+            {
+                "asset": "asset",
+                "attribute": "attr",
+                "timestamp": "2024-01-01T00:00:00+00:00",
+                "value": 1.5,
+            },
+        ]
+    }
+    mocker.patch(
+        "splight_lib.models._v4.datalake.get_datalake_client",
+        return_value=client,
+    )
+    mocker.patch.object(
+        Number, "__init__", side_effect=AssertionError("no models")
+    )
+
+    arrays = Number.get_arrays("asset", "attr", with_keys=True)
+
+    assert arrays.value.dtype == np.float64
+    assert arrays.value.tolist() == [2.0, 1.5]
+    assert arrays.timestamp.dtype == np.dtype("datetime64[ns]")
+    assert arrays.timestamp[0] == np.datetime64("2024-01-01T00:00:01.5")
+    assert arrays.key.tolist() == [0, 0]
+    assert arrays.keys == [("asset", "attr")]
+    series = arrays.to_series()
+    assert np.shares_memory(series.to_numpy(), arrays.value)
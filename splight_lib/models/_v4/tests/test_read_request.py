@@ -0,0 +1,348 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from math import ceil
+from time import monotonic
+
+import numpy as np
+from pytest_mock import MockerFixture
+
+from splight_lib.client.datalake import batch_reads
+from splight_lib.client.datalake.common.cursor import ReadFormat
+from splight_lib.client.datalake.common.disk_cache import get_disk_cache
+from splight_lib.client.datalake.common.ingestion import to_utc
+from splight_lib.client.datalake.common.read_cache import get_read_cache
+from splight_lib.models._v4.datalake import DataReadRequest, DefaultKeys
+from splight_lib.models._v4.native import Number
+from splight_lib.settings import datalake_settings
+
+START = datetime(2024, 1, 1, tzinfo=timezone.utc)
+END = START + timedelta(hours=1)
+
+
+class FakeDatalake:
+    """Serves one point per second between START and END."""
+
+    def __init__(self):
+        self.requests = []
+
+    def get(self, request: dict) -> dict:
+        self.requests.append(request)
+        start = to_utc(request["start"])
+        end = to_utc(request["end"])
+        seconds = range(
+            ceil((start - START).total_seconds()),
+            ceil((end - START).total_seconds()),
+        )
+        rows = [
+            {
+                "asset": "asset",
+                "attribute": "attr",
+                "timestamp": (START + timedelta(seconds=second)).isoformat(),
+                "value": second,
+            }
+            for second in seconds
+        ]
+        if request["sort"] == -1:
+            rows.reverse()
+        return {"results": rows[: request["limit"]]}
+
+    async def async_get(self, request: dict) -> dict:
+        return self.get(request)
+
+
+def _request(limit: int) -> DataReadRequest:
+    return DataReadRequest(
+        keys=DefaultKeys.load([{"asset": "asset", "attribute": "attr"}]),
+        start=START,
+        end=END,
+        limit=limit,
+    )
+
+
+def test_apply_partitioned_fetches_every_window(mocker: MockerFixture):
+    client = FakeDatalake()
+    mocker.patch(
+        "splight_lib.models._v4.datalake.get_datalake_client",
+        return_value=client,
+    )
+
+    results = _request(limit=100).apply_partitioned(max_concurrency=4)
+
+    assert [row["value"] for row in results] == list(range(3599, -1, -1))
+    assert len(client.requests) > 3600 / 100
+
+
+def test_apply_partitioned_keeps_the_full_pages(mocker: MockerFixture):
+    client = FakeDatalake()
+    mocker.patch(
+        "splight_lib.models._v4.datalake.get_datalake_client",
+        return_value=client,
+    )
+
+    results = _request(limit=100).apply_partitioned(max_concurrency=4)
+
+    assert [row["value"] for row in results] == list(range(3599, -1, -1))
+    # The last 100 seconds come from the first page
+    assert all(
+        to_utc(request["end"]) <= END - timedelta(seconds=99)
+        for request in client.requests[1:]
+    )
+
+
+def test_apply_partitioned_warns_when_a_window_is_truncated(
+    mocker: MockerFixture,
+):
+    client = FakeDatalake()
+    mocker.patch(
+        "splight_lib.models._v4.datalake.get_datalake_client",
+        return_value=client,
+    )
+    logger = mocker.patch("splight_lib.models._v4.datalake.logger")
+    request = _request(limit=100).model_copy(update={"time_window_size": 3600})
+
+    results = request.apply_partitioned()
+
+    assert len(results) == 100
+    assert len(client.requests) == 1
+    logger.warning.assert_called_once()
+
+
+def test_async_apply_partitioned_single_page(mocker: MockerFixture):
+    client = FakeDatalake()
+    mocker.patch(
+        "splight_lib.models._v4.datalake.get_datalake_client",
+        return_value=client,
+    )
+
+    results = asyncio.run(_request(limit=5000).async_apply_partitioned())
+
+    assert len(results) == 3600
+    assert len(client.requests) == 1
+
+
+def test_iter_get_pages_with_cursor(mocker: MockerFixture):
+    client = FakeDatalake()
+    mocker.patch(
+        "splight_lib.models._v4.datalake.get_datalake_client",
+        return_value=client,
+    )
+
+    pages = list(
+        Number.iter_get(
+            "asset", "attr", output=ReadFormat.ARRAYS, start=START, end=END
+        )
+    )
+
+    values = np.concatenate([page["value"] for page in pages])
+    assert values.tolist() == list(range(3599, -1, -1))
+    assert pages[0]["timestamp"].dtype == np.dtype("datetime64[us]")
+    assert all(len(page["value"]) <= 1000 for page in pages)
+
+
+def test_aiter_get_returns_models(mocker: MockerFixture):
+    client = FakeDatalake()
+    mocker.patch(
+        "splight_lib.models._v4.datalake.get_datalake_client",
+        return_value=client,
+    )
+
+    async def collect():
+        return [
+            point
+            async for page in Number.aiter_get(
+                "asset", "attr", start=START, end=END, sort=1, limit=700
+            )
+            for point in page
+        ]
+
+    points = asyncio.run(collect())
+
+    assert [point.value for point in points] == list(range(3600))
+    assert isinstance(points[0], Number)
+
+
+class GrowingDatalake:
+    """Serves the points added so far, with an inclusive start."""
+
+    def __init__(self):
+        self.points = []
+        self.requests = []
+
+    def add(self, second: int) -> None:
+        self.points.append(
+            {
+                "asset": "asset",
+                "attribute": "attr",
+                "timestamp": (START + timedelta(seconds=second)).isoformat(),
+                "value": second,
+            }
+        )
+
+    def get(self, request: dict) -> dict:
+        self.requests.append(request)
+        start = to_utc(request["start"])
+        rows = [
+            point
+            for point in self.points
+            if to_utc(point["timestamp"]) >= start
+        ]
+        if request["sort"] == -1:
+            rows.reverse()
+        return {"results": rows[: request["limit"]]}
+
+
+def test_read_cache_fetches_only_the_tail(mocker: MockerFixture):
+    client = GrowingDatalake()
+    mocker.patch(
+        "splight_lib.models._v4.datalake.get_datalake_client",
+        return_value=client,
+    )
+    mocker.patch.object(datalake_settings, "DL_READ_CACHE", True)
+    get_read_cache.cache_clear()
+    for second in range(100):
+        client.add(second)
+
+    def read(start: int) -> list[dict]:
+        return DataReadRequest(
+            keys=DefaultKeys.load([{"asset": "asset", "attribute": "attr"}]),
+            start=START + timedelta(seconds=start),
+        ).apply()
+
+    assert len(read(0)) == 100
+    for second in range(100, 105):
+        client.add(second)
+
+    results = read(10)
+
+    assert [row["value"] for row in results] == list(range(104, 9, -1))
+    assert len(client.requests) == 2
+    tail_start = to_utc(client.requests[-1]["start"])
+    assert tail_start == START + timedelta(seconds=99)
+    get_read_cache.cache_clear()
+
+
+def test_settled_reads_are_served_from_disk(mocker: MockerFixture, tmp_path):
+    client = FakeDatalake()
+    mocker.patch(
+        "splight_lib.models._v4.datalake.get_datalake_client",
+        return_value=client,
+    )
+    mocker.patch.object(datalake_settings, "DL_DISK_CACHE_DIR", str(tmp_path))
+    get_disk_cache.cache_clear()
+
+    def read(start: datetime, end: datetime) -> list[dict]:
+        return DataReadRequest(
+            keys=DefaultKeys.load([{"asset": "asset", "attribute": "attr"}]),
+            start=start,
+            end=end,
+            limit=5000,
+        ).apply()
+
+    first = read(START, END)
+    cached = read(START + timedelta(minutes=10), START + timedelta(minutes=20))
+
+    assert len(client.requests) == 1
+    assert len(first) == 3600
+    assert [row["value"] for row in cached] == list(range(1200, 599, -1))
+    assert cached[0]["asset"] == "asset"
+    assert to_utc(cached[0]["timestamp"]) == START + timedelta(minutes=20)
+    get_disk_cache.cache_clear()
+
+
+class KeyedDatalake:
+    """Serves one point per second of the first minute of each entry."""
+
+    def __init__(self):
+        self.requests = []
+
+    def get(self, request: dict) -> dict:
+        self.requests.append(request)
+        rows = [
+            {
+                **entry,
+                "timestamp": (START + timedelta(seconds=second)).isoformat(),
+                "value": second,
+            }
+            for second in range(59, -1, -1)
+            for entry in request["keys"]["entries"]
+        ]
+        return {"results": rows[: request["limit"]]}
+
+    async def async_get(self, request: dict) -> dict:
+        return self.get(request)
+
+
+def _attribute_request(attribute: str, limit: int = 100) -> DataReadRequest:
+    return DataReadRequest(
+        keys=DefaultKeys.load([{"asset": "asset", "attribute": attribute}]),
+        start=START,
+        end=START + timedelta(minutes=1),
+        limit=limit,
+    )
+
+
+def test_batch_reads_merges_concurrent_requests(mocker: MockerFixture):
+    client = KeyedDatalake()
+    mocker.patch(
+        "splight_lib.models._v4.datalake.get_datalake_client",
+        return_value=client,
+    )
+
+    async def read(limit: int) -> list[list[dict]]:
+        with batch_reads(delay=0.05):
+            return await asyncio.gather(
+                *(
+                    _attribute_request(attribute, limit).async_apply()
+                    for attribute in ("a", "b", "c")
+                )
+            )
+
+    results = asyncio.run(read(100))
+    assert len(client.requests) == 1
+    assert len(client.requests[0]["keys"]["entries"]) == 3
+    for attribute, rows in zip(("a", "b", "c"), results):
+        assert {row["attribute"] for row in rows} == {attribute}
+        assert [row["value"] for row in rows] == list(range(59, -1, -1))
+
+    # The merged response hits its limit, each request is sent alone
+    client.requests.clear()
+    results = asyncio.run(read(40))
+    assert len(client.requests) == 4
+    assert [len(rows) for rows in results] == [40, 40, 40]
+
+
+def test_batch_reads_merges_reads_of_other_threads(mocker: MockerFixture):
+    client = KeyedDatalake()
+    mocker.patch(
+        "splight_lib.models._v4.datalake.get_datalake_client",
+        return_value=client,
+    )
+
+    with batch_reads(delay=0.1) as batcher:
+
+        def read(attribute: str) -> list[dict]:
+            with batch_reads(batcher=batcher):
+                return _attribute_request(attribute).apply()
+
+        with ThreadPoolExecutor(max_workers=3) as executor:
+            results = list(executor.map(read, ("a", "b", "c")))
+
+    assert len(client.requests) == 1
+    assert [rows[0]["attribute"] for rows in results] == ["a", "b", "c"]
+
+
+def test_batch_reads_does_not_delay_a_lone_thread(mocker: MockerFixture):
+    client = KeyedDatalake()
+    mocker.patch(
+        "splight_lib.models._v4.datalake.get_datalake_client",
+        return_value=client,
+    )
+
+    start = monotonic()
+    with batch_reads(delay=10):
+        rows = _attribute_request("a").apply()
+
+    assert monotonic() - start < 1
+    assert len(client.requests) == 1
+    assert {row["attribute"] for row in rows} == {"a"}
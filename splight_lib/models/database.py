@@ -7,7 +7,11 @@ from strenum import LowercaseStrEnum
 
 from splight_lib.client.database import DatabaseClientBuilder
 from splight_lib.client.database.abstract import AbstractDatabaseClient
-from splight_lib.settings import api_settings, workspace_settings
+from splight_lib.settings import (
+    api_settings,
+    database_settings,
+    workspace_settings,
+)
 
 FilePath = TypeVar("FilePath", str, Path)
 
@@ -72,6 +76,13 @@ class SplightDatabaseBaseModel(BaseModel):
                 "access_id": workspace_settings.SPLIGHT_ACCESS_ID,
                 "secret_key": workspace_settings.SPLIGHT_SECRET_KEY,
                 "api_version": api_settings.API_VERSION,
+                "request_compression": (
+                    database_settings.DB_REQUEST_COMPRESSION
+                ),
+                "compression_threshold": (
+                    database_settings.DB_COMPRESSION_THRESHOLD
+                ),
+                "coalesce_reads": database_settings.DB_COALESCE_READS,
             },
         )
         return db_client
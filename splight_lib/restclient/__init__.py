@@ -1,4 +1,11 @@
 from splight_lib.restclient.client import SplightRestClient
+from splight_lib.restclient.compression import ContentEncoding
 from splight_lib.restclient.exceptions import ConnectError, HTTPError, Timeout
 
-__all__ = ["SplightRestClient", "HTTPError", "ConnectError", "Timeout"]
+__all__ = [
+    "SplightRestClient",
+    "ContentEncoding",
+    "HTTPError",
+    "ConnectError",
+    "Timeout",
+]
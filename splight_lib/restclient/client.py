@@ -1,8 +1,14 @@
+import json as jsonlib
 from typing import Any, Callable, Mapping
 
 import httpx
 from httpx import AsyncHTTPTransport, HTTPTransport
 
+from splight_lib.restclient.compression import (
+    ContentEncoding,
+    compress,
+    resolve_encoding,
+)
 from splight_lib.restclient.types import (
     DEFAULT_LIMITS,
     DEFAULT_MAX_REDIRECTS,
@@ -104,6 +110,14 @@ class SplightRestClient:
     detection. Default: "utf-8".
     * event_hooks: used to run hooks for requests and responses.
 
+    3. Added by Splight.
+    * compression (optional) Encoding used to compress JSON request bodies,
+    either "gzip" or "zstd" (which falls back to gzip when zstandard is not
+    installed). Default None, bodies are sent uncompressed. The response
+    encodings supported by httpx are always advertised in Accept-Encoding.
+    * compression_threshold (optional) Minimum size in bytes of a JSON body
+    to be compressed. Default 1024.
+
     For ALL client methods. (Compatible with requests interface)
     * url URL to send the request.
     * auth (optional) An authentication class to use when sending requests.
@@ -153,11 +167,16 @@ class SplightRestClient:
         trust_env: bool = True,
         default_encoding: str | Callable[[bytes], str] = "utf-8",
         event_hooks: Mapping[str, list[EventHook]] | None = None,
+        # extra params defined by splight
+        compression: ContentEncoding | str | None = None,
+        compression_threshold: int = 1024,
     ):
         """Initialize the SplightRestClient.
 
         Parameters: See class docstring.
         """
+        self._compression = resolve_encoding(compression)
+        self._compression_threshold = compression_threshold
         # Client is the httpx Session impl
         # in httpx.Client allow_redirects is named follow_redirects
         self._client = httpx.Client(
@@ -207,6 +226,26 @@ class SplightRestClient:
             new_headers
         )
 
+    def _encode_json(
+        self, json: Any | None, headers: HeaderTypes | None
+    ) -> tuple[bytes | None, Any | None, HeaderTypes | None]:
+        """Encodes the JSON body compressing it when compression is enabled
+        and the body is larger than the threshold.
+
+        Returns the content, json and headers to use in the request.
+        """
+        if json is None or self._compression is None:
+            return None, json, headers
+        content = jsonlib.dumps(
+            json, ensure_ascii=False, separators=(",", ":"), allow_nan=False
+        ).encode("utf-8")
+        headers = httpx.Headers(headers)
+        headers["Content-Type"] = "application/json"
+        if len(content) >= self._compression_threshold:
+            content = compress(content, self._compression)
+            headers["Content-Encoding"] = self._compression.value
+        return content, None, headers
+
     def get(
         self,
         url: URLTypes,
@@ -333,9 +372,11 @@ class SplightRestClient:
 
         Parameters: See class docstring.
         """
+        content, json, headers = self._encode_json(json, headers)
         raw_response = self._client.request(
             self._POST_METHOD,
             str(url),
+            content=content,
             data=data,
             files=files,
             json=json,
@@ -366,9 +407,11 @@ class SplightRestClient:
 
         Parameters: See class docstring.
         """
+        content, json, headers = self._encode_json(json, headers)
         raw_response = await self._async_client.request(
             self._POST_METHOD,
             str(url),
+            content=content,
             data=data,
             files=files,
             json=json,
@@ -399,9 +442,11 @@ class SplightRestClient:
 
         Parameters: See class docstring.
         """
+        content, json, headers = self._encode_json(json, headers)
         raw_response = self._client.request(
             self._PUT_METHOD,
             str(url),
+            content=content,
             data=data,
             files=files,
             json=json,
@@ -432,9 +477,11 @@ class SplightRestClient:
 
         Parameters: See class docstring.
         """
+        content, json, headers = self._encode_json(json, headers)
         raw_response = self._client.request(
             self._PATCH_METHOD,
             str(url),
+            content=content,
             data=data,
             files=files,
             json=json,
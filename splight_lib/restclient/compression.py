@@ -0,0 +1,49 @@
+import gzip
+from enum import Enum
+
+try:
+    import zstandard
+except ImportError:  # pragma: no cover
+    zstandard = None
+
+
+class ContentEncoding(str, Enum):
+    GZIP = "gzip"
+    ZSTD = "zstd"
+
+    def __str__(self) -> str:
+        return self.value
+
+
+ZSTD_AVAILABLE = zstandard is not None
+
+
+def resolve_encoding(
+    encoding: ContentEncoding | str | None,
+) -> ContentEncoding | None:
+    """Returns the encoding to use for request bodies. zstd falls back to
+    gzip when the zstandard package is not installed.
+    """
+    if encoding is None:
+        return None
+    encoding = ContentEncoding(encoding)
+    if encoding == ContentEncoding.ZSTD and not ZSTD_AVAILABLE:
+        return ContentEncoding.GZIP
+    return encoding
+
+
+def compress(body: bytes, encoding: ContentEncoding) -> bytes:
+    """Compresses a request body with the given encoding."""
+    if encoding == ContentEncoding.ZSTD:
+        return zstandard.ZstdCompressor().compress(body)
+    return gzip.compress(body, compresslevel=6)
+
+
+def decompress(body: bytes, encoding: ContentEncoding | str) -> bytes:
+    """Decompresses a body compressed with the given encoding."""
+    encoding = ContentEncoding(encoding)
+    if encoding == ContentEncoding.ZSTD:
+        if not ZSTD_AVAILABLE:
+            raise ValueError("zstd bodies require the zstandard package")
+        return zstandard.ZstdDecompressor().decompressobj().decompress(body)
+    return gzip.decompress(body)
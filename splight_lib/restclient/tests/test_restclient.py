@@ -1,9 +1,12 @@
+import gzip
+import json
+
 import pytest
 import requests
 from httpx import Client
 from requests import Session
 
-from splight_lib.restclient import SplightRestClient
+from splight_lib.restclient import ContentEncoding, SplightRestClient
 
 
 # This is an integration test. To run it, remove decorator
@@ -32,3 +35,30 @@ def test_all_splight_restclient_methods_have_equal_response_to_other_libraries(
         == getattr(session_response, attr)
         == getattr(requests_response, attr)
     ), f"Error in {attr} atributte."
+
+
+def test_json_body_is_compressed_above_threshold():
+    restclient = SplightRestClient(
+        compression=ContentEncoding.GZIP, compression_threshold=100
+    )
+    small = {"value": 1}
+    large = {"values": list(range(100))}
+
+    content, body, headers = restclient._encode_json(small, None)
+    assert json.loads(content) == small
+    assert body is None
+    assert "Content-Encoding" not in headers
+
+    content, body, headers = restclient._encode_json(large, {"X-Custom": "1"})
+    assert json.loads(gzip.decompress(content)) == large
+    assert headers["Content-Encoding"] == "gzip"
+    assert headers["Content-Type"] == "application/json"
+    assert headers["X-Custom"] == "1"
+
+
+def test_json_body_is_not_encoded_without_compression():
+    restclient = SplightRestClient()
+    content, body, headers = restclient._encode_json({"value": 1}, None)
+    assert content is None
+    assert body == {"value": 1}
+    assert headers is None
@@ -3,6 +3,8 @@ from typing import Any
 
 from pydantic_settings import BaseSettings, PydanticBaseSettingsSource
 
+from splight_lib.restclient.compression import ContentEncoding
+
 from .config import (
     SplightConfigError,
     SplightConfigManager,
@@ -69,12 +71,83 @@ class DatalakeClientType(str, Enum):
     SYNC = "sync"
     BUFFERED_SYNC = "buffered_sync"
     BUFFERED_ASYNC = "buffered_async"
+    BUFFERED_ASYNCIO = "buffered_asyncio"
+
+
+class DatalakeOverflowPolicy(str, Enum):
+    BLOCK = "block"
+    DROP_OLDEST = "drop_oldest"
+    DROP_NEWEST = "drop_newest"
+    SPILL = "spill"
+
+
+class DatalakeReduction(str, Enum):
+    NONE = "none"
+    ABSOLUTE = "absolute"
+    PERCENT = "percent"
+    SWINGING_DOOR = "swinging_door"
+
+
+class DatalakeWriteFormat(str, Enum):
+    ROW = "row"
+    COLUMNAR = "columnar"
+    AUTO = "auto"
 
 
 class DatalakeSettings(BaseSettings, Singleton):
     DL_CLIENT_TYPE: DatalakeClientType = DatalakeClientType.BUFFERED_ASYNC
     DL_BUFFER_SIZE: int = 500
     DL_BUFFER_TIMEOUT: float = 60  # seconds
+    # AUTO tries the columnar format and falls back to the row format for
+    # the following writes if the server rejects it (404, 405, 415 or 501)
+    DL_WRITE_FORMAT: DatalakeWriteFormat = DatalakeWriteFormat.ROW
+    DL_REQUEST_COMPRESSION: ContentEncoding | None = None
+    DL_COMPRESSION_THRESHOLD: int = 1024  # bytes
+    # Bound on the documents buffered by a client, shared by its buffers.
+    # It is measured as their encoded JSON size, as Python objects they take
+    # several times more memory, so size the pods with some margin.
+    DL_BUFFER_MAX_PAYLOAD_BYTES: int = 64 * 1024 * 1024
+    DL_BUFFER_MAX_DOCUMENTS: int | None = None
+    DL_BUFFER_OVERFLOW_POLICY: DatalakeOverflowPolicy = (
+        DatalakeOverflowPolicy.DROP_OLDEST
+    )
+    DL_BUFFER_BLOCK_TIMEOUT: float = 5  # seconds
+    DL_CLOSE_TIMEOUT: float = 10  # seconds
+    DL_RETRY_TRIES: int = 3
+    DL_BACKOFF_BASE: float = 0.5  # seconds
+    DL_BACKOFF_CAP: float = 10  # seconds
+    DL_BREAKER_THRESHOLD: int = 5  # consecutive failures
+    DL_BREAKER_RESET_TIMEOUT: float = 30  # seconds
+    DL_BREAKER_MAX_RESET_TIMEOUT: float = 300  # seconds
+    DL_FLUSH_MAX_DOCUMENTS: int = 1000
+    DL_FLUSH_MAX_BYTES: int = 1024 * 1024
+    DL_FLUSH_PARALLELISM: int = 4
+    DL_REDUCTION: DatalakeReduction = DatalakeReduction.NONE
+    DL_DEADBAND: float = 0
+    DL_MAX_SILENCE: float | None = None  # seconds
+    DL_DEDUP: bool = False
+    DL_INGEST_CHUNK_SIZE: int = 10000  # rows per request
+    DL_INGEST_MAX_WORKERS: int = 4
+    DL_READ_CONCURRENCY: int = 4  # concurrent read requests
+    # Identical concurrent reads share a request, opt-in
+    DL_COALESCE_READS: bool = False
+    DL_READ_BATCH_DELAY: float = 0.005  # seconds
+    DL_READ_CACHE: bool = False
+    DL_READ_CACHE_MAX_BYTES: int = 64 * 1024 * 1024
+    DL_READ_CACHE_TTL: float = 300  # seconds
+    DL_READ_CACHE_MAX_ENTRIES: int = 1024
+    DL_DISK_CACHE_DIR: str | None = None
+    DL_DISK_CACHE_MAX_BYTES: int = 1024 * 1024 * 1024
+    DL_DISK_CACHE_SETTLED: float = 86400  # seconds
+    DL_SPOOL_DIR: str | None = None
+    DL_SPOOL_FSYNC_BATCH: int = 100
+    DL_SPOOL_REPLAY_RATE: float = 1000  # documents per second
+
+
+class DatabaseSettings(BaseSettings, Singleton):
+    DB_REQUEST_COMPRESSION: ContentEncoding | None = None
+    DB_COMPRESSION_THRESHOLD: int = 1024  # bytes
+    DB_COALESCE_READS: bool = False
 
 
 class SplightAPIVersionSettings(BaseSettings, Singleton):
@@ -84,4 +157,5 @@ class SplightAPIVersionSettings(BaseSettings, Singleton):
 # Create singletons
 workspace_settings = WorkspaceSettings()
 datalake_settings = DatalakeSettings()
+database_settings = DatabaseSettings()
 api_settings = SplightAPIVersionSettings()
@@ -0,0 +1,144 @@
+import json
+from dataclasses import dataclass, field
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from threading import Thread
+from time import perf_counter
+
+from splight_lib.client.datalake.v4.encoding import (
+    decode_columnar,
+    encode_columnar,
+)
+from splight_lib.restclient.compression import decompress
+
+WRITE_PATH = "/v4/data/transition/write/"
+COLUMNAR_WRITE_PATH = "/v4/data/transition/write/columnar/"
+
+
+@dataclass
+class ReceivedWrite:
+    path: str
+    body_size: int
+    schema_name: str
+    data_points: list[dict] = field(default_factory=list)
+    content_encoding: str | None = None
+
+
+class LocalDatalakeServer:
+    """A local stand-in for the v4 datalake write endpoints.
+
+    It accepts row and, optionally, columnar write requests, compressed
+    with gzip or zstd or not, and keeps the received data points and body
+    sizes, so it can be used to test the clients or to benchmark the write
+    formats and compressions without the Splight API.
+
+    Usage:
+        with LocalDatalakeServer(columnar=True) as server:
+            client = SyncRemoteDatalakeClient(server.url, "id", "key")
+            ...
+            server.writes
+    """
+
+    def __init__(self, columnar: bool = True):
+        self.columnar = columnar
+        self.writes: list[ReceivedWrite] = []
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), self._handler())
+        self._thread = Thread(target=self._server.serve_forever, daemon=True)
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address
+        return f"http://{host}:{port}"
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self) -> "LocalDatalakeServer":
+        self.start()
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.stop()
+
+    def _handler(self) -> type[BaseHTTPRequestHandler]:
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length", 0))
+                body = self.rfile.read(length)
+                encoding = self.headers.get("Content-Encoding")
+                if encoding:
+                    try:
+                        body = decompress(body, encoding)
+                    except ValueError:
+                        self.send_response(415)
+                        self.end_headers()
+                        return
+                if self.path == COLUMNAR_WRITE_PATH and server.columnar:
+                    schema_name, data_points = decode_columnar(
+                        json.loads(body)
+                    )
+                elif self.path == WRITE_PATH:
+                    records = json.loads(body)["records"]
+                    schema_name = records["schema_name"]
+                    data_points = records["data_points"]
+                else:
+                    self.send_response(404)
+                    self.end_headers()
+                    return
+                server.writes.append(
+                    ReceivedWrite(
+                        self.path, length, schema_name, data_points, encoding
+                    )
+                )
+                self.send_response(201)
+                self.send_header("Content-Type", "application/json")
+                self.end_headers()
+                self.wfile.write(b"{}")
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+
+def compare_write_formats(
+    schema_name: str, data_points: list[dict], repeat: int = 10
+) -> dict[str, dict[str, float]]:
+    """Measures the body size and the encoding time of a write request for
+    the row and the columnar formats.
+
+    Parameters
+    ----------
+    schema_name: str the schema of the data points.
+    data_points: List[Dict] the data points in row format.
+    repeat: int the number of times each encoding is measured.
+
+    Returns
+    -------
+    Dict with the body size in bytes and the mean encoding time in seconds
+    for each format.
+    """
+    encoders = {
+        "row": lambda: {
+            "records": {
+                "schema_name": schema_name,
+                "data_points": data_points,
+            }
+        },
+        "columnar": lambda: encode_columnar(schema_name, data_points),
+    }
+    results = {}
+    for name, encode in encoders.items():
+        start = perf_counter()
+        for _ in range(repeat):
+            body = json.dumps(encode()).encode("utf-8")
+        results[name] = {
+            "bytes": len(body),
+            "seconds": (perf_counter() - start) / repeat,
+        }
+    return results